@@ -1,3 +1,5 @@
+from .galSimCache import *
+from .galSimCheckpoint import *
 from .galSimCameraWrapper import *
 from .galSimDetector import *
 from .galSimCelestialObject import *
@@ -0,0 +1,95 @@
+"""
+This file defines LRUCache, a least-recently-used cache that the GalSim
+interface uses to share expensive-to-build objects (e.g. GalSim light
+profiles) between the objects being drawn.
+"""
+
+from builtins import object
+from collections import OrderedDict
+
+__all__ = ["LRUCache"]
+
+
+class LRUCache(object):
+    """
+    A dict-like cache holding at most maxsize entries.  When it is full,
+    the least recently used entry is discarded.  The number of cache hits
+    and misses is recorded.
+    """
+
+    def __init__(self, maxsize=1000):
+        """
+        @param [in] maxsize is the maximum number of entries to keep.
+        If maxsize is 0, nothing is cached (but hits and misses are
+        still counted).
+        """
+        if maxsize < 0:
+            raise RuntimeError("LRUCache maxsize must be >= 0; you gave %d" % maxsize)
+        self._maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self):
+        """
+        The maximum number of entries in the cache
+        """
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value):
+        if value < 0:
+            raise RuntimeError("LRUCache maxsize must be >= 0; you gave %d" % value)
+        self._maxsize = value
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+
+    def get(self, key, factory):
+        """
+        Return the value stored under key.  If there is none, call
+        factory() to create it and store the result.
+
+        @param [in] key is a hashable key
+
+        @param [in] factory is a callable taking no arguments that
+        returns the value to be cached
+
+        @param [out] the cached value
+        """
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            value = factory()
+            if self._maxsize > 0:
+                self._data[key] = value
+                if len(self._data) > self._maxsize:
+                    self._data.popitem(last=False)
+            return value
+
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def stats(self):
+        """
+        Return a dict containing the number of hits and misses, and the
+        current and maximum sizes of the cache.
+        """
+        return dict(hits=self.hits, misses=self.misses,
+                    size=len(self._data), maxsize=self._maxsize)
+
+    def clear(self):
+        """
+        Empty the cache and reset the hit and miss counters.
+        """
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
@@ -55,6 +55,7 @@ need:
       _raDecFromPixelCoords()
 """
 
+import warnings
 import numpy as np
 from lsst.afw.cameraGeom import FOCAL_PLANE, PIXELS, TAN_PIXELS
 from lsst.afw.cameraGeom import FIELD_ANGLE
@@ -64,11 +65,96 @@ import lsst.sims.utils as simsUtils
 
 __all__ = ["GalSimCameraWrapper", "LSSTCameraWrapper"]
 
+
+class PupilPixelPolynomial(object):
+    """
+    A polynomial approximation to the mapping from pupil coordinates to
+    the pixel coordinates of one detector.  It is only valid inside the
+    rectangle in pupil coordinates to which it was fit.
+
+    See GalSimCameraWrapper.getFastTransform
+    """
+
+    def __init__(self, bounds, order, x_coeffs, y_coeffs):
+        """
+        Parameters
+        ----------
+        bounds is (xmin, xmax, ymin, ymax), the rectangle in pupil
+        coordinates (radians) in which the polynomial is valid
+
+        order is the order of the polynomial
+
+        x_coeffs and y_coeffs are numpy arrays of the coefficients of the
+        polynomials giving the x and y pixel coordinates (see _design)
+        """
+        self.bounds = tuple(float(bb) for bb in bounds)
+        self.order = order
+        self.x_coeffs = x_coeffs
+        self.y_coeffs = y_coeffs
+        # the largest difference in pixels between the polynomial and the
+        # exact transformation; set by GalSimCameraWrapper.getFastTransform
+        self.maxResidual = np.inf
+
+    @classmethod
+    def fit(cls, xPupil, yPupil, xPix, yPix, bounds, order):
+        """
+        Fit the pixel coordinates xPix, yPix of the points xPupil, yPupil
+        by linear least squares.  Points whose pixel coordinates are
+        not finite are ignored.
+        """
+        poly = cls(bounds, order, None, None)
+        good = np.where(np.isfinite(xPix) & np.isfinite(yPix))
+        design = poly._design(xPupil[good], yPupil[good])
+        coeffs = np.linalg.lstsq(design, np.array([xPix[good], yPix[good]]).transpose(),
+                                 rcond=None)[0]
+        poly.x_coeffs = coeffs[:, 0]
+        poly.y_coeffs = coeffs[:, 1]
+        return poly
+
+    def _design(self, xPupil, yPupil):
+        """
+        Return the matrix of the monomials x**p * y**q (p + q <= order)
+        of the pupil coordinates, scaled to the range [-1, 1] inside bounds
+        """
+        xmin, xmax, ymin, ymax = self.bounds
+        xx = (xPupil - 0.5*(xmin + xmax))/(0.5*(xmax - xmin))
+        yy = (yPupil - 0.5*(ymin + ymax))/(0.5*(ymax - ymin))
+        return np.array([np.power(xx, pp)*np.power(yy, total - pp)
+                         for total in range(self.order + 1)
+                         for pp in range(total, -1, -1)]).transpose()
+
+    def contains(self, xPupil, yPupil):
+        """
+        Return a boolean numpy array that is True for the points inside
+        the region in which the polynomial is valid
+        """
+        xmin, xmax, ymin, ymax = self.bounds
+        return (xPupil >= xmin) & (xPupil <= xmax) & (yPupil >= ymin) & (yPupil <= ymax)
+
+    def pixelCoords(self, xPupil, yPupil):
+        """
+        Return the x and y pixel coordinates of numpy arrays of pupil
+        coordinates (in radians)
+        """
+        design = self._design(xPupil, yPupil)
+        return np.dot(design, self.x_coeffs), np.dot(design, self.y_coeffs)
+
+
 class GalSimCameraWrapper(object):
     """
     This is a no-op camera wrapper.
     """
 
+    # If fast_transform is True, pixelCoordsFromPupilCoords uses the
+    # polynomials returned by getFastTransform for the points near the
+    # detectors whose polynomials are within fast_transform_tolerance
+    # pixels of the exact transformation.
+    fast_transform = False
+    fast_transform_order = 4
+    fast_transform_grid_size = 16
+    fast_transform_margin = 0.25
+    fast_transform_tolerance = 0.01
+
     def __init__(self, camera):
         """
         Parameters
@@ -183,12 +269,143 @@ class GalSimCameraWrapper(object):
 
         return self._tan_pixel_bounds_cache[detector_name]
 
+    def getFastTransform(self, detector_name, obs_metadata):
+        """
+        Return the polynomial approximation to the mapping from pupil
+        coordinates to the pixel coordinates of a detector.
+
+        The polynomial, of order fast_transform_order, is fit to the exact
+        transformation at a grid of fast_transform_grid_size**2 points
+        covering the pupil coordinates of the detector, extended on each
+        side by fast_transform_margin times the size of the detector.
+        Its maxResidual is the largest difference (in pixels) between the
+        polynomial and the exact transformation at those points and at
+        the centers of the cells of the grid.
+
+        The polynomials are cached, so that each is only fit once.  A
+        warning is issued when a polynomial is fit whose maxResidual exceeds
+        fast_transform_tolerance, since the exact transformation will then
+        be used for its detector.
+
+        Parameters
+        ----------
+        detector_name is a string denoting the name of the detector
+
+        obs_metadata is an ObservationMetaData; the polynomials depend on
+        its bandpass
+
+        Returns
+        -------
+        a PupilPixelPolynomial
+        """
+        if not hasattr(self, '_fast_transform_cache'):
+            self._fast_transform_cache = {}
+
+        # the bandpass may be a list or an array of names, which cannot be hashed
+        bandpass = obs_metadata.bandpass
+        if isinstance(bandpass, list) or isinstance(bandpass, np.ndarray):
+            bandpass = tuple(str(name) for name in bandpass)
+
+        key = (detector_name, bandpass, self.fast_transform_order,
+               self.fast_transform_grid_size, self.fast_transform_margin)
+
+        if key not in self._fast_transform_cache:
+            corner_list = self.getCornerPupilList(detector_name)
+            x_corner = np.array([corner.getX() for corner in corner_list])
+            y_corner = np.array([corner.getY() for corner in corner_list])
+            dx = self.fast_transform_margin*(x_corner.max() - x_corner.min())
+            dy = self.fast_transform_margin*(y_corner.max() - y_corner.min())
+            bounds = (x_corner.min() - dx, x_corner.max() + dx,
+                      y_corner.min() - dy, y_corner.max() + dy)
+
+            n_grid = self.fast_transform_grid_size
+            x_nodes = np.linspace(bounds[0], bounds[1], n_grid)
+            y_nodes = np.linspace(bounds[2], bounds[3], n_grid)
+            x_centers = 0.5*(x_nodes[1:] + x_nodes[:-1])
+            y_centers = 0.5*(y_nodes[1:] + y_nodes[:-1])
+            x_grid, y_grid = np.meshgrid(x_nodes, y_nodes)
+            x_check, y_check = np.meshgrid(x_centers, y_centers)
+            x_pupil = np.append(x_grid.flatten(), x_check.flatten())
+            y_pupil = np.append(y_grid.flatten(), y_check.flatten())
+
+            x_pix, y_pix = self._exactPixelCoordsFromPupilCoords(x_pupil, y_pupil,
+                                                                 detector_name, obs_metadata,
+                                                                 True)
+            x_pix = np.asarray(x_pix, dtype=float)
+            y_pix = np.asarray(y_pix, dtype=float)
+
+            n_nodes = n_grid*n_grid
+            poly = PupilPixelPolynomial.fit(x_pupil[:n_nodes], y_pupil[:n_nodes],
+                                            x_pix[:n_nodes], y_pix[:n_nodes],
+                                            bounds, self.fast_transform_order)
+
+            x_fit, y_fit = poly.pixelCoords(x_pupil, y_pupil)
+            residual = np.sqrt((x_fit - x_pix)**2 + (y_fit - y_pix)**2)
+            if np.all(np.isfinite(residual)):
+                poly.maxResidual = residual.max()
+
+            if not poly.maxResidual <= self.fast_transform_tolerance:
+                warnings.warn("The polynomial pupil-to-pixel transformation of %s "
+                              "deviates from the exact one by up to %e pixels, more than "
+                              "fast_transform_tolerance = %e; the exact transformation "
+                              "will be used for it" %
+                              (detector_name, poly.maxResidual, self.fast_transform_tolerance))
+
+            self._fast_transform_cache[key] = poly
+
+        return self._fast_transform_cache[key]
+
+    def _fastPixelCoordsFromPupilCoords(self, xPupil, yPupil, chipName, obs_metadata):
+        """
+        Return the pixel coordinates of points with pupil coordinates
+        xPupil, yPupil (radians) on the detectors named by chipName, using
+        the polynomials returned by getFastTransform where they are valid
+        and accurate, and the exact transformation elsewhere.
+        """
+        x_pupil = np.atleast_1d(np.asarray(xPupil, dtype=float))
+        y_pupil = np.atleast_1d(np.asarray(yPupil, dtype=float))
+        name_is_list = isinstance(chipName, list) or isinstance(chipName, np.ndarray)
+        if name_is_list:
+            name_array = np.asarray(chipName).astype(str)
+        else:
+            name_array = np.array([chipName]*len(x_pupil)).astype(str)
+
+        x_pix = np.zeros(len(x_pupil), dtype=float)
+        y_pix = np.zeros(len(x_pupil), dtype=float)
+        use_exact = np.ones(len(x_pupil), dtype=bool)
+
+        unique_names, name_index = np.unique(name_array, return_inverse=True)
+        for i_name, name in enumerate(unique_names):
+            poly = self.getFastTransform(name, obs_metadata)
+            if not poly.maxResidual <= self.fast_transform_tolerance:
+                continue
+            members = np.where(name_index == i_name)[0]
+            members = members[poly.contains(x_pupil[members], y_pupil[members])]
+            x_pix[members], y_pix[members] = poly.pixelCoords(x_pupil[members], y_pupil[members])
+            use_exact[members] = False
+
+        if use_exact.any():
+            (x_pix[use_exact],
+             y_pix[use_exact]) = self._exactPixelCoordsFromPupilCoords(x_pupil[use_exact],
+                                                                       y_pupil[use_exact],
+                                                                       name_array[use_exact]
+                                                                       if name_is_list else chipName,
+                                                                       obs_metadata, True)
+
+        if np.ndim(xPupil) == 0:
+            return x_pix[0], y_pix[0]
+        return x_pix, y_pix
+
     def pixelCoordsFromPupilCoords(self, xPupil, yPupil, chipName, obs_metadata,
                                    includeDistortion=True):
         """
         Get the pixel positions (or nan if not on a chip) for objects based
         on their pupil coordinates.
 
+        If fast_transform is True (and includeDistortion is True and
+        chipName is not None), the pixel positions are evaluated using the
+        polynomials returned by getFastTransform where they are valid.
+
         Parameters
         ---------
         xPupil is the x pupil coordinates in radians. Can be either a float
@@ -223,6 +440,18 @@ class GalSimCameraWrapper(object):
             raise RuntimeError("Must pass obs_metdata to "
                                "cameraWrapper.pixelCoordsFromPupilCoords")
 
+        if self.fast_transform and includeDistortion and chipName is not None:
+            return self._fastPixelCoordsFromPupilCoords(xPupil, yPupil, chipName, obs_metadata)
+
+        return self._exactPixelCoordsFromPupilCoords(xPupil, yPupil, chipName, obs_metadata,
+                                                     includeDistortion)
+
+    def _exactPixelCoordsFromPupilCoords(self, xPupil, yPupil, chipName, obs_metadata,
+                                         includeDistortion):
+        """
+        Get the pixel positions of objects based on their pupil coordinates
+        using the camera's transformations (see pixelCoordsFromPupilCoords)
+        """
         return coordUtils.pixelCoordsFromPupilCoords(xPupil, yPupil, chipName=chipName,
                                                      camera=self._camera,
                                                      includeDistortion=includeDistortion)
@@ -506,6 +735,31 @@ class LSSTCameraWrapper(coordUtils.DMtoCameraPixelTransformer,
 
         return self._tan_pixel_bounds_cache[detector_name]
 
+    def _centerPixelX(self, chipName):
+        """
+        Return the x coordinate of the central pixel (in the Camera team
+        system) of the detectors named by chipName.
+
+        Parameters
+        ----------
+        chipName is either a single detector name or a list or numpy
+        array of detector names
+
+        Returns
+        -------
+        a float if chipName is a single name; otherwise a numpy array
+        with one value per element of chipName.  getCenterPixel is only
+        called once for each distinct detector name.
+        """
+        if isinstance(chipName, list) or isinstance(chipName, np.ndarray):
+            (unique_names,
+             name_index) = np.unique(np.asarray(chipName).astype(str), return_inverse=True)
+            center_x = np.array([self.getCenterPixel(name).getX()
+                                 for name in unique_names], dtype=float)
+            return center_x[name_index]
+
+        return self.getCenterPixel(chipName).getX()
+
     def pixelCoordsFromPupilCoords(self, xPupil, yPupil, chipName, obs_metadata,
                                    includeDistortion=True):
         """
@@ -543,6 +797,19 @@ class LSSTCameraWrapper(coordUtils.DMtoCameraPixelTransformer,
         and the second row is the y pixel coordinate.  These pixel coordinates
         are defined in the Camera team system, rather than the DM system.
         """
+        if self.fast_transform and includeDistortion and chipName is not None:
+            return self._fastPixelCoordsFromPupilCoords(xPupil, yPupil, chipName, obs_metadata)
+
+        return self._exactPixelCoordsFromPupilCoords(xPupil, yPupil, chipName, obs_metadata,
+                                                     includeDistortion)
+
+    def _exactPixelCoordsFromPupilCoords(self, xPupil, yPupil, chipName, obs_metadata,
+                                         includeDistortion):
+        """
+        Get the Camera team pixel positions of objects based on their pupil
+        coordinates using the camera's transformations (see
+        pixelCoordsFromPupilCoords)
+        """
         (dm_x_pix,
          dm_y_pix) = coordUtils.pixelCoordsFromPupilCoordsLSST(xPupil, yPupil,
                                                                chipName=chipName,
@@ -550,19 +817,7 @@ class LSSTCameraWrapper(coordUtils.DMtoCameraPixelTransformer,
                                                                includeDistortion=includeDistortion)
 
         cam_y_pix = dm_x_pix
-        if isinstance(chipName, list) or isinstance(chipName, np.ndarray):
-            center_pix_dict = {}
-            cam_x_pix = np.zeros(len(dm_y_pix))
-            for ix, (det_name, yy) in enumerate(zip(chipName, dm_y_pix)):
-                if det_name not in center_pix_dict:
-                    center_pix = self.getCenterPixel(det_name)
-                    center_pix_dict[det_name] = center_pix
-                else:
-                    center_pix = center_pix_dict[det_name]
-                cam_x_pix[ix] = 2.0*center_pix[0]-yy
-        else:
-            center_pix = self.getCenterPixel(chipName)
-            cam_x_pix = 2.0*center_pix[0] - dm_y_pix
+        cam_x_pix = 2.0*self._centerPixelX(chipName) - dm_y_pix
 
         return cam_x_pix, cam_y_pix
 
@@ -601,14 +856,7 @@ class LSSTCameraWrapper(coordUtils.DMtoCameraPixelTransformer,
         and the second row is the y pupil coordinate (both in radians)
         """
         dm_xPix = yPix
-        if isinstance(chipName, list) or isinstance(chipName, np.ndarray):
-            dm_yPix = np.zeros(len(xPix))
-            for ix, (det_name, xx) in enumerate(zip(chipName, xPix)):
-                came_center_pix = self.getCenterPixel(det_name)
-                dm_yPix[ix] = 2.0*cam_center_pix.getX()-xPix[ix]
-        else:
-            cam_center_pix = self.getCenterPixel(chipName)
-            dm_yPix = 2.0*cam_center_pix.getX()-xPix
+        dm_yPix = 2.0*self._centerPixelX(chipName) - xPix
         return coordUtils.pupilCoordsFromPixelCoordsLSST(dm_xPix, dm_yPix, chipName,
                                                          band=obs_metadata.bandpass,
                                                          includeDistortion=includeDistortion)
@@ -655,16 +903,8 @@ class LSSTCameraWrapper(coordUtils.DMtoCameraPixelTransformer,
         to positions on the celestial sphere.
         """
 
-        if isinstance(chipName, list) or isinstance(chipName, np.ndarray):
-            dm_xPix = yPix
-            dm_yPix = np.zeros(len(xPix))
-            for ix, (det_name, xx) in enumerate(zip(chipName, xPix)):
-                cam_center_pix = self.getCenterPixel(det_name)
-                dm_yPix[ix] = 2.0*cam_center_pix.getX() - xx
-        else:
-            dm_xPix = yPix
-            cam_center_pix = self.getCenterPixel(chipName)
-            dm_yPix = 2.0*cam_center_pix.getX() - xPix
+        dm_xPix = yPix
+        dm_yPix = 2.0*self._centerPixelX(chipName) - xPix
 
         return coordUtils._raDecFromPixelCoordsLSST(dm_xPix, dm_yPix, chipName,
                                                     obs_metadata=obs_metadata,
@@ -784,7 +1024,10 @@ class LSSTCameraWrapper(coordUtils.DMtoCameraPixelTransformer,
                                                                  epoch=epoch,
                                                                  includeDistortion=includeDistortion)
 
-        return self.cameraPixFromDMPix(dm_xPix, dm_yPix, chipName)
+        if chipName is None:
+            return self.cameraPixFromDMPix(dm_xPix, dm_yPix, chipName)
+
+        return 2.0*self._centerPixelX(chipName) - dm_yPix, dm_xPix
 
     def pixelCoordsFromRaDec(self, ra, dec, pm_ra=None, pm_dec=None, parallax=None, v_rad=None,
                              obs_metadata=None, chipName=None,
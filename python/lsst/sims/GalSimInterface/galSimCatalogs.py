@@ -12,6 +12,7 @@ GalSimStars
 
 from builtins import zip
 from builtins import str
+from builtins import object
 import numpy as np
 import os
 
@@ -24,6 +25,7 @@ from lsst.sims.catUtils.mixins import (CameraCoords, AstrometryGalaxies, Astrome
 from lsst.sims.GalSimInterface import GalSimInterpreter, GalSimDetector, GalSimCelestialObject
 from lsst.sims.GalSimInterface import GalSimCameraWrapper
 from lsst.sims.GalSimInterface import make_galsim_detector
+from lsst.sims.GalSimInterface import LRUCache
 from lsst.sims.photUtils import (Sed, Bandpass, BandpassDict,
                                  PhotometricParameters)
 from lsst.afw.cameraGeom import DetectorType
@@ -59,6 +61,52 @@ def _is_null(argument):
     return False
 
 
+class _SedTemplate(object):
+    """
+    The rest frame SED read from one file of the SED library, along with
+    the quantities derived from it that do not depend on the object it
+    is applied to.  The arrays are shared between objects and are
+    therefore read-only.
+    """
+
+    def __init__(self, file_name):
+        """
+        @param [in] file_name is the full path to the SED file
+        """
+        sed = Sed()
+        sed.readSED_flambda(file_name)
+        self.wavelen = sed.wavelen
+        self.flambda = sed.flambda
+        self.wavelen.flags.writeable = False
+        self.flambda.flags.writeable = False
+
+        imsimband = Bandpass()
+        imsimband.imsimBandpass()
+        self._imsimMag = sed.calcMag(imsimband)
+        self._ccm_ab = None
+
+    def fluxNorm(self, magNorm):
+        """
+        Return the factor by which to multiply flambda so that the SED
+        has the magnitude magNorm in the imsim bandpass (this is what
+        Sed.calcFluxNorm returns for the template)
+        """
+        return np.power(10, -0.4*(magNorm - self._imsimMag))
+
+    def ccm_ab(self):
+        """
+        Return the CCM extinction coefficients a(x), b(x) on the rest
+        frame wavelength grid of the template
+        """
+        if self._ccm_ab is None:
+            sed = Sed(wavelen=self.wavelen, flambda=self.flambda)
+            a_x, b_x = sed.setupCCM_ab()
+            a_x.flags.writeable = False
+            b_x.flags.writeable = False
+            self._ccm_ab = (a_x, b_x)
+        return self._ccm_ab
+
+
 class GalSimBase(InstanceCatalog, CameraCoords):
     """
     The catalog classes in this file use the InstanceCatalog infrastructure to construct
@@ -136,6 +184,10 @@ class GalSimBase(InstanceCatalog, CameraCoords):
 
     seed = 42
 
+    # The number of processes the GalSimInterpreter uses to render the images
+    # (see the nproc argument of GalSimInterpreter).
+    nproc = 1
+
     # This is sort of a hack; it prevents findChipName in coordUtils from dying
     # if an object lands on multiple science chips.
     allow_multiple_chips = True
@@ -163,6 +215,10 @@ class GalSimBase(InstanceCatalog, CameraCoords):
 
     sedDir = lsst.utils.getPackageDir('sims_sed_library')
 
+    # The rest frame SED templates read from sedDir, shared by every
+    # catalog in this process so that each file is only read once.
+    sed_template_cache = LRUCache(maxsize=5000)
+
     bandpassNames = None
     bandpassDir = os.path.join(lsst.utils.getPackageDir('throughputs'), 'baseline')
     bandpassRoot = 'filter_'
@@ -174,6 +230,21 @@ class GalSimBase(InstanceCatalog, CameraCoords):
     # If 'None', then all chips are drawn.
     allowed_chips = None
 
+    # If precull_halo_arcsec is not None, get_fitsFiles discards the objects
+    # that cannot cast light on any of the detectors being drawn before
+    # computing their SEDs (see _precullMask).  The discarded objects are
+    # treated as drawn, with no detectors listed in the fitsFiles column.
+    # Because they are never passed to the GalSimInterpreter, the random
+    # numbers drawn for the other objects change.  precull_size_factor
+    # should be at least the conservative_factor used by findAllDetectors.
+    # precull_color_offset is the largest amount (in magnitudes) by which
+    # an object may be brighter in the bands being drawn than its magNorm;
+    # the default allows for very red SEDs.
+    precull_halo_arcsec = None
+    precull_halo_mag = 18.0
+    precull_size_factor = 10.0
+    precull_color_offset = 4.0
+
     # This member variable will define a PSF to convolve with the sources.
     # See the classes PSFbase and DoubleGaussianPSF in
     # galSimUtilities.py for more information
@@ -236,10 +307,7 @@ class GalSimBase(InstanceCatalog, CameraCoords):
         """
         if _is_null(sedName):
             return None
-        sed = Sed()
-        sed.readSED_flambda(os.path.join(self.sedDir, sedName))
-        imsimband = Bandpass()
-        imsimband.imsimBandpass()
+        template = self._getSedTemplate(sedName)
         # normalize the SED
         # Consulting the file sed.py in GalSim/galsim/ it appears that GalSim expects
         # its SEDs to ultimately be in units of ergs/nm so that, when called, they can
@@ -258,12 +326,15 @@ class GalSimBase(InstanceCatalog, CameraCoords):
         # We will take these parameters from an instantiation of the PhotometricParameters
         # class (which can be reassigned by defining a daughter class of this class)
         #
-        fNorm = sed.calcFluxNorm(norm, imsimband)
-        sed.multiplyFluxNorm(fNorm)
+        # The normalization only rescales the template, so it is applied as a
+        # multiplier on the cached template.
+        sed = Sed(wavelen=template.wavelen,
+                  flambda=template.flambda*template.fluxNorm(norm))
 
-        # apply dust extinction (internal)
+        # apply dust extinction (internal); the CCM coefficients on the
+        # rest frame wavelength grid are cached with the template
         if iAv != 0.0 and iRv != 0.0:
-            a_int, b_int = sed.setupCCM_ab()
+            a_int, b_int = template.ccm_ab()
             sed.addDust(a_int, b_int, A_v=iAv, R_v=iRv)
 
         # 22 June 2015
@@ -279,23 +350,103 @@ class GalSimBase(InstanceCatalog, CameraCoords):
             sed.addDust(a_int, b_int, A_v=gAv, R_v=gRv)
         return sed
 
-    def _calculateGalSimSeds(self):
+    def _getSedTemplate(self, sedName):
+        """
+        Return the _SedTemplate for the file sedName in self.sedDir, reading
+        the file only if it is not already in self.sed_template_cache
+        """
+        file_name = os.path.join(self.sedDir, sedName)
+        return self.sed_template_cache.get(file_name, lambda: _SedTemplate(file_name))
+
+    def _calculateGalSimFluxes(self, sedList):
+        """
+        Compute the electron counts of a list of objects in all of the bands of
+        self.bandpassDict at once.
+
+        This gives the same result as calling GalSimCelestialObject.flux on
+        each object, but instead of integrating every SED over every bandpass,
+        the SEDs are resampled onto the common wavelength grid of
+        self.bandpassDict and the integrals are done as one matrix product
+        with the phi arrays of the bandpasses.  Since calcADU and calcFlux
+        integrate f_nu against the same kernel (up to normalization), the ADU
+        are the fluxes times a per-band constant computed once from a flat SED.
+
+        @param [in] sedList is a list of Seds
+
+        @param [out] a numpy array of shape (len(sedList), len(self.bandpassDict))
+        containing the electron counts
+        """
+        fluxes = np.zeros((len(sedList), len(self.bandpassDict)), dtype=float)
+        if len(sedList) == 0:
+            return fluxes
+
+        phiArray, wavelenStep = self.bandpassDict.getPhiArray()
+        wavelenMatch = self.bandpassDict.wavelenMatch
+
+        if not hasattr(self, '_aduPerFlux'):
+            flatSed = Sed()
+            flatSed.setFlatSED(wavelen_min=wavelenMatch[0], wavelen_max=wavelenMatch[-1],
+                               wavelen_step=wavelenStep)
+            self._aduPerFlux = np.array([flatSed.calcADU(self.bandpassDict[name], self.photParams) /
+                                         flatSed.calcFlux(self.bandpassDict[name])
+                                         for name in self.bandpassDict])
+
+        fnu = np.zeros((len(sedList), len(wavelenMatch)), dtype=float)
+        for ix, sed in enumerate(sedList):
+            wavelen, flambda = sed.resampleSED(sed.wavelen, sed.flambda,
+                                               wavelen_match=wavelenMatch)
+            wavelen, fnu[ix] = sed.flambdaTofnu(wavelen, flambda)
+
+        fluxes[:, :] = np.dot(fnu, phiArray.T)*wavelenStep
+        return fluxes*self._aduPerFlux*self.photParams.gain
+
+    def _calculateGalSimSeds(self, indices=None):
         """
         Apply any physical corrections to the objects' SEDS (redshift them, apply dust, etc.).
 
+        @param [in] indices is an optional numpy array of the indices of the
+        rows whose SEDs are wanted.  If None, the SEDs of all rows are returned.
+
         Return a generator that serves up the Sed objects in order.
         """
-        actualSEDnames = self.column_by_name('sedFilepath')
-        redshift = self.column_by_name('redshift')
-        internalAv = self.column_by_name('internalAv')
-        internalRv = self.column_by_name('internalRv')
-        galacticAv = self.column_by_name('galacticAv')
-        galacticRv = self.column_by_name('galacticRv')
-        magNorm = self.column_by_name('magNorm')
-
-        return (self._calcSingleGalSimSed(*args) for args in
-                zip(actualSEDnames, redshift, internalAv, internalRv,
-                    galacticAv, galacticRv, magNorm))
+        columns = [self.column_by_name(name) for name in
+                   ('sedFilepath', 'redshift', 'internalAv', 'internalRv',
+                    'galacticAv', 'galacticRv', 'magNorm')]
+        if indices is not None:
+            columns = [np.asarray(column)[indices] for column in columns]
+
+        return (self._calcSingleGalSimSed(*args) for args in zip(*columns))
+
+    def _precullMask(self, gsObjList, magNorm):
+        """
+        Return a numpy array of booleans that is False for the objects that
+        cannot cast light on any of the detectors being drawn.
+
+        An object is kept if a box about its pupil coordinates overlaps a
+        detector.  The half-width of the box is half of precull_size_factor
+        times the GalSim good image size of the object convolved with the
+        PSF, which is the box findAllDetectors tests with its default
+        conservative_factor when precull_size_factor is 10, plus a halo of
+        precull_halo_arcsec.  Objects are taken to be as bright as
+        magNorm - precull_color_offset in the bands being drawn; for objects
+        brighter than precull_halo_mag the halo is scaled up by
+        10**(0.2*(precull_halo_mag - magnitude)), i.e., by the square root of
+        their flux relative to that magnitude, so that the wings of bright
+        stars are not lost.
+
+        @param [in] gsObjList is a list of GalSimCelestialObjects describing
+        the shapes and positions of the objects (their SEDs are not used)
+
+        @param [in] magNorm is the normalizing magnitude of the SEDs
+        """
+        sizeArcsec = np.array([self.galSimInterpreter.createCenteredObject(gsObject).getGoodImageSize(1.0)
+                               for gsObject in gsObjList], dtype=float)
+        xPupilArcsec = np.array([gsObject.xPupilArcsec for gsObject in gsObjList], dtype=float)
+        yPupilArcsec = np.array([gsObject.yPupilArcsec for gsObject in gsObjList], dtype=float)
+        magnitude = np.asarray(magNorm, dtype=float) - self.precull_color_offset
+        scale = np.power(10.0, 0.2*np.fmax(self.precull_halo_mag - magnitude, 0.0))
+        radius = 0.5*self.precull_size_factor*sizeArcsec + self.precull_halo_arcsec*scale
+        return self.galSimInterpreter.overlapsDetectors(xPupilArcsec, yPupilArcsec, radius)
 
     @cached
     def get_fitsFiles(self, checkpoint_file=None, nobj_checkpoint=1000):
@@ -330,8 +481,6 @@ class GalSimBase(InstanceCatalog, CameraCoords):
         gamma2 = self.column_by_name('gamma2')
         kappa = self.column_by_name('kappa')
 
-        sedList = self._calculateGalSimSeds()
-
         if self.hasBeenInitialized is False and len(objectNames) > 0:
             # This needs to be here in case, instead of writing the whole catalog with write_catalog(),
             # the user wishes to iterate through the catalog with InstanceCatalog.iter_catalog(),
@@ -346,14 +495,42 @@ class GalSimBase(InstanceCatalog, CameraCoords):
                                                       self.obs_metadata,
                                                       epoch=self.db_obj.epoch)
 
+        keep = None
+        if self.precull_halo_arcsec is not None and len(objectNames) > 0:
+            # the SEDs are not needed to find the sizes of the objects
+            shapeList = [GalSimCelestialObject(self.galsim_type, xPupil[ix], yPupil[ix],
+                                               halfLight[ix], minorAxis[ix], majorAxis[ix],
+                                               positionAngle[ix], sindex[ix],
+                                               None, self.bandpassDict, self.photParams,
+                                               npoints[ix], None, None, None,
+                                               gamma1[ix], gamma2[ix], kappa[ix],
+                                               uniqueId=objectNames[ix])
+                         for ix in range(len(objectNames))]
+            keep = self._precullMask(shapeList, self.column_by_name('magNorm'))
+
+        if keep is None:
+            sedList = list(self._calculateGalSimSeds())
+        else:
+            # only compute the SEDs of the objects that survived the culling
+            sedList = [None]*len(objectNames)
+            keptIndices = np.where(keep)[0]
+            for ix, ss in zip(keptIndices, self._calculateGalSimSeds(indices=keptIndices)):
+                sedList[ix] = ss
+
         output = []
-        for (name, xp, yp, hlr, minor, major, pa, ss, sn, npo, gam1, gam2, kap) in \
-            zip(objectNames, xPupil, yPupil, halfLight,
-                 minorAxis, majorAxis, positionAngle, sedList, sindex, npoints,
-                 gamma1, gamma2, kappa):
+        drawIndices = []
+        for ix, (name, ss) in enumerate(zip(objectNames, sedList)):
 
             if name in self.objectHasBeenDrawn:
                 raise RuntimeError('Trying to draw %s more than once ' % str(name))
+            elif keep is not None and not keep[ix]:
+                # this object cannot fall on any of the detectors being drawn
+                self.objectHasBeenDrawn.add(name)
+                if name in self.galSimInterpreter.drawn_objects:
+                    output.append('')
+                else:
+                    self.galSimInterpreter.drawn_objects.add(name)
+                    output.append(None)
             elif ss is None:
                 raise RuntimeError('Trying to draw an object with SED == None')
             else:
@@ -361,21 +538,35 @@ class GalSimBase(InstanceCatalog, CameraCoords):
                 self.objectHasBeenDrawn.add(name)
 
                 if name not in self.galSimInterpreter.drawn_objects:
-
-                    gsObj = GalSimCelestialObject(self.galsim_type, xp, yp,
-                                                  hlr, minor, major, pa, sn,
-                                                  ss, self.bandpassDict, self.photParams,
-                                                  npo, None, None, None,
-                                                  gam1, gam2, kap, uniqueId=name)
-
-                    # actually draw the object
-                    detectorsString = self.galSimInterpreter.drawObject(gsObj)
+                    # the detectors string is filled in once the
+                    # whole chunk has been drawn
+                    drawIndices.append(ix)
+                    output.append(None)
                 else:
                     # For objects that have already been drawn in the
                     # checkpointed data, use a blank string.
-                    detectorsString = ''
-
-                output.append(detectorsString)
+                    output.append('')
+
+        if len(drawIndices) > 0:
+            # compute the fluxes of the whole chunk at once
+            fluxes = self._calculateGalSimFluxes([sedList[ix] for ix in drawIndices])
+            bandpassNames = list(self.bandpassDict.keys())
+
+            gsObjList = []
+            for ix, objFluxes in zip(drawIndices, fluxes):
+                gsObjList.append(GalSimCelestialObject(self.galsim_type, xPupil[ix], yPupil[ix],
+                                                       halfLight[ix], minorAxis[ix], majorAxis[ix],
+                                                       positionAngle[ix], sindex[ix],
+                                                       sedList[ix], self.bandpassDict, self.photParams,
+                                                       npoints[ix], None, None, None,
+                                                       gamma1[ix], gamma2[ix], kappa[ix],
+                                                       uniqueId=objectNames[ix],
+                                                       flux_dict=dict(zip(bandpassNames, objFluxes))))
+
+            # actually draw the objects
+            detectorsStrings = self.galSimInterpreter.drawObjects(gsObjList)
+            for ix, detectorsString in zip(drawIndices, detectorsStrings):
+                output[ix] = detectorsString
 
         # Force checkpoint at the end (if a checkpoint file has been specified).
         if self.galSimInterpreter is not None:
@@ -485,7 +676,8 @@ class GalSimBase(InstanceCatalog, CameraCoords):
                                                        detectors=detectors,
                                                        bandpassDict=self.bandpassDict,
                                                        noiseWrapper=self.noise_and_background,
-                                                       seed=self.seed)
+                                                       seed=self.seed,
+                                                       nproc=self.nproc)
 
             self.galSimInterpreter.setPSF(PSF=self.PSF)
 
@@ -17,7 +17,7 @@ class GalSimCelestialObject(object):
                  halfLightRadius, minorAxis, majorAxis, positionAngle,
                  sindex, sed, bp_dict, photParams, npoints,
                  fits_image_file, pixel_scale, rotation_angle,
-                 gamma1=0, gamma2=0, kappa=0, uniqueId=None):
+                 gamma1=0, gamma2=0, kappa=0, uniqueId=None, flux_dict=None):
         """
         @param [in] galSimType is a string, either 'pointSource', 'sersic',
         'RandomWalk', or 'FitsImage' denoting the shape of the object
@@ -67,6 +67,11 @@ class GalSimCelestialObject(object):
         @param [in] kappa is the WL convergence parameter
 
         @param [in] uniqueId is an int storing a unique identifier for this object
+
+        @param [in] flux_dict is an optional dict mapping bandpass name to the
+        electron counts of this object, e.g. as computed for a whole catalog
+        chunk at once by GalSimBase.  Bands that it does not contain are
+        computed from sed, bp_dict, and photParams when they are requested.
         """
         self._uniqueId = uniqueId
         self._galSimType = galSimType
@@ -81,7 +86,7 @@ class GalSimCelestialObject(object):
         g2 = gamma2/(1. - kappa)   # imaginary part of reduced shear
         mu = 1./((1. - kappa)**2 - (gamma1**2 + gamma2**2)) # magnification
 
-        self._fluxDict = {}
+        self._fluxDict = {} if flux_dict is None else dict(flux_dict)
         self._sed = sed
         self._bp_dict = bp_dict
         self._photParams = photParams
@@ -0,0 +1,336 @@
+"""
+This file defines CheckpointDirectory, the directory-based checkpoint
+store used by GalSimInterpreter when its checkpoint_format is 'memmap',
+and the functions used to compress the image arrays in checkpoints.
+"""
+
+from builtins import object
+import os
+import copy
+import json
+import lzma
+import pickle
+import zlib
+import numpy as np
+
+__all__ = ["CheckpointDirectory", "compressArray", "decompressArray"]
+
+
+def _compressor(codec, level):
+    if codec == 'zlib':
+        return lambda data: zlib.compress(data, -1 if level is None else level)
+    if codec == 'lzma':
+        return lambda data: lzma.compress(data, preset=level)
+    raise RuntimeError("Unknown compression codec %s; use 'zlib' or 'lzma'" % codec)
+
+
+def _decompressor(codec):
+    if codec == 'zlib':
+        return zlib.decompress
+    if codec == 'lzma':
+        return lzma.decompress
+    raise RuntimeError("Unknown compression codec %s; use 'zlib' or 'lzma'" % codec)
+
+
+def compressArray(array, codec, level=None):
+    """
+    Compress a numpy array.
+
+    @param [in] array is the numpy array to compress
+
+    @param [in] codec is the name of the compression codec, 'zlib' or 'lzma'
+
+    @param [in] level is the compression level (the zlib level or the lzma
+    preset).  If None, the default level of the codec is used.
+
+    @param [out] a dict containing the codec, the dtype and shape of the
+    array, and the compressed bytes ('data'), from which decompressArray
+    rebuilds the array
+    """
+    data = _compressor(codec, level)(np.ascontiguousarray(array).tobytes())
+    return dict(codec=codec, dtype=array.dtype.str, shape=list(array.shape), data=data)
+
+
+def decompressArray(compressed):
+    """
+    Rebuild a numpy array from the output of compressArray.
+    """
+    data = _decompressor(compressed['codec'])(compressed['data'])
+    return np.frombuffer(data, dtype=np.dtype(compressed['dtype'])).reshape(compressed['shape']).copy()
+
+
+class CheckpointDirectory(object):
+    """
+    A GalSimInterpreter checkpoint stored as a directory of files, so that
+    writing a checkpoint does not rewrite the whole interpreter state.
+
+    * Each detector image array is stored in .npy files which are updated
+      in place through memory maps (or, if compression is set, in files of
+      compressed bytes).  There are two files ("slots") per image and a
+      checkpoint always overwrites the older one, so that the last
+      committed copy of an image is never touched while it is being written.
+
+    * The uniqueIds of the drawn objects and the centroid records are
+      appended to log files; only the entries added since the previous
+      checkpoint are written.
+
+    * The FITS cards of the WCS of each detector image are written once,
+      to a JSON file per image.
+
+    * manifest.json records which slot of each image is current and how
+      many bytes of each log have been committed.  It is atomically
+      replaced as the last step of every checkpoint, so a checkpoint that
+      is interrupted at any point leaves the previous one intact.
+    """
+
+    manifest_name = 'manifest.json'
+
+    def __init__(self, path, compression=None, compression_level=None):
+        """
+        @param [in] path is the name of the checkpoint directory.
+        It is created if it does not exist.
+
+        @param [in] compression is the codec ('zlib' or 'lzma') used to
+        compress the images written, or None to write them uncompressed.
+        Images written with any codec can be read.
+
+        @param [in] compression_level is the level passed to the codec
+        (None for its default)
+        """
+        self.path = path
+        self.compression = compression
+        self.compression_level = compression_level
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self._manifest = self._readManifest()
+        self._logged_ids = None  # the ids in the drawn objects log; read when first needed
+
+    def _readManifest(self):
+        """
+        Return the committed manifest, or an empty manifest if no
+        checkpoint has been written to this directory.
+        """
+        file_name = os.path.join(self.path, self.manifest_name)
+        if not os.path.isfile(file_name):
+            return dict(images={}, wcs={}, rng_slot=None,
+                        logs=dict(drawn_objects=dict(generation=0, offset=0, count=0),
+                                  centroids=dict(generation=0, offset=0, count=0)))
+        with open(file_name, 'r') as input_:
+            return json.load(input_)
+
+    def _writeManifest(self, manifest):
+        """
+        Atomically replace the committed manifest.
+        """
+        file_name = os.path.join(self.path, self.manifest_name)
+        tmp_name = file_name + '.tmp'
+        with open(tmp_name, 'w') as output:
+            json.dump(manifest, output)
+            output.flush()
+            os.fsync(output.fileno())
+        os.chmod(tmp_name, 0o660)
+        os.rename(tmp_name, file_name)
+        self._manifest = manifest
+
+    def _imageFileName(self, index, slot, compression=None):
+        if compression is not None:
+            return os.path.join(self.path, 'image_%04d_%d.%s' % (index, slot, compression))
+        return os.path.join(self.path, 'image_%04d_%d.npy' % (index, slot))
+
+    def _logFileName(self, log_name, generation):
+        return os.path.join(self.path, '%s_%d.log' % (log_name, generation))
+
+    def _wcsFileName(self, index):
+        return os.path.join(self.path, 'wcs_%04d.json' % index)
+
+    def _rngFileName(self, slot):
+        return os.path.join(self.path, 'rng_%d.pkl' % slot)
+
+    def _writeImage(self, manifest, key, array):
+        """
+        Write an image array to the uncommitted slot of its files.
+        """
+        entry = manifest['images'].get(key)
+        if entry is None:
+            entry = dict(index=len(manifest['images']), slot=1)
+        slot = 1 - entry['slot']
+
+        if self.compression is not None:
+            compressed = compressArray(array, self.compression, self.compression_level)
+            file_name = self._imageFileName(entry['index'], slot, self.compression)
+            with open(file_name, 'wb') as output:
+                output.write(compressed.pop('data'))
+                output.flush()
+                os.fsync(output.fileno())
+            compressed.update(index=entry['index'], slot=slot)
+            manifest['images'][key] = compressed
+            return
+
+        file_name = self._imageFileName(entry['index'], slot)
+        output = None
+        if os.path.isfile(file_name):
+            output = np.lib.format.open_memmap(file_name, mode='r+')
+            if output.shape != array.shape or output.dtype != array.dtype:
+                del output
+                output = None
+        if output is None:
+            output = np.lib.format.open_memmap(file_name, mode='w+', dtype=array.dtype,
+                                               shape=array.shape)
+        output[...] = array
+        output.flush()
+        del output
+
+        manifest['images'][key] = dict(index=entry['index'], slot=slot)
+
+    def _appendRecords(self, manifest, log_name, records, restart):
+        """
+        Append a list of records to one of the logs.
+
+        @param [in] log_name is 'drawn_objects' or 'centroids'
+
+        @param [in] records is the list of records to append
+
+        @param [in] restart is a boolean.  If True, the records replace the
+        contents of the log (they are written to a new log file).
+        """
+        entry = dict(manifest['logs'][log_name])
+        if restart:
+            entry = dict(generation=entry['generation'] + 1, offset=0, count=0)
+        file_name = self._logFileName(log_name, entry['generation'])
+        with open(file_name, 'r+b' if entry['offset'] > 0 else 'wb') as output:
+            # discard anything left behind by an interrupted checkpoint
+            output.truncate(entry['offset'])
+            output.seek(entry['offset'])
+            if len(records) > 0:
+                pickle.dump(list(records), output)
+            output.flush()
+            os.fsync(output.fileno())
+            entry['offset'] = output.tell()
+        entry['count'] += len(records)
+        manifest['logs'][log_name] = entry
+
+    def _readRecords(self, log_name):
+        """
+        Return the list of committed records in one of the logs.
+        """
+        entry = self._manifest['logs'][log_name]
+        records = []
+        if entry['offset'] == 0:
+            return records
+        with open(self._logFileName(log_name, entry['generation']), 'rb') as input_:
+            while input_.tell() < entry['offset']:
+                records.extend(pickle.load(input_))
+        return records
+
+    def _removeStaleLogs(self, old_manifest):
+        for log_name, entry in old_manifest['logs'].items():
+            if entry['generation'] != self._manifest['logs'][log_name]['generation']:
+                file_name = self._logFileName(log_name, entry['generation'])
+                if os.path.exists(file_name):
+                    os.remove(file_name)
+
+    def write(self, images, rng, drawn_objects, centroid_list, wcs_cards=None):
+        """
+        Write a checkpoint.
+
+        @param [in] images is a dict of image arrays, keyed like
+        GalSimInterpreter.detectorImages.  Images that are not in
+        this dict keep their previously committed contents.
+
+        @param [in] rng is the interpreter's random number generator
+
+        @param [in] drawn_objects is the set of uniqueIds of the objects
+        that have been drawn
+
+        @param [in] centroid_list is the list of centroid records.  It is
+        assumed to only ever be appended to.
+
+        @param [in] wcs_cards is an optional dict of the WCS FITS cards (as
+        returned by fitsCardsFromWcs) of the images.  The cards of each
+        image are only written the first time they are passed.
+        """
+        old_manifest = self._manifest
+        manifest = copy.deepcopy(old_manifest)
+
+        for key, array in images.items():
+            self._writeImage(manifest, key, array)
+
+        if wcs_cards is not None:
+            for key, cards in wcs_cards.items():
+                if key in manifest['wcs'] or key not in manifest['images']:
+                    continue
+                file_name = self._wcsFileName(manifest['images'][key]['index'])
+                with open(file_name, 'w') as output:
+                    json.dump(cards, output)
+                    output.flush()
+                    os.fsync(output.fileno())
+                manifest['wcs'][key] = os.path.basename(file_name)
+
+        rng_slot = 0 if manifest['rng_slot'] is None else 1 - manifest['rng_slot']
+        with open(self._rngFileName(rng_slot), 'wb') as output:
+            pickle.dump(rng, output)
+            output.flush()
+            os.fsync(output.fileno())
+        manifest['rng_slot'] = rng_slot
+
+        if self._logged_ids is None:
+            self._logged_ids = set(self._readRecords('drawn_objects'))
+        if self._logged_ids.issubset(drawn_objects):
+            self._appendRecords(manifest, 'drawn_objects',
+                                list(set(drawn_objects) - self._logged_ids), False)
+        else:
+            self._appendRecords(manifest, 'drawn_objects', list(drawn_objects), True)
+
+        n_centroids = manifest['logs']['centroids']['count']
+        if len(centroid_list) >= n_centroids:
+            self._appendRecords(manifest, 'centroids', centroid_list[n_centroids:], False)
+        else:
+            self._appendRecords(manifest, 'centroids', centroid_list, True)
+
+        self._writeManifest(manifest)
+        self._logged_ids = set(drawn_objects)
+        self._removeStaleLogs(old_manifest)
+
+    def __contains__(self, key):
+        """
+        Return True if the committed checkpoint contains the image key.
+        """
+        return key in self._manifest['images']
+
+    def read(self):
+        """
+        Read the committed checkpoint.
+
+        @param [out] a dict containing 'images' (a dict of image arrays;
+        uncompressed images are read-only memory maps), 'rng',
+        'drawn_objects' (a set), 'centroid_objects' (a list) and 'wcs_cards'
+        (a dict of the WCS FITS cards of the images for which they were
+        written), or None if no checkpoint has been written to this directory.
+        """
+        if self._manifest['rng_slot'] is None:
+            return None
+
+        images = {}
+        for key, entry in self._manifest['images'].items():
+            if entry.get('codec') is not None:
+                with open(self._imageFileName(entry['index'], entry['slot'],
+                                              entry['codec']), 'rb') as input_:
+                    images[key] = decompressArray(dict(entry, data=input_.read()))
+            else:
+                images[key] = np.load(self._imageFileName(entry['index'], entry['slot']),
+                                      mmap_mode='r')
+
+        with open(self._rngFileName(self._manifest['rng_slot']), 'rb') as input_:
+            rng = pickle.load(input_)
+
+        wcs_cards = {}
+        for key, file_name in self._manifest['wcs'].items():
+            with open(os.path.join(self.path, file_name), 'r') as input_:
+                wcs_cards[key] = [tuple(card) for card in json.load(input_)]
+
+        drawn_objects = set(self._readRecords('drawn_objects'))
+        self._logged_ids = set(drawn_objects)
+
+        return dict(images=images, rng=rng, drawn_objects=drawn_objects,
+                    centroid_objects=self._readRecords('centroids'),
+                    wcs_cards=wcs_cards)
@@ -11,12 +11,14 @@ import galsim
 import numpy as np
 import lsst.geom as LsstGeom
 from lsst.obs.lsstSim import LsstSimMapper
-from lsst.sims.utils import arcsecFromRadians
-from lsst.sims.GalSimInterface.wcsUtils import tanSipWcsFromDetector
+from lsst.sims.utils import arcsecFromRadians, _pupilCoordsFromRaDec
+from lsst.sims.GalSimInterface.wcsUtils import tanSipWcsFromDetector, fitsCardsFromWcs
+from lsst.sims.GalSimInterface.wcsUtils import TanSipPolynomials
 from lsst.sims.GalSimInterface import GalSimCameraWrapper
 from lsst.sims.photUtils import PhotometricParameters
 
-__all__ = ["GalSimDetector", "make_galsim_detector", "LsstObservatory"]
+__all__ = ["GalSimDetector", "make_galsim_detector", "GalSimDetectorGrid",
+           "LsstObservatory"]
 
 
 class GalSim_afw_TanSipWCS(galsim.wcs.CelestialWCS):
@@ -29,8 +31,23 @@ class GalSim_afw_TanSipWCS(galsim.wcs.CelestialWCS):
 
     Shupe and Hook (2008)
     http://fits.gsfc.nasa.gov/registry/sip/SIP_distortion_v1_0.pdf
+
+    By default, _radec and _xy transform coordinates exactly, through the
+    camera geometry and astrometry of cameraWrapper.  If exact is set to
+    False (on the class or on an instance), they instead evaluate the
+    fitted TAN-SIP polynomials with NumPy, which is much faster and
+    accurate to the tolerance of the fit.
+
+    If jacobian_grid_size is not None, the local Jacobian (used by GalSim's
+    local() and jacobian()) is interpolated bilinearly on a grid of
+    jacobian_grid_size x jacobian_grid_size cells covering the detector,
+    which is computed once per detector, rather than found by finite
+    differences of _radec at every position.
     """
 
+    exact = True
+    jacobian_grid_size = None
+
     def __init__(self, detectorName, cameraWrapper, obs_metadata, epoch, photParams=None, wcs=None):
         """
         @param [in] detectorName is the name of the detector as stored
@@ -47,7 +64,8 @@ class GalSim_afw_TanSipWCS(galsim.wcs.CelestialWCS):
         @param [in] photParams is an instantiation of PhotometricParameters
         (it will contain information about gain, exposure time, etc.)
 
-        @param [in] wcs is a kwarg that is used by the method _newOrigin().
+        @param [in] wcs is an already fit afw SkyWcs to use instead of fitting
+        one to the detector.  It is used by GalSimDetector (and _newOrigin()).
         The wcs kwarg in this constructor method should not be used by users.
         """
 
@@ -70,6 +88,16 @@ class GalSim_afw_TanSipWCS(galsim.wcs.CelestialWCS):
         # this is needed to match the GalSim v1.5 API
         self._color = None
 
+        # The copies of this WCS made by _newOrigin share this header and
+        # only record their own CRPIX values; a copy of the header with
+        # those values is made only if their fitsHeader is asked for.
+        # Once its header is shared, this WCS makes its own copy of it the
+        # next time its fitsHeader is asked for, so that changes made
+        # through fitsHeader never reach the other WCSs.
+        self._crpixOverride = None
+        self._materializedHeader = None
+        self._headerShared = False
+
         self.fitsHeader = self._tanSipWcs.getFitsMetadata()
         self.fitsHeader.set("EXTTYPE", "IMAGE")
 
@@ -133,6 +161,46 @@ class GalSim_afw_TanSipWCS(galsim.wcs.CelestialWCS):
 
         self.origin = galsim.PositionD(x=self.crpix1, y=self.crpix2)
         self._color = None
+        self._sipPolynomials = None
+        # Jacobian grids keyed by jacobian_grid_size.  This dict is shared
+        # with the copies of this WCS made by _newOrigin.
+        self._jacobianGrids = {}
+
+    @property
+    def fitsHeader(self):
+        """The FITS header (a PropertyList) of this WCS"""
+        if self._crpixOverride is None:
+            if self._headerShared:
+                self._fitsHeader = copy.deepcopy(self._fitsHeader)
+                self._headerShared = False
+            return self._fitsHeader
+        if self._materializedHeader is None:
+            self._materializedHeader = copy.deepcopy(self._fitsHeader)
+            self._materializedHeader.set('CRPIX1', self._crpixOverride[0])
+            self._materializedHeader.set('CRPIX2', self._crpixOverride[1])
+        elif self._headerShared:
+            self._materializedHeader = copy.deepcopy(self._materializedHeader)
+        self._headerShared = False
+        return self._materializedHeader
+
+    @fitsHeader.setter
+    def fitsHeader(self, value):
+        self._fitsHeader = value
+        self._crpixOverride = None
+        self._materializedHeader = None
+        self._headerShared = False
+
+    @property
+    def tanSipWcs(self):
+        """The afw SkyWcs fit to the detector"""
+        return self._tanSipWcs
+
+    @property
+    def sipPolynomials(self):
+        """The TanSipPolynomials evaluating the fitted TAN-SIP WCS"""
+        if self._sipPolynomials is None:
+            self._sipPolynomials = TanSipPolynomials.fromFitsCards(fitsCardsFromWcs(self._tanSipWcs))
+        return self._sipPolynomials
 
     def _radec(self, x, y, color=None):
         """
@@ -146,6 +214,13 @@ class GalSim_afw_TanSipWCS(galsim.wcs.CelestialWCS):
         match the GalSim v1.5 API
         """
 
+        if not self.exact:
+            ra, dec = self.sipPolynomials.pixelToSky(x + self.afw_crpix1, y + self.afw_crpix2)
+            if type(x) is np.ndarray:
+                return (np.radians(ra), np.radians(dec))
+            else:
+                return (np.radians(float(ra)), np.radians(float(dec)))
+
         chipNameList = [self.detectorName]
 
         if type(x) is np.ndarray:
@@ -167,6 +242,13 @@ class GalSim_afw_TanSipWCS(galsim.wcs.CelestialWCS):
         Convert ra, dec in radians into x, y in pixel space with crpix subtracted.
         """
 
+        if not self.exact:
+            xx, yy = self.sipPolynomials.skyToPixel(np.degrees(ra), np.degrees(dec))
+            if type(ra) is np.ndarray:
+                return (xx-self.crpix1, yy-self.crpix2)
+            else:
+                return (float(xx)-self.crpix1, float(yy)-self.crpix2)
+
         chipNameList = [self.detectorName]
 
         if type(ra) is np.ndarray:
@@ -181,6 +263,72 @@ class GalSim_afw_TanSipWCS(galsim.wcs.CelestialWCS):
         else:
             return (xx[0]-self.crpix1, yy-self.crpix2)
 
+    def _getJacobianGrid(self):
+        """
+        Return the pixel coordinates (as used by cameraWrapper) of the nodes
+        of the Jacobian grid along x and y, and an array of the Jacobian
+        matrix elements (dudx, dudy, dvdx, dvdy) at each node
+
+        The Jacobians are found by the same central differences (one pixel
+        steps) as GalSim's CelestialWCS._local, but with a single call to
+        _radec for all of the nodes.
+        """
+        nCells = self.jacobian_grid_size
+        if nCells not in self._jacobianGrids:
+            bbox = self.cameraWrapper.getBBox(self.detectorName)
+            xNodes = np.linspace(bbox.getMinX(), bbox.getMaxX(), nCells+1)
+            yNodes = np.linspace(bbox.getMinY(), bbox.getMaxY(), nCells+1)
+            xGrid, yGrid = np.meshgrid(xNodes - self.afw_crpix1, yNodes - self.afw_crpix2,
+                                       indexing='ij')
+            xGrid = xGrid.flatten()
+            yGrid = yGrid.flatten()
+
+            # the nodes and their neighbors one pixel away along +x, -x, +y and -y
+            ra, dec = self._radec(np.concatenate([xGrid, xGrid+1.0, xGrid-1.0, xGrid, xGrid]),
+                                  np.concatenate([yGrid, yGrid, yGrid, yGrid+1.0, yGrid-1.0]))
+            ra = np.asarray(ra, dtype=float).reshape(5, len(xGrid))
+            dec = np.asarray(dec, dtype=float).reshape(5, len(xGrid))
+
+            # RA increases to the left, so u is -RA*cos(Dec)
+            cosdec = np.cos(dec[0])
+            dra_dx = (ra[1] - ra[2] + np.pi) % (2.0*np.pi) - np.pi
+            dra_dy = (ra[3] - ra[4] + np.pi) % (2.0*np.pi) - np.pi
+            factor = galsim.radians/galsim.arcsec
+            values = factor*np.array([-0.5*dra_dx*cosdec, -0.5*dra_dy*cosdec,
+                                      0.5*(dec[1] - dec[2]), 0.5*(dec[3] - dec[4])])
+            values = values.transpose().reshape(len(xNodes), len(yNodes), 4)
+            self._jacobianGrids[nCells] = (xNodes, yNodes, values)
+        return self._jacobianGrids[nCells]
+
+    def _local(self, image_pos, color=None):
+        """
+        This is a method required by the GalSim WCS API
+
+        Return the local JacobianWCS at image_pos.  If jacobian_grid_size is
+        set, it is interpolated from the Jacobian grid of this detector.
+        Like GalSim's CelestialWCS._local, image_pos is measured from
+        self.origin.
+        """
+        if self.jacobian_grid_size is None or image_pos is None:
+            return super(GalSim_afw_TanSipWCS, self)._local(image_pos, color)
+
+        xNodes, yNodes, values = self._getJacobianGrid()
+
+        # position in units of grid cells; positions off the
+        # detector use the nearest cell on the detector
+        fx = (image_pos.x - self.origin.x + self.afw_crpix1 - xNodes[0])/(xNodes[1] - xNodes[0])
+        fy = (image_pos.y - self.origin.y + self.afw_crpix2 - yNodes[0])/(yNodes[1] - yNodes[0])
+        fx = min(max(fx, 0.0), len(xNodes) - 1.0)
+        fy = min(max(fy, 0.0), len(yNodes) - 1.0)
+        ix = min(int(fx), len(xNodes) - 2)
+        iy = min(int(fy), len(yNodes) - 2)
+        fx -= ix
+        fy -= iy
+
+        matrix = ((1.0 - fx)*(1.0 - fy)*values[ix, iy] + fx*(1.0 - fy)*values[ix+1, iy] +
+                  (1.0 - fx)*fy*values[ix, iy+1] + fx*fy*values[ix+1, iy+1])
+        return galsim.JacobianWCS(*matrix)
+
     def _newOrigin(self, origin):
         """
         This is a method required by the GalSim WCS API.  It returns
@@ -197,14 +345,26 @@ class GalSim_afw_TanSipWCS(galsim.wcs.CelestialWCS):
         _newWcs.__dict__.update(self.__dict__)
         _newWcs.crpix1 = origin.x
         _newWcs.crpix2 = origin.y
-        _newWcs.fitsHeader = copy.deepcopy(self.fitsHeader)
-        _newWcs.fitsHeader.set('CRPIX1', origin.x)
-        _newWcs.fitsHeader.set('CRPIX2', origin.y)
+        # share the header instead of copying it (see fitsHeader)
+        if self._materializedHeader is not None:
+            _newWcs._fitsHeader = self._materializedHeader
+        _newWcs._crpixOverride = (origin.x, origin.y)
+        _newWcs._materializedHeader = None
+        _newWcs._headerShared = False
+        self._headerShared = True
         return _newWcs
 
     def _writeHeader(self, header, bounds):
-        for key in self.fitsHeader.getOrderedNames():
-            header[key] = self.fitsHeader.getScalar(key)
+        if self._materializedHeader is not None:
+            fitsHeader = self._materializedHeader
+        else:
+            fitsHeader = self._fitsHeader
+        for key in fitsHeader.getOrderedNames():
+            header[key] = fitsHeader.getScalar(key)
+
+        if self._materializedHeader is None and self._crpixOverride is not None:
+            header['CRPIX1'] = self._crpixOverride[0]
+            header['CRPIX2'] = self._crpixOverride[1]
 
         return header
 
@@ -215,7 +375,8 @@ class GalSimDetector(object):
     This class stores information about individual detectors for use by the GalSimInterpreter
     """
 
-    def __init__(self, detectorName, cameraWrapper, obs_metadata, epoch, photParams=None):
+    def __init__(self, detectorName, cameraWrapper, obs_metadata, epoch, photParams=None,
+                 tan_sip_wcs=None):
         """
         @param [in] detectorName is the name of the detector as stored
         by afw
@@ -225,6 +386,10 @@ class GalSimDetector(object):
         @param [in] photParams is an instantiation of the PhotometricParameters class that carries
         details about the photometric response of the telescope.
 
+        @param [in] tan_sip_wcs is an optional afw SkyWcs previously fit to this
+        detector by tanSipWcsFromDetector (e.g. one restored from a checkpoint).
+        If None, the TAN-SIP WCS is fit when self.wcs is first called for.
+
         This class will generate its own internal variable self.fileName which is
         the name of the detector as it will appear in the output FITS files
         """
@@ -244,6 +409,7 @@ class GalSimDetector(object):
                                "when constructing a GalSimDetector")
 
         self._wcs = None  # this will be created when it is actually called for
+        self._tan_sip_wcs = tan_sip_wcs
         self._name = detectorName
         self._cameraWrapper = cameraWrapper
         self._obs_metadata = obs_metadata
@@ -372,9 +538,7 @@ class GalSimDetector(object):
         """
 
         xPix, yPix = self.pixelCoordinatesFromRaDec(ra, dec)
-        points = [LsstGeom.Point2D(xx, yy) for xx, yy in zip(xPix, yPix)]
-        answer = [self._bbox.contains(pp) for pp in points]
-        return answer
+        return self._bboxContains(xPix, yPix)
 
     def containsPupilCoordinates(self, xPupil, yPupil):
         """
@@ -390,9 +554,20 @@ class GalSimDetector(object):
         the corresponding RA, Dec pair falls on this detector
         """
         xPix, yPix = self.pixelCoordinatesFromPupilCoordinates(xPupil, yPupil)
-        points = [LsstGeom.Point2D(xx, yy) for xx, yy in zip(xPix, yPix)]
-        answer = [self._bbox.contains(pp) for pp in points]
-        return answer
+        return self._bboxContains(xPix, yPix)
+
+    def _bboxContains(self, xPix, yPix):
+        """
+        Return a list of booleans indicating whether or not each of the
+        pixel coordinates xPix, yPix (numpy arrays) falls inside the
+        bounding box of this detector.  Like LsstGeom.Box2D.contains,
+        the lower bounds are inclusive and the upper bounds exclusive.
+        """
+        xPix = np.asarray(xPix, dtype=float)
+        yPix = np.asarray(yPix, dtype=float)
+        answer = ((xPix >= self._bbox.getMinX()) & (xPix < self._bbox.getMaxX()) &
+                  (yPix >= self._bbox.getMinY()) & (yPix < self._bbox.getMaxY()))
+        return answer.tolist()
 
     @property
     def xMinPix(self):
@@ -579,7 +754,8 @@ class GalSimDetector(object):
         if self._wcs is None:
             self._wcs = GalSim_afw_TanSipWCS(self._name, self._cameraWrapper,
                                              self.obs_metadata, self.epoch,
-                                             photParams=self.photParams)
+                                             photParams=self.photParams,
+                                             wcs=self._tan_sip_wcs)
 
             if re.match('R[0-9][0-9]_S[0-9][0-9]', self.fileName) is not None:
                 # This is an LSST camera; format the FITS header to feed through DM code
@@ -622,7 +798,7 @@ class GalSimDetector(object):
 
 
 def make_galsim_detector(camera_wrapper, detname, phot_params,
-                         obs_metadata, epoch=2000.0):
+                         obs_metadata, epoch=2000.0, tan_sip_wcs=None):
     """
     Create a GalSimDetector object given the desired detector name.
 
@@ -646,6 +822,10 @@ def make_galsim_detector(camera_wrapper, detname, phot_params,
         Representing the Julian epoch against which RA, Dec are
         reckoned (default = 2000)
 
+    tan_sip_wcs: lsst.afw.geom.SkyWcs
+        A TAN-SIP WCS previously fit to this detector.  If None
+        (default), it is fit when the detector's WCS is needed.
+
     Returns
     -------
     GalSimDetector
@@ -677,7 +857,235 @@ def make_galsim_detector(camera_wrapper, detname, phot_params,
 
     return GalSimDetector(detname, camera_wrapper,
                           obs_metadata=obs_metadata, epoch=epoch,
-                          photParams=params)
+                          photParams=params, tan_sip_wcs=tan_sip_wcs)
+
+
+class GalSimDetectorGrid(object):
+    """
+    A uniform grid spatial index over the pupil coordinate bounding boxes
+    (xMinArcsec, xMaxArcsec, yMinArcsec, yMaxArcsec) of a list of
+    GalSimDetectors.  It is used to find the detectors whose bounding
+    boxes overlap the bounding boxes of objects without comparing every
+    object to every detector.
+    """
+
+    def __init__(self, detectors, cell_size=None):
+        """
+        @param [in] detectors is a list of GalSimDetectors
+
+        @param [in] cell_size is the side length of the grid cells in
+        arcseconds.  If None, the median size of the detectors is used.
+        """
+        self._detectors = list(detectors)
+        self._bounds = np.array([[dd.xMinArcsec, dd.xMaxArcsec, dd.yMinArcsec, dd.yMaxArcsec]
+                                 for dd in self._detectors], dtype=float).reshape(-1, 4)
+
+        if len(self._detectors) == 0:
+            self._cell_size = 1.0
+            self._x0 = self._y0 = 0.0
+            self._nx = self._ny = 1
+        else:
+            if cell_size is None:
+                cell_size = np.median(np.maximum(self._bounds[:, 1] - self._bounds[:, 0],
+                                                 self._bounds[:, 3] - self._bounds[:, 2]))
+            if not cell_size > 0:
+                raise RuntimeError("GalSimDetectorGrid cell_size must be positive; "
+                                   "you gave %e" % cell_size)
+            self._cell_size = float(cell_size)
+            self._x0 = self._bounds[:, 0].min()
+            self._y0 = self._bounds[:, 2].min()
+            self._nx = max(1, int(np.ceil((self._bounds[:, 1].max() - self._x0)/self._cell_size)))
+            self._ny = max(1, int(np.ceil((self._bounds[:, 3].max() - self._y0)/self._cell_size)))
+
+        # Register each detector in every cell touched by its bounding box.
+        cell_lists = [[] for ii in range(self._nx*self._ny)]
+        ix_min, ix_max, iy_min, iy_max = self._cellRanges(self._bounds[:, 0], self._bounds[:, 1],
+                                                          self._bounds[:, 2], self._bounds[:, 3])
+        for idet in range(len(self._detectors)):
+            for iy in range(iy_min[idet], iy_max[idet]+1):
+                for ix in range(ix_min[idet], ix_max[idet]+1):
+                    cell_lists[iy*self._nx+ix].append(idet)
+
+        self._cell_lists = cell_lists
+
+        # The same lists in compressed (start, count) form for the
+        # vectorized queries.
+        self._cell_counts = np.array([len(cell) for cell in cell_lists], dtype=int)
+        self._cell_starts = np.cumsum(self._cell_counts) - self._cell_counts
+        self._cell_detectors = np.array([idet for cell in cell_lists for idet in cell], dtype=int)
+
+        # the corners of the detectors in pupil coordinates; see _getPolygons
+        self._polygons = None
+
+    @property
+    def detectors(self):
+        """
+        The list of GalSimDetectors indexed by this grid
+        """
+        return self._detectors
+
+    def _cellRanges(self, xmin, xmax, ymin, ymax):
+        """
+        Return the (clipped) ranges of grid cell indices covered by the
+        bounding boxes xmin, xmax, ymin, ymax (numpy arrays in arcseconds).
+        """
+        def cell_index(values, origin, ncells):
+            index = np.floor((np.asarray(values, dtype=float) - origin)/self._cell_size)
+            # non-finite bounds never pass the overlap test, so any cell will do
+            return np.clip(np.nan_to_num(index), 0, ncells-1).astype(int)
+
+        return (cell_index(xmin, self._x0, self._nx), cell_index(xmax, self._x0, self._nx),
+                cell_index(ymin, self._y0, self._ny), cell_index(ymax, self._y0, self._ny))
+
+    def overlappingDetectors(self, xmin, xmax, ymin, ymax):
+        """
+        Find the detectors whose bounding boxes overlap a single bounding box.
+
+        @param [in] xmin, xmax, ymin, ymax are the bounds of the box in arcseconds
+        of pupil coordinates
+
+        @param [out] a list of the indices (in self.detectors) of the overlapping
+        detectors, in increasing order
+        """
+        ix_min, ix_max, iy_min, iy_max = [int(ii) for ii in
+                                          self._cellRanges(xmin, xmax, ymin, ymax)]
+        candidates = set()
+        for iy in range(iy_min, iy_max+1):
+            for ix in range(ix_min, ix_max+1):
+                candidates.update(self._cell_lists[iy*self._nx+ix])
+
+        output = []
+        for idet in sorted(candidates):
+            dd = self._bounds[idet]
+            if min(xmax, dd[1]) > max(xmin, dd[0]) and min(ymax, dd[3]) > max(ymin, dd[2]):
+                output.append(idet)
+        return output
+
+    def overlappingPairs(self, xmin, xmax, ymin, ymax):
+        """
+        Vectorized version of overlappingDetectors.
+
+        @param [in] xmin, xmax, ymin, ymax are numpy arrays of the bounds of the
+        boxes in arcseconds of pupil coordinates
+
+        @param [out] a tuple of numpy arrays (objIndex, detIndex) containing the
+        indices of every (box, detector) pair that overlaps, sorted by box index
+        and then by detector index
+        """
+        xmin = np.atleast_1d(np.asarray(xmin, dtype=float))
+        xmax = np.atleast_1d(np.asarray(xmax, dtype=float))
+        ymin = np.atleast_1d(np.asarray(ymin, dtype=float))
+        ymax = np.atleast_1d(np.asarray(ymax, dtype=float))
+        n_det = len(self._detectors)
+        if len(xmin) == 0 or n_det == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+        # expand each box into the grid cells it covers
+        ix_min, ix_max, iy_min, iy_max = self._cellRanges(xmin, xmax, ymin, ymax)
+        ncx = ix_max - ix_min + 1
+        n_cells = ncx*(iy_max - iy_min + 1)
+        cell_obj = np.repeat(np.arange(len(xmin)), n_cells)
+        offset = np.arange(len(cell_obj)) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+        cell = ((iy_min[cell_obj] + offset//ncx[cell_obj])*self._nx +
+                ix_min[cell_obj] + offset % ncx[cell_obj])
+
+        # expand each covered cell into the detectors registered in it
+        counts = self._cell_counts[cell]
+        pair_obj = np.repeat(cell_obj, counts)
+        offset = np.arange(len(pair_obj)) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_det = self._cell_detectors[np.repeat(self._cell_starts[cell], counts) + offset]
+
+        # remove duplicates (detectors registered in more than one cell)
+        # and sort the pairs
+        keys = np.unique(pair_obj*n_det + pair_det)
+        pair_obj = keys//n_det
+        pair_det = keys % n_det
+
+        dd = self._bounds[pair_det]
+        overlaps = ((np.minimum(xmax[pair_obj], dd[:, 1]) > np.maximum(xmin[pair_obj], dd[:, 0])) &
+                    (np.minimum(ymax[pair_obj], dd[:, 3]) > np.maximum(ymin[pair_obj], dd[:, 2])))
+        return pair_obj[overlaps], pair_det[overlaps]
+
+    def _getPolygons(self):
+        """
+        Return the corners of the detectors in arcseconds of pupil coordinates
+        as a numpy array of shape (n_detectors, n_corners, 2).  The corners of
+        each detector are in counter-clockwise order.
+        """
+        if self._polygons is None:
+            polygons = []
+            for dd in self._detectors:
+                corners = np.array([[arcsecFromRadians(pp.getX()), arcsecFromRadians(pp.getY())]
+                                    for pp in dd.camera_wrapper.getCornerPupilList(dd.name)])
+                center = corners.mean(axis=0)
+                angle = np.arctan2(corners[:, 1] - center[1], corners[:, 0] - center[0])
+                polygons.append(corners[np.argsort(angle)])
+            self._polygons = np.array(polygons, dtype=float).reshape(len(self._detectors), -1, 2)
+        return self._polygons
+
+    def detectorIndexFromPupilCoords(self, xPupil, yPupil):
+        """
+        Find the detector on which each of a set of points falls.
+
+        The points are compared to the polygons formed by the corners of
+        the detectors in pupil coordinates, which ignores the slight
+        curvature of the edges of the detectors caused by optical distortion.
+
+        @param [in] xPupil and yPupil are numpy arrays of pupil coordinates
+        in radians
+
+        @param [out] a numpy array of the indices (in self.detectors) of the
+        detectors on which the points fall (-1 for points that fall on no
+        detector).  A point on the boundary between detectors is assigned
+        to the first of them.
+        """
+        xArcsec = arcsecFromRadians(np.atleast_1d(np.asarray(xPupil, dtype=float)))
+        yArcsec = arcsecFromRadians(np.atleast_1d(np.asarray(yPupil, dtype=float)))
+        output = np.zeros(len(xArcsec), dtype=int) - 1
+        if len(xArcsec) == 0 or len(self._detectors) == 0:
+            return output
+
+        # pair each point with the detectors registered in its grid cell
+        ix, _, iy, _ = self._cellRanges(xArcsec, xArcsec, yArcsec, yArcsec)
+        cell = iy*self._nx + ix
+        counts = self._cell_counts[cell]
+        pair_pt = np.repeat(np.arange(len(xArcsec)), counts)
+        offset = np.arange(len(pair_pt)) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_det = self._cell_detectors[np.repeat(self._cell_starts[cell], counts) + offset]
+
+        # a point is inside a (convex, counter-clockwise) polygon if it is
+        # to the left of all of its edges
+        corners = self._getPolygons()[pair_det]
+        next_corners = np.roll(corners, -1, axis=1)
+        cross = ((next_corners[:, :, 0] - corners[:, :, 0])*(yArcsec[pair_pt][:, None] - corners[:, :, 1]) -
+                 (next_corners[:, :, 1] - corners[:, :, 1])*(xArcsec[pair_pt][:, None] - corners[:, :, 0]))
+        inside = np.all(cross >= 0.0, axis=1)
+
+        # keep the lowest index of the detectors containing each point
+        first = np.full(len(xArcsec), len(self._detectors), dtype=int)
+        np.minimum.at(first, pair_pt[inside], pair_det[inside])
+        found = first < len(self._detectors)
+        output[found] = first[found]
+        return output
+
+    def detectorIndexFromRaDec(self, ra, dec, obs_metadata, epoch=2000.0):
+        """
+        Find the detector on which each of a set of points falls
+        (see detectorIndexFromPupilCoords).
+
+        @param [in] ra and dec are numpy arrays of RA and Dec in radians
+
+        @param [in] obs_metadata is the ObservationMetaData characterizing
+        the telescope pointing
+
+        @param [in] epoch is the mean epoch in years of the celestial
+        coordinate system
+
+        @param [out] a numpy array of the indices (in self.detectors) of the
+        detectors on which the points fall (-1 for points that fall on no detector)
+        """
+        xPupil, yPupil = _pupilCoordsFromRaDec(ra, dec, obs_metadata=obs_metadata, epoch=epoch)
+        return self.detectorIndexFromPupilCoords(xPupil, yPupil)
 
 
 class LsstObservatory:
@@ -13,6 +13,8 @@ import math
 from builtins import object
 import os
 import pickle
+import multiprocessing
+import threading
 import tempfile
 import gzip
 import numpy as np
@@ -20,23 +22,46 @@ import astropy
 import galsim
 from lsst.sims.utils import radiansFromArcsec, observedFromPupilCoords
 from lsst.sims.GalSimInterface import make_galsim_detector, SNRdocumentPSF, \
-    Kolmogorov_and_Gaussian_PSF, LsstObservatory
+    Kolmogorov_and_Gaussian_PSF, LsstObservatory, GalSimDetectorGrid, LRUCache, \
+    CheckpointDirectory, compressArray, decompressArray
+from lsst.sims.GalSimInterface.wcsUtils import fitsCardsFromWcs, wcsFromFitsCards
 
 __all__ = ["make_gs_interpreter", "GalSimInterpreter", "GalSimSiliconInterpreter",
-           "ObjectFlags"]
+           "StampSizeTable", "ObjectFlags"]
 
 
 def make_gs_interpreter(obs_md, detectors, bandpassDict, noiseWrapper,
                         epoch=None, seed=None, apply_sensor_model=False,
-                        bf_strength=1):
+                        bf_strength=1, nproc=1):
     if apply_sensor_model:
         return GalSimSiliconInterpreter(obs_metadata=obs_md, detectors=detectors,
                                        bandpassDict=bandpassDict, noiseWrapper=noiseWrapper,
-                                       epoch=epoch, seed=seed, bf_strength=bf_strength)
+                                       epoch=epoch, seed=seed, bf_strength=bf_strength,
+                                       nproc=nproc)
 
     return GalSimInterpreter(obs_metadata=obs_md, detectors=detectors,
                              bandpassDict=bandpassDict, noiseWrapper=noiseWrapper,
-                             epoch=epoch, seed=seed)
+                             epoch=epoch, seed=seed, nproc=nproc)
+
+
+# State shared with the worker processes forked by
+# GalSimInterpreter.renderPendingObjects.  The interpreter itself is
+# not picklable (its images and WCSs refer to afw objects), so the
+# workers inherit it through fork() instead of receiving it as an
+# argument.
+_parallel_render_state = {}
+
+
+def _render_detector_shard(ishard):
+    """
+    Worker function for GalSimInterpreter.renderPendingObjects.  Render
+    all of the pending objects onto the detectors in shard number ishard.
+    """
+    interpreter = _parallel_render_state['interpreter']
+    shard = _parallel_render_state['shards'][ishard]
+    seed = _parallel_render_state['seeds'][ishard]
+    return interpreter._renderDetectorShard(shard, seed)
+
 
 class GalSimInterpreter(object):
     """
@@ -45,9 +70,59 @@ class GalSimInterpreter(object):
     """
     _observatory = LsstObservatory()
 
+    # The maximum number of unconvolved light profiles kept in
+    # self.profile_cache
+    profile_cache_size = 1000
+
+    # The steps to which the shape parameters of extended objects are
+    # rounded before building their light profiles, so that objects with
+    # nearly identical shapes share one cached profile.  sindex and beta
+    # (radians) are rounded to absolute steps; the half light radius and
+    # axis ratio q to fractional steps.  A step of 0 disables the rounding,
+    # so by default only objects with exactly the same shape share a profile
+    # and the images are unchanged; steps like dict(sindex=1.0e-3, hlr=1.0e-4,
+    # q=1.0e-4, beta=1.0e-4) trade that for more cache hits.
+    profile_quantization = dict(sindex=0, hlr=0, q=0, beta=0)
+
+    # The format of the checkpoints written by write_checkpoint.  'pickle'
+    # writes the whole interpreter state to the single file checkpoint_file;
+    # 'memmap' makes checkpoint_file a CheckpointDirectory, in which the
+    # images are updated in place and the drawn objects and centroids are
+    # appended to logs, so that a checkpoint does not rewrite everything.
+    # Images changed other than by drawObject must be flagged with
+    # markImageChanged to be included in 'memmap' checkpoints.
+    checkpoint_format = 'pickle'
+
+    # If True, write_checkpoint copies the state to be checkpointed and
+    # writes it to disk in a background thread, so that drawing does not
+    # wait on slow filesystems.  A new checkpoint waits until the previous
+    # one has been written.  Call wait_for_checkpoint to wait for the
+    # checkpoint in progress.  The snapshot holds a copy of every image
+    # array written: with checkpoint_format = 'pickle' that is all of the
+    # detectorImages, so the memory used by the images is doubled while a
+    # checkpoint is being written; with 'memmap' only the images changed
+    # since the last checkpoint (or not in it yet) are copied.
+    checkpoint_in_background = False
+
+    # The codec ('zlib' or 'lzma') used to compress the image arrays in
+    # checkpoints, or None to write them uncompressed, and the compression
+    # level (None for the codec's default).  The arrays keep their dtype,
+    # so float32 images are stored as float32.  restore_checkpoint reads
+    # both compressed and uncompressed checkpoints.
+    checkpoint_compression = None
+    checkpoint_compression_level = None
+
+    # When nproc > 1 and checkpointing is enabled, the queued objects are
+    # rendered (and a checkpoint written) every parallel_batch_size objects.
+    # Every batch forks a new pool of workers and sends the arrays of the
+    # images they changed back through pipes, which costs about as much as
+    # copying those images twice, so this should be large compared to
+    # the number of detectors.
+    parallel_batch_size = 10000
+
     def __init__(self, obs_metadata=None, detectors=None,
                  bandpassDict=None, noiseWrapper=None,
-                 epoch=None, seed=None):
+                 epoch=None, seed=None, nproc=1):
 
         """
         @param [in] obs_metadata is an instantiation of the ObservationMetaData class which
@@ -64,6 +139,11 @@ class GalSimInterpreter(object):
         @param [in] seed is an integer that will use to seed the random number generator
         used when drawing images (if None, GalSim will automatically create a random number
         generator seeded with the system clock)
+
+        @param [in] nproc is the number of processes to use for rendering.  If nproc > 1,
+        drawObject only queues the objects, and they are rendered by nproc worker processes,
+        each drawing onto its own shard of self.detectors, when renderPendingObjects is called
+        (this happens automatically in writeImages and write_centroid_files).
         """
 
         self.obs_metadata = obs_metadata
@@ -87,6 +167,11 @@ class GalSimInterpreter(object):
                                    # It turns out that calling the image's constructor is more
                                    # time-consuming than returning a deep copy
         self.checkpoint_file = None
+        self._checkpoint_directory = None
+        self._dirty_images = set()  # keys of the detectorImages changed since the last checkpoint
+        self._checkpoint_thread = None
+        self._checkpoint_error = None
+        self._wcs_cards = {}  # FITS cards of the TAN-SIP WCS of the detectorImages
         self.drawn_objects = set()
         self.nobj_checkpoint = 1000
 
@@ -96,6 +181,14 @@ class GalSimInterpreter(object):
         self.centroid_list = []  # This is a list of the centroid objects which
                                  # will be written to the file.
 
+        self.nproc = nproc
+        self._pending_objects = []  # prepared objects waiting to be rendered (see _deferObject)
+        self._is_parallel_worker = False
+
+        # cache of the light profiles of extended objects before lensing
+        # and PSF convolution, shared by all the calls to createCenteredObject
+        self.profile_cache = LRUCache(maxsize=self.profile_cache_size)
+
     def setPSF(self, PSF=None):
         """
         Set the PSF wrapper for this GalSimInterpreter
@@ -104,6 +197,23 @@ class GalSimInterpreter(object):
         """
         self.PSF = PSF
 
+    @property
+    def detectors(self):
+        """
+        The tuple of GalSimDetectors for which we are drawing FITS images.
+        It is a tuple so that it cannot be changed in place, which would
+        leave the spatial index of the detectors out of date; assign a new
+        sequence of detectors instead.
+        """
+        return self._detectors
+
+    @detectors.setter
+    def detectors(self, value):
+        # Rebuild the spatial index used to find the detectors
+        # illumined by each object.
+        self._detectors = tuple(value)
+        self._detectorGrid = GalSimDetectorGrid(self._detectors)
+
     def _getFileName(self, detector=None, bandpassName=None):
         """
         Given a detector and a bandpass name, return the name of the FITS file to be written
@@ -148,15 +258,12 @@ class GalSimInterpreter(object):
         if detector is None:
             return False
 
-        xPupilList = radiansFromArcsec(np.array([xPupil + ix*imgScale for ix in nonZeroPixels[0]]))
-        yPupilList = radiansFromArcsec(np.array([yPupil + iy*imgScale for iy in nonZeroPixels[1]]))
+        xPupilList = radiansFromArcsec(xPupil + imgScale*np.asarray(nonZeroPixels[0], dtype=float))
+        yPupilList = radiansFromArcsec(yPupil + imgScale*np.asarray(nonZeroPixels[1], dtype=float))
 
         answer = detector.containsPupilCoordinates(xPupilList, yPupilList)
 
-        if True in answer:
-            return True
-        else:
-            return False
+        return any(answer)
 
     def findAllDetectors(self, gsObject, conservative_factor=10.):
         """
@@ -197,23 +304,14 @@ class GalSimInterpreter(object):
         ymax = gsObject.yPupilArcsec + sizeArcsec/2.
         ymin = gsObject.yPupilArcsec - sizeArcsec/2.
 
-        outputString = ''
-        outputList = []
-
-        # first assemble a list of detectors which have any hope
-        # of overlapping the test image
-        viableDetectors = []
-        for dd in self.detectors:
-            xOverLaps = min(xmax, dd.xMaxArcsec) > max(xmin, dd.xMinArcsec)
-            yOverLaps = min(ymax, dd.yMaxArcsec) > max(ymin, dd.yMinArcsec)
-
-            if xOverLaps and yOverLaps:
-                if outputString != '':
-                    outputString += '//'
-                outputString += dd.name
-                outputList.append(dd)
+        # use the spatial index to find the detectors which
+        # overlap the test image
+        outputList = [self.detectors[idet] for idet in
+                      self._detectorGrid.overlappingDetectors(xmin, xmax, ymin, ymax)]
 
-        if outputString == '':
+        if len(outputList) > 0:
+            outputString = '//'.join([dd.name for dd in outputList])
+        else:
             outputString = None
 
         return outputString, outputList, centeredObj
@@ -258,8 +356,10 @@ class GalSimInterpreter(object):
         @param [out] outputString is a string denoting which detectors the astronomical
         object illumines, suitable for output in the GalSim InstanceCatalog
         """
-        object_flags = ObjectFlags()
-        object_flags.set_flag('no_silicon')
+        if self._deferDrawing():
+            return self._deferObject(gsObject, dict(max_flux_simple=max_flux_simple,
+                                                    sensor_limit=sensor_limit,
+                                                    fft_sb_thresh=fft_sb_thresh))
 
         # find the detectors which the astronomical object illumines
         outputString, \
@@ -270,19 +370,229 @@ class GalSimInterpreter(object):
         # care that this method has been called for this object.
         self.drawn_objects.add(gsObject.uniqueId)
 
-        # Compute the realized object fluxes for each band and return
-        # if all values are zero in order to save compute.
+        # Compute the realized object fluxes (as drawn from the
+        # corresponding Poisson distribution) for each band.
         fluxes = [gsObject.flux(bandpassName) for bandpassName in self.bandpassDict]
         realized_fluxes = [galsim.PoissonDeviate(self._rng, mean=f)() for f in fluxes]
+
+        self._drawPreparedObject(gsObject, detectorList, centeredObj,
+                                 fluxes, realized_fluxes,
+                                 max_flux_simple=max_flux_simple,
+                                 sensor_limit=sensor_limit,
+                                 fft_sb_thresh=fft_sb_thresh)
+        return outputString
+
+    def drawObjects(self, gsObjectList, max_flux_simple=0, sensor_limit=0,
+                    fft_sb_thresh=None, conservative_factor=10.):
+        """
+        Draw a list of astronomical objects on all of the relevant FITS files.
+
+        This is equivalent to calling drawObject on each element of gsObjectList,
+        except that the tests of which detectors each object overlaps and the
+        pixel coordinates of the objects on those detectors are computed for
+        the whole list at once with numpy arrays.  The stamp sizes, the Poisson
+        realizations of the fluxes and the rendering are still done one object
+        at a time, in the same order as drawObject, so that for a given seed
+        the images and centroids are the same as those from drawObject.
+
+        @param [in] gsObjectList is a list of GalSimCelestialObjects
+
+        @param [in] max_flux_simple, sensor_limit and fft_sb_thresh are
+        passed on to the drawing of each object (see drawObject)
+
+        @param [in] conservative_factor is the factor by which the nominal
+        stamp size is scaled up when assigning objects to detectors (see
+        findAllDetectors)
+
+        @param [out] outputStrings is a list of the strings denoting which
+        detectors each astronomical object illumines, suitable for output in
+        the GalSim InstanceCatalog
+        """
+        draw_kwargs = dict(max_flux_simple=max_flux_simple,
+                           sensor_limit=sensor_limit,
+                           fft_sb_thresh=fft_sb_thresh)
+
+        if self._deferDrawing():
+            return [self._deferObject(gsObject, draw_kwargs) for gsObject in gsObjectList]
+
+        if len(gsObjectList) == 0:
+            return []
+
+        centeredObjList = [self.createCenteredObject(gsObject) for gsObject in gsObjectList]
+
+        # find the detectors which the astronomical objects illumine,
+        # using the same criterion as findAllDetectors
+        halfSizeArcsec = 0.5*conservative_factor*np.array([centeredObj.getGoodImageSize(1.0)
+                                                          for centeredObj in centeredObjList])
+        xPupilArcsec = np.array([gsObject.xPupilArcsec for gsObject in gsObjectList])
+        yPupilArcsec = np.array([gsObject.yPupilArcsec for gsObject in gsObjectList])
+        objIndex, detIndex = self._findDetectorOverlaps(xPupilArcsec - halfSizeArcsec,
+                                                        xPupilArcsec + halfSizeArcsec,
+                                                        yPupilArcsec - halfSizeArcsec,
+                                                        yPupilArcsec + halfSizeArcsec)
+
+        # compute the pixel coordinates of every (object, detector) pair
+        # with one call per detector
+        xPupilRadians = np.array([gsObject.xPupilRadians for gsObject in gsObjectList])
+        yPupilRadians = np.array([gsObject.yPupilRadians for gsObject in gsObjectList])
+        xPix = np.zeros(len(objIndex), dtype=float)
+        yPix = np.zeros(len(objIndex), dtype=float)
+        for idet in np.unique(detIndex):
+            pairs = np.where(detIndex == idet)[0]
+            detector = self.detectors[idet]
+            xPix[pairs], yPix[pairs] = \
+                detector.camera_wrapper.pixelCoordsFromPupilCoords(xPupilRadians[objIndex[pairs]],
+                                                                   yPupilRadians[objIndex[pairs]],
+                                                                   detector.name,
+                                                                   self.obs_metadata)
+
+        # objIndex is sorted, so split the pairs up by object
+        pairsByObject = np.split(np.arange(len(objIndex)),
+                                 np.searchsorted(objIndex, np.arange(1, len(gsObjectList))))
+
+        outputStrings = []
+        for gsObject, centeredObj, pairs in zip(gsObjectList, centeredObjList, pairsByObject):
+            detectorList = [self.detectors[detIndex[ix]] for ix in pairs]
+            pixel_positions = {self.detectors[detIndex[ix]].name: (xPix[ix], yPix[ix])
+                               for ix in pairs}
+            if len(detectorList) > 0:
+                outputStrings.append('//'.join([detector.name for detector in detectorList]))
+            else:
+                outputStrings.append(None)
+
+            self.drawn_objects.add(gsObject.uniqueId)
+
+            # Realize the fluxes just before drawing the object, so that
+            # self._rng is used in the same order as by drawObject and any
+            # checkpoint written while drawing holds the right generator state.
+            fluxes = [gsObject.flux(bandpassName) for bandpassName in self.bandpassDict]
+            realized_fluxes = [galsim.PoissonDeviate(self._rng, mean=f)() for f in fluxes]
+
+            self._drawPreparedObject(gsObject, detectorList, centeredObj,
+                                     fluxes, realized_fluxes,
+                                     pixel_positions=pixel_positions, **draw_kwargs)
+
+        return outputStrings
+
+    def _findDetectorOverlaps(self, xmin, xmax, ymin, ymax):
+        """
+        Vectorized version of the overlap test performed by findAllDetectors.
+
+        @param [in] xmin, xmax, ymin, ymax are numpy arrays of the bounds (in
+        arcseconds of pupil coordinates) of the test images of the objects
+
+        @param [out] a tuple of numpy arrays (objIndex, detIndex) containing the
+        indices of every (object, detector) pair whose bounds overlap, sorted by
+        object and, for each object, in the order of self.detectors
+        """
+        return self._detectorGrid.overlappingPairs(xmin, xmax, ymin, ymax)
+
+    def overlapsDetectors(self, xPupilArcsec, yPupilArcsec, radiusArcsec):
+        """
+        Find the objects that might fall on any of self.detectors.
+
+        @param [in] xPupilArcsec and yPupilArcsec are numpy arrays of the pupil
+        coordinates of the objects in arcseconds
+
+        @param [in] radiusArcsec is a numpy array of the radii (in arcseconds)
+        within which the objects might cast light
+
+        @param [out] a numpy array of booleans that is True for the objects
+        whose boxes of half-width radiusArcsec overlap the bounding box of a
+        detector
+        """
+        xPupilArcsec = np.asarray(xPupilArcsec, dtype=float)
+        yPupilArcsec = np.asarray(yPupilArcsec, dtype=float)
+        objIndex, detIndex = self._findDetectorOverlaps(xPupilArcsec - radiusArcsec,
+                                                        xPupilArcsec + radiusArcsec,
+                                                        yPupilArcsec - radiusArcsec,
+                                                        yPupilArcsec + radiusArcsec)
+        answer = np.zeros(len(xPupilArcsec), dtype=bool)
+        answer[objIndex] = True
+        return answer
+
+    def _getPixelCoords(self, gsObject, detector, pixel_positions=None):
+        """
+        Return the pixel coordinates of an object on a detector, using the
+        precomputed values in pixel_positions (a dict keyed on detector name)
+        if they are available.
+        """
+        if pixel_positions is not None and detector.name in pixel_positions:
+            return pixel_positions[detector.name]
+        return detector.camera_wrapper.pixelCoordsFromPupilCoords(gsObject.xPupilRadians,
+                                                                  gsObject.yPupilRadians,
+                                                                  detector.name,
+                                                                  self.obs_metadata)
+
+    def _getPixelPositions(self, gsObject, detectorList):
+        """
+        Return a dict mapping the name of each detector in detectorList to
+        the (xPix, yPix) position of an object on that detector.
+
+        The pixel positions do not depend on the bandpass, so
+        _drawPreparedObject computes them once for all of the bands and
+        centroid entries of an object, with one call to
+        pixelCoordsFromPupilCoords per camera wrapper, and only if the
+        object is actually drawn or its centroid entries are written.
+        """
+        detectors_by_wrapper = {}
+        for detector in detectorList:
+            detectors_by_wrapper.setdefault(id(detector.camera_wrapper), []).append(detector)
+
+        pixel_positions = {}
+        for detectors in detectors_by_wrapper.values():
+            nameList = [detector.name for detector in detectors]
+            xPupil = np.full(len(nameList), gsObject.xPupilRadians, dtype=float)
+            yPupil = np.full(len(nameList), gsObject.yPupilRadians, dtype=float)
+            camera_wrapper = detectors[0].camera_wrapper
+            xPix, yPix = camera_wrapper.pixelCoordsFromPupilCoords(xPupil, yPupil, nameList,
+                                                                   self.obs_metadata)
+            for name, xx, yy in zip(nameList, xPix, yPix):
+                pixel_positions[name] = (xx, yy)
+        return pixel_positions
+
+    def _drawPreparedObject(self, gsObject, detectorList, centeredObj, fluxes,
+                            realized_fluxes, pixel_positions=None, max_flux_simple=0,
+                            sensor_limit=0, fft_sb_thresh=None):
+        """
+        Render an object whose detectors, centered GalSim object and
+        realized fluxes have already been computed by drawObject or drawObjects.
+
+        @param [in] gsObject is the GalSimCelestialObject being drawn
+
+        @param [in] detectorList is the list of detectors the object illumines
+
+        @param [in] centeredObj is the GalSim GSObject centered on the chip
+
+        @param [in] fluxes is the expected flux of the object in each band
+
+        @param [in] realized_fluxes is the Poisson realization of fluxes
+
+        @param [in] pixel_positions is an optional dict mapping detector name
+        to the (xPix, yPix) position of the object on that detector.  If None,
+        the positions are computed with _getPixelPositions when they are needed.
+
+        @param [in] max_flux_simple, sensor_limit and fft_sb_thresh are ignored
+        here.  (Used by GalSimSiliconInterpreter)
+        """
+        object_flags = ObjectFlags()
+        object_flags.set_flag('no_silicon')
+
+        # Return if all of the realized fluxes are zero in order to
+        # save compute.
         if all([f == 0 for f in realized_fluxes]):
             object_flags.set_flag('skipped')
             self._store_zero_flux_centroid_info(detectorList, fluxes, gsObject,
-                                                object_flags.value)
-            return outputString
+                                                object_flags.value,
+                                                pixel_positions=pixel_positions)
+            return
 
         if len(detectorList) == 0:
             # there is nothing to draw
-            return outputString
+            return
+
+        if pixel_positions is None:
+            pixel_positions = self._getPixelPositions(gsObject, detectorList)
 
         self._addNoiseAndBackground(detectorList)
 
@@ -291,10 +601,7 @@ class GalSimInterpreter(object):
 
                 name = self._getFileName(detector=detector, bandpassName=bandpassName)
 
-                xPix, yPix = detector.camera_wrapper.pixelCoordsFromPupilCoords(gsObject.xPupilRadians,
-                                                                                gsObject.yPupilRadians,
-                                                                                detector.name,
-                                                                                self.obs_metadata)
+                xPix, yPix = self._getPixelCoords(gsObject, detector, pixel_positions)
 
                 # Set the object flux to the value realized from the
                 # Poisson distribution.
@@ -309,6 +616,7 @@ class GalSimInterpreter(object):
                               image=self.detectorImages[name],
                               poisson_flux=False,
                               add_to_image=True)
+                self.markImageChanged(name)
 
                 # If we are writing centroid files, store the entry.
                 if self.centroid_base_name is not None:
@@ -324,18 +632,164 @@ class GalSimInterpreter(object):
         force_checkpoint = ((gsObject.galSimType == 'FitsImage') and
                             realized_flux > 1e4)
         self.write_checkpoint(force=force_checkpoint)
+
+    def _deferDrawing(self):
+        """
+        Return True if drawObject should queue objects for the worker
+        processes rather than render them immediately.
+        """
+        return self.nproc > 1 and not self._is_parallel_worker
+
+    def _deferObject(self, gsObject, draw_kwargs):
+        """
+        Queue an object to be rendered by renderPendingObjects and return
+        the string denoting which detectors it illumines.
+
+        The detectors and the Poisson realizations of the fluxes are
+        computed here, once, so that an object straddling detectors that
+        are rendered by different workers is drawn with the same realized
+        flux on all of them.
+
+        If checkpointing is enabled, the queue is rendered every
+        self.parallel_batch_size objects so that the checkpoints stay current.
+        """
+        outputString, \
+        detectorList, \
+        centeredObj = self.findAllDetectors(gsObject)
+
+        fluxes = [gsObject.flux(bandpassName) for bandpassName in self.bandpassDict]
+        realized_fluxes = [galsim.PoissonDeviate(self._rng, mean=f)() for f in fluxes]
+
+        self._pending_objects.append((gsObject, detectorList, centeredObj,
+                                      fluxes, realized_fluxes, draw_kwargs))
+        if (self.checkpoint_file is not None and
+                len(self._pending_objects) >= self.parallel_batch_size):
+            self.renderPendingObjects()
         return outputString
 
-    def _store_zero_flux_centroid_info(self, detectorList, fluxes, gsObject, obj_flags_value):
+    def renderPendingObjects(self):
+        """
+        Render the objects queued by drawObject when self.nproc > 1.
+
+        self.detectors is split into (at most) self.nproc shards.  One worker
+        process is forked per shard; it draws every pending object onto the
+        images of the detectors in its shard only, starting from the current
+        state of those images.  The arrays of the images each worker changed
+        and its centroid entries are then merged back into this interpreter.
+
+        The detectors and realized fluxes of the objects were computed when
+        they were queued, so an object straddling detectors in different
+        shards has the same realized flux on all of them.  Each worker uses
+        its own random number generators, seeded from self._rng, for the
+        photon shooting and the sky noise.
+        """
+        if len(self._pending_objects) == 0:
+            return
+
+        # do not fork while a checkpoint is being written by another thread
+        self.wait_for_checkpoint()
+
+        shards = [[self.detectors[ix] for ix in indices] for indices in
+                  np.array_split(np.arange(len(self.detectors)), self.nproc)
+                  if len(indices) > 0]
+
+        if self._rng is not None:
+            seeds = [int(self._rng.raw()) for shard in shards]
+        else:
+            seeds = [None]*len(shards)
+
+        _parallel_render_state['interpreter'] = self
+        _parallel_render_state['shards'] = shards
+        _parallel_render_state['seeds'] = seeds
+        try:
+            pool = multiprocessing.get_context('fork').Pool(processes=len(shards))
+            try:
+                results = pool.map(_render_detector_shard, range(len(shards)))
+            finally:
+                pool.close()
+                pool.join()
+        finally:
+            _parallel_render_state.clear()
+
+        detectors_by_name = {}
+        for detector in self.detectors:
+            for bandpassName in self.bandpassDict:
+                name = self._getFileName(detector=detector, bandpassName=bandpassName)
+                detectors_by_name[name] = detector
+
+        for images, centroids in results:
+            for name, array in images.items():
+                if name not in self.detectorImages:
+                    self.detectorImages[name] = self.blankImage(detector=detectors_by_name[name])
+                self.detectorImages[name].array[:, :] = array
+                self.markImageChanged(name)
+            self.centroid_list.extend(centroids)
+
+        for pending in self._pending_objects:
+            self.drawn_objects.add(pending[0].uniqueId)
+        self._pending_objects = []
+
+        self.write_checkpoint(force=True)
+
+    def _renderDetectorShard(self, detectors, seed):
+        """
+        Render all of the pending objects onto a subset of the detectors.
+        This is run in a forked worker process, so it freely modifies the
+        state of this (copied) interpreter.
+
+        @param [in] detectors is the list of GalSimDetectors in this shard
+
+        @param [in] seed is the seed for this worker's random number
+        generators (if None, GalSim seeds them from the system)
+
+        @param [out] a tuple containing a dict of the arrays of the images
+        changed by this shard, keyed like self.detectorImages, and the list
+        of centroid entries generated by this shard
+        """
+        self._is_parallel_worker = True
+        self.checkpoint_file = None
+        self.detectors = detectors
+
+        names = set(self._getFileName(detector=detector, bandpassName=bandpassName)
+                    for detector in detectors for bandpassName in self.bandpassDict)
+        self.detectorImages = {name: image for name, image in self.detectorImages.items()
+                               if name in names}
+        self.centroid_list = []
+        self._dirty_images = set()
+
+        # Every worker starts with a copy of the same generator states, so
+        # reseed them to avoid correlated noise between shards.
+        if seed is None:
+            self._rng = None
+            noise_rng = galsim.UniformDeviate()
+        else:
+            self._rng = galsim.UniformDeviate(seed)
+            noise_rng = galsim.UniformDeviate(int(self._rng.raw()))
+        if self.noiseWrapper is not None and hasattr(self.noiseWrapper, 'randomNumbers'):
+            self.noiseWrapper.randomNumbers = noise_rng
+
+        shard_names = set(detector.name for detector in detectors)
+        for gsObject, detectorList, centeredObj, fluxes, realized_fluxes, draw_kwargs \
+                in self._pending_objects:
+            detectorList = [detector for detector in detectorList
+                            if detector.name in shard_names]
+            self._drawPreparedObject(gsObject, detectorList, centeredObj,
+                                     fluxes, realized_fluxes, **draw_kwargs)
+
+        images = {name: self.detectorImages[name].array for name in self._dirty_images
+                  if name in self.detectorImages}
+        return images, self.centroid_list
+
+    def _store_zero_flux_centroid_info(self, detectorList, fluxes, gsObject, obj_flags_value,
+                                       pixel_positions=None):
         if self.centroid_base_name is None:
             return
+        if pixel_positions is None:
+            pixel_positions = self._getPixelPositions(gsObject, detectorList)
         realized_flux = 0
         for bandpassName, flux in zip(self.bandpassDict, fluxes):
             for detector in detectorList:
-                xPix, yPix = detector.camera_wrapper.pixelCoordsFromPupilCoords(gsObject.xPupilRadians,
-                                                                                gsObject.yPupilRadians,
-                                                                                detector.name,
-                                                                                self.obs_metadata)
+                xPix, yPix = self._getPixelCoords(gsObject, detector, pixel_positions)
                 centroid_tuple = (detector.fileName, bandpassName, gsObject.uniqueId,
                                   flux, realized_flux, xPix, yPix, obj_flags_value,
                                   gsObject.galSimType)
@@ -352,6 +806,7 @@ class GalSimInterpreter(object):
                 name = self._getFileName(detector=detector, bandpassName=bandpassName)
                 if name not in self.detectorImages:
                     self.detectorImages[name] = self.blankImage(detector=detector)
+                    self.markImageChanged(name)
                     if self.noiseWrapper is not None:
                         # Add sky background and noise to the image
                         self.detectorImages[name] = \
@@ -363,7 +818,14 @@ class GalSimInterpreter(object):
                                                                     photParams=detector.photParams,
                                                                     detector=detector)
 
-                        self.write_checkpoint(force=True, object_list=set())
+                        # The memmap checkpoint only appends the objects
+                        # drawn since the last checkpoint to its log, and
+                        # would restart the log if given an empty set, so
+                        # it is passed the objects drawn so far.
+                        if self.checkpoint_format == 'memmap':
+                            self.write_checkpoint(force=True)
+                        else:
+                            self.write_checkpoint(force=True, object_list=set())
 
     def drawPointSource(self, gsObject, psf=None):
         """
@@ -398,14 +860,51 @@ class GalSimInterpreter(object):
             psf = self.PSF
         return self._drawSersic(gsObject, psf=psf)
 
+    def _quantizedSersicIndex(self, gsObject):
+        """
+        Return the Sersic index of gsObject, rounded according to
+        self.profile_quantization.
+        """
+        sindex = float(gsObject.sindex)
+        step = self.profile_quantization['sindex']
+        if step > 0:
+            return round(sindex/step)*step
+        return sindex
+
+    def _quantizedShape(self, gsObject):
+        """
+        Return the half light radius (arcsec), axis ratio and position
+        angle (radians) of gsObject, rounded according to
+        self.profile_quantization.
+        """
+        def absolute(value, step):
+            if step > 0:
+                return round(value/step)*step
+            return value
+
+        def fractional(value, step):
+            if step > 0 and value > 0:
+                return math.exp(round(math.log(value)/step)*step)
+            return value
+
+        return (fractional(float(gsObject.halfLightRadiusArcsec), self.profile_quantization['hlr']),
+                fractional(float(gsObject.minorAxisRadians/gsObject.majorAxisRadians),
+                           self.profile_quantization['q']),
+                absolute(float(0.5*np.pi+gsObject.positionAngleRadians),
+                         self.profile_quantization['beta']))
+
     def _drawSersic(self, gsObject, psf=None):
-        # create a Sersic profile
-        centeredObj = galsim.Sersic(n=float(gsObject.sindex),
-                                    half_light_radius=float(gsObject.halfLightRadiusArcsec))
+        # Rounding the Sersic index also lets GalSim reuse its internal
+        # n-dependent Sersic tables between objects.
+        sindex = self._quantizedSersicIndex(gsObject)
+        hlr, q, beta = self._quantizedShape(gsObject)
+
+        def make_profile():
+            # create a Sersic profile and turn it into an ellipse
+            profile = galsim.Sersic(n=sindex, half_light_radius=hlr)
+            return profile.shear(q=q, beta=beta*galsim.radians)
 
-        # Turn the Sersic profile into an ellipse
-        centeredObj = centeredObj.shear(q=gsObject.minorAxisRadians/gsObject.majorAxisRadians,
-                                        beta=(0.5*np.pi+gsObject.positionAngleRadians)*galsim.radians)
+        centeredObj = self.profile_cache.get(('sersic', sindex, hlr, q, beta), make_profile)
 
         # Apply weak lensing distortion.
         centeredObj = centeredObj.lens(gsObject.g1, gsObject.g2, gsObject.mu)
@@ -434,6 +933,11 @@ class GalSimInterpreter(object):
         return self._drawRandomWalk(gsObject, psf=psf)
 
     def _drawRandomWalk(self, gsObject, psf=None):
+        # RandomWalk objects have no Sersic index.  Their profiles are not
+        # cached: each one is a realization seeded by the object's uniqueId,
+        # so no two objects could share it.
+        hlr, q, beta = self._quantizedShape(gsObject)
+
         # Seeds the random walk with the object id if available
         if gsObject.uniqueId is None:
             rng = None
@@ -442,12 +946,10 @@ class GalSimInterpreter(object):
 
         # Create the RandomWalk profile
         centeredObj = galsim.RandomKnots(npoints=int(gsObject.npoints),
-                                         half_light_radius=float(gsObject.halfLightRadiusArcsec),
-                                         rng=rng)
+                                         half_light_radius=hlr, rng=rng)
 
         # Apply intrinsic ellipticity to the profile
-        centeredObj = centeredObj.shear(q=gsObject.minorAxisRadians/gsObject.majorAxisRadians,
-                                        beta=(0.5*np.pi+gsObject.positionAngleRadians)*galsim.radians)
+        centeredObj = centeredObj.shear(q=q, beta=beta*galsim.radians)
 
         # Apply weak lensing distortion.
         centeredObj = centeredObj.lens(gsObject.g1, gsObject.g2, gsObject.mu)
@@ -474,11 +976,17 @@ class GalSimInterpreter(object):
         return self._drawFitsImage(gsObject, psf=psf)
 
     def _drawFitsImage(self, gsObject, psf=None):
-        # Create the galsim.InterpolatedImage profile from the FITS image.
-        centeredObj = galsim.InterpolatedImage(gsObject.fits_image_file,
+        def make_profile():
+            # Create the galsim.InterpolatedImage profile from the FITS image.
+            profile = galsim.InterpolatedImage(gsObject.fits_image_file,
                                                scale=gsObject.pixel_scale)
-        if gsObject.rotation_angle != 0:
-            centeredObj = centeredObj.rotate(gsObject.rotation_angle*galsim.degrees)
+            if gsObject.rotation_angle != 0:
+                profile = profile.rotate(gsObject.rotation_angle*galsim.degrees)
+            return profile
+
+        key = ('FitsImage', gsObject.fits_image_file, float(gsObject.pixel_scale),
+               float(gsObject.rotation_angle))
+        centeredObj = self.profile_cache.get(key, make_profile)
 
         # Apply weak lensing distortion.
         centeredObj = centeredObj.lens(gsObject.g1, gsObject.g2, gsObject.mu)
@@ -539,6 +1047,9 @@ class GalSimInterpreter(object):
         myImages_R_0_0_S_1_1_y.fits is an example of an image for an LSST-like camera with
         nameRoot = 'myImages'
         """
+        self.renderPendingObjects()
+        self.wait_for_checkpoint()
+
         namesWritten = []
         for name in self.detectorImages:
             if nameRoot is not None:
@@ -619,6 +1130,8 @@ class GalSimInterpreter(object):
 
         After writing the files are closed.
         """
+        self.renderPendingObjects()
+
         # Loop over entries
         for centroid_tuple in self.centroid_list:
             self._writeObjectToCentroidFile(*centroid_tuple)
@@ -627,40 +1140,156 @@ class GalSimInterpreter(object):
         for name in self.centroid_handles:
             self.centroid_handles[name].close()
 
+    def markImageChanged(self, key):
+        """
+        Record that the image self.detectorImages[key] has changed since
+        the last checkpoint.  The 'memmap' checkpoints only rewrite the
+        images marked this way, so code that modifies the images directly,
+        rather than through drawObject, must call this.
+
+        @param [in] key is the key of the image in self.detectorImages
+        """
+        self._dirty_images.add(key)
+
     def write_checkpoint(self, force=False, object_list=None):
         """
-        Write a pickle file of detector images packaged with the
-        objects that have been drawn. By default, write the checkpoint
+        Write a checkpoint of the detector images packaged with the
+        objects that have been drawn, in the format given by
+        self.checkpoint_format. By default, write the checkpoint
         every self.nobj_checkpoint objects.
+
+        Objects queued for the worker processes have already drawn their
+        realized fluxes from self._rng, so they are rendered (by
+        renderPendingObjects, which then writes the checkpoint) before the
+        state of self._rng is saved.
         """
         if self.checkpoint_file is None:
             return
         if force or len(self.drawn_objects) % self.nobj_checkpoint == 0:
+            if len(self._pending_objects) > 0 and not self._is_parallel_worker:
+                self.renderPendingObjects()
+                return
+            if self.checkpoint_format not in ('pickle', 'memmap'):
+                raise RuntimeError("Unknown checkpoint_format %s; "
+                                   "use 'pickle' or 'memmap'" % self.checkpoint_format)
+            drawn_objects = self.drawn_objects if object_list is None \
+                            else object_list
             # The galsim.Images in self.detectorImages cannot be
             # pickled because they contain references to unpickleable
             # afw objects, so just save the array data and rebuild
             # the galsim.Images from scratch, given the detector name.
-            images = {key: value.array for key, value
-                      in self.detectorImages.items()}
-            drawn_objects = self.drawn_objects if object_list is None \
-                            else object_list
-            image_state = dict(images=images,
-                               rng=self._rng,
-                               drawn_objects=drawn_objects,
-                               centroid_objects=self.centroid_list)
-            with tempfile.NamedTemporaryFile(mode='wb', delete=False,
-                                             dir='.') as tmp:
-                pickle.dump(image_state, tmp)
-                tmp.flush()
-                os.fsync(tmp.fileno())
-                os.chmod(tmp.name, 0o660)
-            os.rename(tmp.name, self.checkpoint_file)
+            # The memmap format only needs the images that have changed
+            # since the last checkpoint (or are not in the checkpoint yet).
+            if self.checkpoint_format == 'memmap':
+                checkpoint_directory = self._getCheckpointDirectory()
+                images = {key: value.array for key, value
+                          in self.detectorImages.items()
+                          if key in self._dirty_images or
+                          key not in checkpoint_directory}
+            else:
+                images = {key: value.array for key, value
+                          in self.detectorImages.items()}
+            self._dirty_images = set()
+            wcs_cards = self._getWcsCards()
+
+            if not self.checkpoint_in_background:
+                self._writeCheckpointData(self.checkpoint_file, images, self._rng,
+                                          drawn_objects, self.centroid_list, wcs_cards)
+                return
+
+            # Wait for the previous checkpoint, then hand a snapshot of the
+            # state to a new writer thread.  Only the images to be written
+            # are copied (all of them for 'pickle', the changed ones for
+            # 'memmap').
+            self.wait_for_checkpoint()
+            images = {key: array.copy() for key, array in images.items()}
+            rng = self._rng.duplicate() if self._rng is not None else None
+            self._checkpoint_thread = \
+                threading.Thread(target=self._writeCheckpointInBackground,
+                                 args=(self.checkpoint_file, images, rng,
+                                       set(drawn_objects), list(self.centroid_list),
+                                       wcs_cards))
+            self._checkpoint_thread.start()
+
+    def _getWcsCards(self):
+        """
+        Return a dict of the FITS cards of the fitted TAN-SIP WCS of each
+        of the detectorImages, so that restore_checkpoint does not need to
+        fit the WCS again.  Images without a TAN-SIP WCS are skipped.
+        """
+        for key, image in self.detectorImages.items():
+            if key not in self._wcs_cards and hasattr(image.wcs, 'tanSipWcs'):
+                self._wcs_cards[key] = fitsCardsFromWcs(image.wcs.tanSipWcs)
+        return dict(self._wcs_cards)
+
+    def _writeCheckpointData(self, checkpoint_file, images, rng, drawn_objects,
+                             centroid_list, wcs_cards):
+        """
+        Write the checkpoint data to disk in the format given by
+        self.checkpoint_format
+        """
+        if self.checkpoint_format == 'memmap':
+            self._getCheckpointDirectory().write(images, rng, drawn_objects,
+                                                 centroid_list, wcs_cards)
+            return
+        if self.checkpoint_compression is not None:
+            images = {key: compressArray(array, self.checkpoint_compression,
+                                         self.checkpoint_compression_level)
+                      for key, array in images.items()}
+        image_state = dict(images=images,
+                           rng=rng,
+                           drawn_objects=drawn_objects,
+                           centroid_objects=centroid_list,
+                           compression=self.checkpoint_compression,
+                           wcs_cards=wcs_cards)
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False,
+                                         dir='.') as tmp:
+            pickle.dump(image_state, tmp)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+            os.chmod(tmp.name, 0o660)
+        os.rename(tmp.name, checkpoint_file)
+
+    def _writeCheckpointInBackground(self, *args):
+        """
+        Run _writeCheckpointData in the checkpoint writer thread, storing
+        any exception so that wait_for_checkpoint can re-raise it.
+        """
+        try:
+            self._writeCheckpointData(*args)
+        except Exception as err:
+            self._checkpoint_error = err
+
+    def wait_for_checkpoint(self):
+        """
+        Wait until the checkpoint being written in the background (if any)
+        is on disk.  If writing it failed, the exception is raised here.
+        """
+        if self._checkpoint_thread is not None:
+            self._checkpoint_thread.join()
+            self._checkpoint_thread = None
+        if self._checkpoint_error is not None:
+            err = self._checkpoint_error
+            self._checkpoint_error = None
+            raise err
+
+    def _getCheckpointDirectory(self):
+        """
+        Return the CheckpointDirectory stored at self.checkpoint_file
+        """
+        if (self._checkpoint_directory is None or
+                self._checkpoint_directory.path != self.checkpoint_file):
+            self._checkpoint_directory = CheckpointDirectory(self.checkpoint_file)
+        self._checkpoint_directory.compression = self.checkpoint_compression
+        self._checkpoint_directory.compression_level = self.checkpoint_compression_level
+        return self._checkpoint_directory
 
     def restore_checkpoint(self, camera_wrapper, phot_params, obs_metadata,
                            epoch=2000.0):
         """
         Restore self.detectorImages, self._rng, and self.drawn_objects states
-        from the checkpoint file.
+        from the checkpoint file (or directory, for checkpoints written with
+        checkpoint_format == 'memmap').
 
         Parameters
         ----------
@@ -678,25 +1307,45 @@ class GalSimInterpreter(object):
             Representing the Julian epoch against which RA, Dec are
             reckoned (default = 2000)
         """
+        self.wait_for_checkpoint()
         if (self.checkpoint_file is None
-            or not os.path.isfile(self.checkpoint_file)):
+            or not os.path.exists(self.checkpoint_file)):
             return
-        with open(self.checkpoint_file, 'rb') as input_:
-            image_state = pickle.load(input_)
-            images = image_state['images']
-            for key in images:
-                # Unmangle the detector name.
-                detname = "R:{},{} S:{},{}".format(*tuple(key[1:3] + key[5:7]))
-                # Create the galsim.Image from scratch as a blank image and
-                # set the pixel data from the persisted image data array.
-                detector = make_galsim_detector(camera_wrapper, detname,
-                                                phot_params, obs_metadata,
-                                                epoch=epoch)
-                self.detectorImages[key] = self.blankImage(detector=detector)
-                self.detectorImages[key] += image_state['images'][key]
-            self._rng = image_state['rng']
-            self.drawn_objects = image_state['drawn_objects']
-            self.centroid_list = image_state['centroid_objects']
+        if os.path.isdir(self.checkpoint_file):
+            # The image arrays are memory mapped, so they are only read
+            # as they are copied into the galsim.Images below.
+            image_state = self._getCheckpointDirectory().read()
+            if image_state is None:
+                return
+        else:
+            with open(self.checkpoint_file, 'rb') as input_:
+                image_state = pickle.load(input_)
+        images = image_state['images']
+        if image_state.get('compression') is not None:
+            images = {key: decompressArray(value) for key, value in images.items()}
+        wcs_cards = image_state.get('wcs_cards', {})
+        for key in images:
+            # Unmangle the detector name.
+            detname = "R:{},{} S:{},{}".format(*tuple(key[1:3] + key[5:7]))
+            # Create the galsim.Image from scratch as a blank image and
+            # set the pixel data from the persisted image data array.
+            # Use the persisted TAN-SIP WCS (if there is one) rather
+            # than fitting it again.
+            tan_sip_wcs = None
+            if key in wcs_cards:
+                tan_sip_wcs = wcsFromFitsCards(wcs_cards[key])
+                self._wcs_cards[key] = wcs_cards[key]
+            detector = make_galsim_detector(camera_wrapper, detname,
+                                            phot_params, obs_metadata,
+                                            epoch=epoch,
+                                            tan_sip_wcs=tan_sip_wcs)
+            self.detectorImages[key] = self.blankImage(detector=detector)
+            self.detectorImages[key] += images[key]
+        # the restored images match the checkpoint they were read from
+        self._dirty_images = set()
+        self._rng = image_state['rng']
+        self.drawn_objects = image_state['drawn_objects']
+        self.centroid_list = image_state['centroid_objects']
 
     def getHourAngle(self, mjd, ra):
         """
@@ -731,12 +1380,27 @@ class GalSimSiliconInterpreter(GalSimInterpreter):
     This subclass of GalSimInterpreter applies the Silicon sensor
     model to the drawn objects.
     """
+    # If True, look up the postage stamp sizes of point sources in a
+    # table built on first use rather than computing them exactly (see
+    # getPointSourceStampSizes).  The tabulated stamps are never smaller,
+    # but may be up to ~25% larger, than the exact ones, so the rendered
+    # images differ slightly from those made with exact sizing.
+    use_point_source_stamp_table = False
+
+    # The range of folding thresholds over which the postage stamp sizes
+    # of point sources are tabulated: ps_stamp_size_npoints log-spaced
+    # values between ps_stamp_size_ft_min and the GalSim default
+    # folding_threshold.
+    ps_stamp_size_ft_min = 1.0e-7
+    ps_stamp_size_npoints = 48
+
     def __init__(self, obs_metadata=None, detectors=None, bandpassDict=None,
-                 noiseWrapper=None, epoch=None, seed=None, bf_strength=1):
+                 noiseWrapper=None, epoch=None, seed=None, bf_strength=1,
+                 nproc=1):
         super(GalSimSiliconInterpreter, self)\
             .__init__(obs_metadata=obs_metadata, detectors=detectors,
                       bandpassDict=bandpassDict, noiseWrapper=noiseWrapper,
-                      epoch=epoch, seed=seed)
+                      epoch=epoch, seed=seed, nproc=nproc)
 
         self.gs_bandpass_dict = {}
         for bandpassName in bandpassDict:
@@ -766,6 +1430,15 @@ class GalSimSiliconInterpreter(GalSimInterpreter):
         # the PSF for bright point sources.
         self._ft_default = galsim.GSParams().folding_threshold
 
+        # Optional StampSizeTable replacing the getGoodPhotImageSize
+        # search for bright extended objects (see setStampSizeTable).
+        self.stamp_size_table = None
+
+        # Table of point source stamp sizes versus folding_threshold,
+        # built by _pointSourceStampSizeTable the first time it is needed.
+        self._ps_stamp_pixel_scale = 0.2
+        self._ps_stamp_size_table = None
+
         # Save these, which are needed for DCR
         self.local_hour_angle \
             = self.getHourAngle(self.obs_metadata.mjd.TAI,
@@ -787,13 +1460,26 @@ class GalSimSiliconInterpreter(GalSimInterpreter):
                                        treering_func=det.tree_rings.func,
                                        transpose=True)
 
-    def drawObject(self, gsObject, max_flux_simple=0, sensor_limit=0, fft_sb_thresh=None):
+    def _drawPreparedObject(self, gsObject, detectorList, centeredObj, fluxes,
+                            realized_fluxes, pixel_positions=None, max_flux_simple=0,
+                            sensor_limit=0, fft_sb_thresh=None):
         """
-        Draw an astronomical object on all of the relevant FITS files.
+        Render an object whose detectors, centered GalSim object and
+        realized fluxes have already been computed by drawObject or drawObjects.
 
-        @param [in] gsObject is an instantiation of the GalSimCelestialObject
-        class carrying all of the information for the object whose image
-        is to be drawn
+        @param [in] gsObject is the GalSimCelestialObject being drawn
+
+        @param [in] detectorList is the list of detectors the object illumines
+
+        @param [in] centeredObj is the GalSim GSObject centered on the chip
+
+        @param [in] fluxes is the expected flux of the object in each band
+
+        @param [in] realized_fluxes is the Poisson realization of fluxes
+
+        @param [in] pixel_positions is an optional dict mapping detector name
+        to the (xPix, yPix) position of the object on that detector.  If None,
+        the positions are computed with _getPixelPositions when they are needed.
 
         @param [in] max_flux_simple is the maximum flux at which various simplifying
         approximations are used.  These include using a flat SED and possibly omitting
@@ -809,36 +1495,25 @@ class GalSimSiliconInterpreter(GalSimInterpreter):
         switch from photon shooting to drawing with fft if any pixel is above this.
         Should be at least the saturation level, if not higher. (default = None, which means
         never switch to fft.)
-
-        @param [out] outputString is a string denoting which detectors the astronomical
-        object illumines, suitable for output in the GalSim InstanceCatalog
         """
         object_flags = ObjectFlags()
 
-        # find the detectors which the astronomical object illumines
-        outputString, \
-        detectorList, \
-        centeredObj = self.findAllDetectors(gsObject)
-
-        # Make sure this object is marked as "drawn" since we only
-        # care that this method has been called for this object.
-        self.drawn_objects.add(gsObject.uniqueId)
-
-        # Compute the realized object fluxes (as drawn from the
-        # corresponding Poisson distribution) for each band and return
-        # right away if all values are zero in order to save compute.
-        fluxes = [gsObject.flux(bandpassName) for bandpassName in self.bandpassDict]
-        realized_fluxes = [galsim.PoissonDeviate(self._rng, mean=f)() for f in fluxes]
+        # Return right away if all of the realized fluxes are zero
+        # in order to save compute.
         if all([f == 0 for f in realized_fluxes]):
             # All fluxes are 0, so no photons will be shot.
             object_flags.set_flag('skipped')
             self._store_zero_flux_centroid_info(detectorList, fluxes, gsObject,
-                                                object_flags.value)
-            return outputString
+                                                object_flags.value,
+                                                pixel_positions=pixel_positions)
+            return
 
         if len(detectorList) == 0:
             # There is nothing to draw
-            return outputString
+            return
+
+        if pixel_positions is None:
+            pixel_positions = self._getPixelPositions(gsObject, detectorList)
 
         self._addNoiseAndBackground(detectorList)
 
@@ -900,11 +1575,7 @@ class GalSimSiliconInterpreter(GalSimInterpreter):
                 name = self._getFileName(detector=detector,
                                          bandpassName=bandpassName)
 
-                xPix, yPix = detector.camera_wrapper\
-                   .pixelCoordsFromPupilCoords(gsObject.xPupilRadians,
-                                               gsObject.yPupilRadians,
-                                               chipName=detector.name,
-                                               obs_metadata=self.obs_metadata)
+                xPix, yPix = self._getPixelCoords(gsObject, detector, pixel_positions)
 
                 # Desired position to draw the object.
                 image_pos = galsim.PositionD(xPix, yPix)
@@ -926,6 +1597,7 @@ class GalSimSiliconInterpreter(GalSimInterpreter):
                 offset = image_pos - bounds.true_center
 
                 image = self.detectorImages[name][bounds]
+                self.markImageChanged(name)
 
                 if faint:
                     # For faint things, only use the silicon sensor if there is already
@@ -1007,7 +1679,6 @@ class GalSimSiliconInterpreter(GalSimInterpreter):
         force_checkpoint = ((gsObject.galSimType == 'FitsImage') and
                             realized_flux > 1e4)
         self.write_checkpoint(force=force_checkpoint)
-        return outputString
 
     @staticmethod
     def maybeSwitchPSF(gsObject, obj, fft_sb_thresh, pixel_scale=0.2):
@@ -1132,21 +1803,7 @@ class GalSimSiliconInterpreter(GalSimInterpreter):
             # For really faint things, don't try too hard.  Just use 32x32.
             image_size = 32
         elif gsObject.galSimType.lower() == "pointsource":
-            # For bright stars, set the folding threshold for the
-            # stamp size calculation.  Use a
-            # Kolmogorov_and_Gaussian_PSF since it is faster to
-            # evaluate than an AtmosphericPSF.
-            folding_threshold = self.sky_bg_per_pixel/flux
-            if folding_threshold >= self._ft_default:
-                gsparams = None
-            else:
-                gsparams = galsim.GSParams(folding_threshold=folding_threshold)
-            psf = Kolmogorov_and_Gaussian_PSF(airmass=self._airmass,
-                                              rawSeeing=self._rawSeeing,
-                                              band=self._band,
-                                              gsparams=gsparams)
-            obj = self.drawPointSource(gsObject, psf=psf)
-            image_size = obj.getGoodImageSize(pixel_scale)
+            image_size = int(self.getPointSourceStampSizes(flux, pixel_scale=pixel_scale)[0])
         else:
             # For extended objects, recreate the object to draw, but
             # convolved with the faster DoubleGaussian PSF.
@@ -1179,8 +1836,132 @@ class GalSimSiliconInterpreter(GalSimInterpreter):
 
         return galsim.BoundsI(xmin, xmax, ymin, ymax)
 
+    def _pointSourceImageSize(self, folding_threshold, pixel_scale):
+        """
+        Compute the postage stamp size for a point source given the
+        folding_threshold to use.
+        """
+        # For bright stars, set the folding threshold for the
+        # stamp size calculation.  Use a
+        # Kolmogorov_and_Gaussian_PSF since it is faster to
+        # evaluate than an AtmosphericPSF.
+        if folding_threshold >= self._ft_default:
+            gsparams = None
+        else:
+            gsparams = galsim.GSParams(folding_threshold=folding_threshold)
+        psf = Kolmogorov_and_Gaussian_PSF(airmass=self._airmass,
+                                          rawSeeing=self._rawSeeing,
+                                          band=self._band,
+                                          gsparams=gsparams)
+        obj = psf.applyPSF(xPupil=0., yPupil=0.)
+        return obj.getGoodImageSize(pixel_scale)
+
+    def _pointSourceStampSizeTable(self):
+        """
+        Return the folding thresholds, the corresponding point source
+        stamp sizes, and the stamp size at the default folding_threshold,
+        tabulating them on the first call.  Since the PSF used to size the
+        stamps of point sources does not depend on position, their stamp
+        size only depends on folding_threshold = sky_bg_per_pixel/flux.
+        """
+        if self._ps_stamp_size_table is None:
+            ft_grid = np.logspace(np.log10(self.ps_stamp_size_ft_min),
+                                  np.log10(self._ft_default),
+                                  self.ps_stamp_size_npoints, endpoint=False)
+            size_grid = np.array([self._pointSourceImageSize(ft, self._ps_stamp_pixel_scale)
+                                  for ft in ft_grid], dtype=int)
+            default_size = self._pointSourceImageSize(self._ft_default,
+                                                      self._ps_stamp_pixel_scale)
+            self._ps_stamp_size_table = (ft_grid, size_grid, default_size)
+        return self._ps_stamp_size_table
+
+    def getPointSourceStampSizes(self, fluxes, pixel_scale=0.2):
+        """
+        Get the postage stamp sizes for point sources, as used by
+        getStampBounds, for an array of fluxes at once.
+
+        By default the sizes are computed exactly for each flux.  If
+        use_point_source_stamp_table is True, they are instead looked up
+        in a table of sizes versus folding_threshold = sky_bg_per_pixel/flux
+        that is built on first use.  The tabulated folding_threshold used
+        is the closest one that is less than or equal to the requested
+        value, so the stamps are never smaller than the exact ones.
+        Fluxes beyond the table, or a pixel_scale other than 0.2, use the
+        exact calculation.
+
+        Parameters
+        ----------
+        fluxes: float or numpy.ndarray
+            The fluxes of the objects in e-.
+        pixel_scale: float [0.2]
+            The CCD pixel scale in arcsec.
+
+        Returns
+        -------
+        numpy.ndarray: The lengths N of the desired NxN postage stamps.
+        """
+        fluxes = np.atleast_1d(np.asarray(fluxes, dtype=float))
+        image_sizes = np.zeros(fluxes.shape, dtype=int)
+
+        # For really faint things, don't try too hard.  Just use 32x32.
+        faint = fluxes < 10
+        image_sizes[faint] = 32
+
+        bright = ~faint
+        folding_thresholds = self.sky_bg_per_pixel/fluxes[bright]
+        if self.use_point_source_stamp_table and pixel_scale == self._ps_stamp_pixel_scale:
+            ft_grid, size_grid, default_size = self._pointSourceStampSizeTable()
+            sizes = np.full(folding_thresholds.shape, default_size, dtype=int)
+            index = np.searchsorted(ft_grid, folding_thresholds, side='right') - 1
+            tabulated = (index >= 0) & (folding_thresholds < self._ft_default)
+            sizes[tabulated] = size_grid[index[tabulated]]
+            exact = index < 0
+        else:
+            sizes = np.zeros(folding_thresholds.shape, dtype=int)
+            exact = np.ones(folding_thresholds.shape, dtype=bool)
+
+        for ix in np.where(exact)[0]:
+            sizes[ix] = self._pointSourceImageSize(folding_thresholds[ix], pixel_scale)
+
+        image_sizes[bright] = sizes
+        return image_sizes
+
+    def setStampSizeTable(self, file_name=None, **kwargs):
+        """
+        Use an interpolated StampSizeTable, rather than the iterative
+        getGoodPhotImageSize search, to size the postage stamps of bright
+        extended objects.  Objects outside of the domain of the table
+        still use the iterative search.
+
+        Parameters
+        ----------
+        file_name: str [None]
+            If this file exists, the table is read from it (and its point
+            source part recomputed if it was made for a different PSF
+            FWHM).  Otherwise, the table is computed and, if file_name is
+            not None, written to it.  Since computing the table takes one
+            getGoodPhotImageSize search per grid point, reading a saved
+            table is much faster, especially for fine grids.
+        **kwargs:
+            Passed to the StampSizeTable constructor when the table is
+            computed.
+        """
+        fwhm = self.obs_metadata.OpsimMetaData['FWHMgeom']
+        if file_name is not None and os.path.isfile(file_name):
+            self.stamp_size_table = StampSizeTable.load(file_name, fwhm=fwhm)
+        else:
+            self.stamp_size_table = StampSizeTable(fwhm, **kwargs)
+            if file_name is not None:
+                self.stamp_size_table.save(file_name)
+
     def _getGoodPhotImageSize(self, gsObject, flux, keep_sb_level,
                               pixel_scale=0.2):
+        if (self.stamp_size_table is not None and
+                pixel_scale == self.stamp_size_table.pixel_scale):
+            image_size = self.stamp_size_table.getImageSize(gsObject, flux/keep_sb_level)
+            if image_size is not None:
+                return image_size
+
         point_source = self.drawPointSource(gsObject, self._double_gaussian_psf)
         point_source = point_source.withFlux(flux)
         ps_size = getGoodPhotImageSize(point_source, keep_sb_level,
@@ -1272,6 +2053,202 @@ def getGoodPhotImageSize(obj, keep_sb_level, pixel_scale=0.2):
     return int(N)
 
 
+class StampSizeTable(object):
+    """
+    An interpolated table of the postage stamp sizes returned by
+    GalSimSiliconInterpreter._getGoodPhotImageSize, i.e., the quadrature
+    sum of the getGoodPhotImageSize results for a point source convolved
+    with an SNRdocumentPSF and for the unconvolved Sersic profile.
+
+    Since the surface brightness of a profile scales with its flux, both
+    sizes only depend on the ratio flux/keep_sb_level.  The point source
+    sizes are tabulated as a function of that ratio for the PSF FWHM of the
+    visit; the Sersic sizes (which do not depend on the seeing) as a function
+    of (sindex, half light radius, ratio).  Elliptical and lensed profiles
+    are looked up as the circular profile matching them along their major
+    axis.  Objects outside of the domain of the table are not handled
+    (getImageSize returns None) so that the caller can fall back to the
+    exact search.
+    """
+
+    def __init__(self, fwhm, pixel_scale=0.2, sindex_grid=None,
+                 log10_hlr_grid=None, log10_ratio_grid=None, galaxy_sizes=None):
+        """
+        Parameters
+        ----------
+        fwhm: float
+            The FWHM in arcsec of the SNRdocumentPSF used for the point
+            source part of the stamp size.
+        pixel_scale: float [0.2]
+            The CCD pixel scale in arcsec.
+        sindex_grid: sequence of floats [None]
+            The Sersic indices at which to tabulate the sizes.  The
+            default is [0.5, 1, 2, 4, 6].
+        log10_hlr_grid: sequence of floats [None]
+            The log10 of the half light radii (arcsec) at which to
+            tabulate the sizes.  The default is -1.5 to 1.5 in steps of 0.5.
+        log10_ratio_grid: sequence of floats [None]
+            The log10 of the flux/keep_sb_level ratios at which to
+            tabulate the sizes.  The default is 1 to 9 in steps of 1.
+        galaxy_sizes: numpy.ndarray [None]
+            Previously computed Sersic sizes for these grids (as stored by
+            the save method).  If None, they are computed.
+
+        Computing the Sersic sizes takes one getGoodPhotImageSize search
+        per grid point, so its cost grows as the product of the grid
+        lengths (315 searches for the default grids).  Finer grids should
+        be computed once, saved, and read back with
+        GalSimInterpreter.setStampSizeTable(file_name=...).
+        """
+        if sindex_grid is None:
+            sindex_grid = [0.5, 1.0, 2.0, 4.0, 6.0]
+        if log10_hlr_grid is None:
+            log10_hlr_grid = np.arange(-1.5, 1.55, 0.5)
+        if log10_ratio_grid is None:
+            log10_ratio_grid = np.arange(1.0, 9.01, 1.0)
+
+        self._fwhm = float(fwhm)
+        self._pixel_scale = float(pixel_scale)
+        self._sindex_grid = np.array(sindex_grid, dtype=float)
+        self._log10_hlr_grid = np.array(log10_hlr_grid, dtype=float)
+        self._log10_ratio_grid = np.array(log10_ratio_grid, dtype=float)
+
+        psf = SNRdocumentPSF(self._fwhm)
+        point_source = psf.applyPSF(xPupil=0., yPupil=0.)
+        self._psf_sizes = np.array([getGoodPhotImageSize(point_source.withFlux(10.**log10_ratio),
+                                                         1.0, pixel_scale=self._pixel_scale)
+                                    for log10_ratio in self._log10_ratio_grid], dtype=float)
+
+        if galaxy_sizes is None:
+            galaxy_sizes = np.zeros((len(self._sindex_grid), len(self._log10_hlr_grid),
+                                     len(self._log10_ratio_grid)), dtype=float)
+            for i_n, sindex in enumerate(self._sindex_grid):
+                for i_hlr, log10_hlr in enumerate(self._log10_hlr_grid):
+                    profile = galsim.Sersic(n=sindex, half_light_radius=10.**log10_hlr)
+                    for i_ratio, log10_ratio in enumerate(self._log10_ratio_grid):
+                        galaxy_sizes[i_n, i_hlr, i_ratio] = \
+                            getGoodPhotImageSize(profile.withFlux(10.**log10_ratio), 1.0,
+                                                 pixel_scale=self._pixel_scale)
+        self._galaxy_sizes = np.array(galaxy_sizes, dtype=float)
+
+        if self._galaxy_sizes.shape != (len(self._sindex_grid), len(self._log10_hlr_grid),
+                                        len(self._log10_ratio_grid)):
+            raise RuntimeError("StampSizeTable galaxy_sizes has shape %s; it does not match "
+                               "the grids" % str(self._galaxy_sizes.shape))
+
+    @property
+    def fwhm(self):
+        return self._fwhm
+
+    @property
+    def pixel_scale(self):
+        return self._pixel_scale
+
+    def save(self, file_name):
+        """
+        Write the table to a numpy .npz file.
+        """
+        with open(file_name, 'wb') as output:
+            np.savez(output, fwhm=self._fwhm, pixel_scale=self._pixel_scale,
+                     sindex_grid=self._sindex_grid, log10_hlr_grid=self._log10_hlr_grid,
+                     log10_ratio_grid=self._log10_ratio_grid,
+                     galaxy_sizes=self._galaxy_sizes)
+
+    @classmethod
+    def load(cls, file_name, fwhm=None):
+        """
+        Read a table written by the save method.
+
+        Parameters
+        ----------
+        file_name: str
+            The .npz file to read.
+        fwhm: float [None]
+            The PSF FWHM (arcsec) of the current visit.  If it differs from
+            the one the table was computed for, only the (inexpensive)
+            point source sizes are recomputed.
+
+        Returns
+        -------
+        StampSizeTable
+        """
+        with np.load(file_name) as data:
+            if fwhm is None:
+                fwhm = float(data['fwhm'])
+            return cls(fwhm, pixel_scale=float(data['pixel_scale']),
+                       sindex_grid=data['sindex_grid'],
+                       log10_hlr_grid=data['log10_hlr_grid'],
+                       log10_ratio_grid=data['log10_ratio_grid'],
+                       galaxy_sizes=data['galaxy_sizes'])
+
+    @staticmethod
+    def _bracket(grid, value):
+        """
+        Return the index i and the weight w such that value lies between
+        grid[i] and grid[i+1] at a fraction w of the way; return None if
+        value is outside of the grid.
+        """
+        if not grid[0] <= value <= grid[-1]:
+            return None
+        if len(grid) == 1:
+            return 0, 0.0
+        ii = min(int(np.searchsorted(grid, value, side='right')) - 1, len(grid) - 2)
+        return ii, (value - grid[ii])/(grid[ii+1] - grid[ii])
+
+    def getImageSize(self, gsObject, sb_ratio):
+        """
+        Interpolate the stamp size for an object.
+
+        Parameters
+        ----------
+        gsObject: GalSimCelestialObject
+            The object being drawn.  Only sersic objects are handled.
+        sb_ratio: float
+            The ratio flux/keep_sb_level.
+
+        Returns
+        -------
+        int or None: The length N of the desired NxN postage stamp, or None
+            if the object is outside of the domain of the table.
+        """
+        if gsObject.galSimType != 'sersic':
+            return None
+
+        # The sheared profile matches, along its major axis, a circular
+        # profile with half light radius hlr/sqrt(q) and flux/q.  The
+        # lensing magnification scales the size by sqrt(mu) (keeping the
+        # surface brightness), and the lensing shear is folded into q.
+        q = gsObject.minorAxisRadians/gsObject.majorAxisRadians
+        g = np.sqrt(gsObject.g1**2 + gsObject.g2**2)
+        if not (0 < q <= 1 and g < 1 and gsObject.mu > 0 and sb_ratio > 0):
+            return None
+        q *= (1. - g)/(1. + g)
+        hlr = gsObject.halfLightRadiusArcsec*np.sqrt(gsObject.mu/q)
+        if not hlr > 0:
+            return None
+
+        ratio_bracket = self._bracket(self._log10_ratio_grid, np.log10(sb_ratio/q))
+        hlr_bracket = self._bracket(self._log10_hlr_grid, np.log10(hlr))
+        sindex_bracket = self._bracket(self._sindex_grid, gsObject.sindex)
+        if ratio_bracket is None or hlr_bracket is None or sindex_bracket is None:
+            return None
+
+        galaxy_size = 0.
+        for i_n, w_n in ((sindex_bracket[0], 1.-sindex_bracket[1]),
+                         (sindex_bracket[0]+1, sindex_bracket[1])):
+            for i_hlr, w_hlr in ((hlr_bracket[0], 1.-hlr_bracket[1]),
+                                 (hlr_bracket[0]+1, hlr_bracket[1])):
+                for i_ratio, w_ratio in ((ratio_bracket[0], 1.-ratio_bracket[1]),
+                                         (ratio_bracket[0]+1, ratio_bracket[1])):
+                    weight = w_n*w_hlr*w_ratio
+                    if weight > 0:
+                        galaxy_size += weight*self._galaxy_sizes[i_n, i_hlr, i_ratio]
+
+        psf_size = np.interp(np.log10(sb_ratio), self._log10_ratio_grid, self._psf_sizes)
+
+        return int(np.sqrt(psf_size**2 + galaxy_size**2))
+
+
 class ObjectFlags:
     """
     Class to keep track of the object rendering bit flags. The bits
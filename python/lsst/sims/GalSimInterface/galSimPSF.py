@@ -6,6 +6,7 @@ galsim into the CatSim interface
 from builtins import object
 import numpy
 import galsim
+from lsst.sims.GalSimInterface.galSimCache import LRUCache
 
 __all__ = ["PSFbase", "DoubleGaussianPSF", "SNRdocumentPSF",
            "Kolmogorov_and_Gaussian_PSF"]
@@ -191,6 +192,14 @@ class Kolmogorov_and_Gaussian_PSF(PSFbase):
     (you will need a SLAC Confluence account to access that link)
     """
 
+    # The galsim profiles are shared between all of the instances with the
+    # same parameters.  getStampBounds creates one of these per bright star
+    # with a star-dependent folding_threshold, so the folding_threshold is
+    # rounded down to a multiple of folding_threshold_log10_step in log10
+    # (rounding down keeps the PSF at least as accurate as requested).
+    _psf_cache = LRUCache(maxsize=100)
+    folding_threshold_log10_step = 0.05
+
     def __init__(self, airmass=1.2, rawSeeing=0.7, band='r', gsparams=None):
         """
         Parameters
@@ -201,7 +210,20 @@ class Kolmogorov_and_Gaussian_PSF(PSFbase):
         (provided by OpSim)
 
         band is the bandpass of the observation [u,g,r,i,z,y]
+
+        gsparams is an optional galsim.GSParams for the PSF profiles
         """
+        step = self.folding_threshold_log10_step
+        if gsparams is not None and step > 0:
+            folding_threshold = 10.**(numpy.floor(numpy.log10(gsparams.folding_threshold)/step)*step)
+            gsparams = gsparams.withParams(folding_threshold=folding_threshold)
+
+        key = (float(airmass), float(rawSeeing), band, gsparams)
+        self._cached_psf = self._psf_cache.get(key, lambda: self._makePSF(airmass, rawSeeing,
+                                                                         band, gsparams))
+
+    @staticmethod
+    def _makePSF(airmass, rawSeeing, band, gsparams):
         # This code was provided by David Kirkby in a private communication
 
         wlen_eff = dict(u=365.49, g=480.03, r=622.20, i=754.06, z=868.21, y=991.66)[band]
@@ -215,9 +237,22 @@ class Kolmogorov_and_Gaussian_PSF(PSFbase):
 
         atm = galsim.Kolmogorov(fwhm=FWHMatm, gsparams=gsparams)
         sys = galsim.Gaussian(fwhm=FWHMsys, gsparams=gsparams)
-        psf = galsim.Convolve((atm, sys))
+        return galsim.Convolve((atm, sys))
 
-        self._cached_psf = psf
+    @classmethod
+    def getCacheStats(cls):
+        """
+        Return a dict with the number of hits and misses and the size
+        of the cache of PSF profiles shared by all instances.
+        """
+        return cls._psf_cache.stats()
+
+    @classmethod
+    def clearCache(cls):
+        """
+        Empty the cache of PSF profiles and reset its statistics.
+        """
+        cls._psf_cache.clear()
 
     def _getPSF(self, xPupil=None, yPupil=None, **kwargs):
         return self._cached_psf
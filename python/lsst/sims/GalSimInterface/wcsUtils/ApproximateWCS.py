@@ -27,19 +27,26 @@ meas_astrom
 """
 
 from builtins import range
+from builtins import zip
+import warnings
 import numpy as np
+import lsst.afw.geom as afwGeom
 import lsst.afw.image as afwImage
 import lsst.afw.table as afwTable
+import lsst.daf.base as dafBase
 import lsst.geom as LsstGeom
 from lsst.meas.base import SingleFrameMeasurementTask
 from lsst.meas.astrom.sip import makeCreateWcsWithSip
 from lsst.sims.coordUtils import raDecFromPixelCoords
+from lsst.sims.utils import haversine, arcsecFromRadians
+from lsst.sims.GalSimInterface.wcsUtils import TanSipPolynomials
 
 __all__ = ["approximateWcs"]
 
 def approximateWcs(wcs, camera_wrapper=None, detector_name=None, obs_metadata=None,
                    order=3, nx=20, ny=20, iterations=3,
-                   skyTolerance=0.001*LsstGeom.arcseconds, pixelTolerance=0.02):
+                   skyTolerance=0.001*LsstGeom.arcseconds, pixelTolerance=0.02,
+                   fitter='afw'):
     """Approximate an existing WCS as a TAN-SIP WCS
 
     The fit is performed by evaluating the WCS at a uniform grid of points within a bounding box.
@@ -56,10 +63,59 @@ def approximateWcs(wcs, camera_wrapper=None, detector_name=None, obs_metadata=No
                input wcs and approximate wcs (default is 0.001 arcsec)
     @param[in] pixelTolerance maximum allowed difference in pixel coordinates between
                input wcs and approximate wcs (default is 0.02 pixels)
+    @param[in] fitter is 'afw' (default) to fit the WCS with meas_astrom's
+               makeCreateWcsWithSip, or 'numpy' to fit it with TanSipPolynomials.
+               If the 'numpy' fit does not reproduce the grid to within skyTolerance
+               and pixelTolerance, a warning is issued and the 'afw' fitter is
+               used instead.
     @return the fit TAN-SIP WCS
     """
+    if fitter not in ('afw', 'numpy'):
+        raise RuntimeError("approximateWcs fitter must be 'afw' or 'numpy'; you gave %s" % fitter)
+
     tanWcs = wcs
 
+    bbox = camera_wrapper.getBBox(detector_name)
+    bboxd = LsstGeom.Box2D(bbox)
+
+    # evaluate the camera transformation on the whole grid at once
+    xGrid, yGrid = np.meshgrid(np.linspace(bboxd.getMinX(), bboxd.getMaxX(), nx),
+                               np.linspace(bboxd.getMinY(), bboxd.getMaxY(), ny),
+                               indexing='ij')
+    xGrid = xGrid.flatten()
+    yGrid = yGrid.flatten()
+
+    raGrid, decGrid = camera_wrapper.raDecFromPixelCoords(xGrid, yGrid,
+                                                          detector_name,
+                                                          obs_metadata=obs_metadata,
+                                                          epoch=2000.0,
+                                                          includeDistortion=True)
+
+    if fitter == 'numpy':
+        crpix = tanWcs.getPixelOrigin()
+        crval = tanWcs.getSkyOrigin()
+        sip = TanSipPolynomials.fit(xGrid, yGrid, raGrid, decGrid,
+                                    (crpix.getX(), crpix.getY()),
+                                    (crval.getRa().asDegrees(), crval.getDec().asDegrees()),
+                                    order=order, iterations=iterations)
+
+        raFit, decFit = sip.pixelToSky(xGrid, yGrid)
+        skyError = arcsecFromRadians(haversine(np.radians(raFit), np.radians(decFit),
+                                               np.radians(raGrid), np.radians(decGrid)))
+        xFit, yFit = sip.skyToPixel(raGrid, decGrid)
+        pixelError = np.sqrt((xFit-xGrid)**2 + (yFit-yGrid)**2)
+
+        if (skyError.max() <= skyTolerance.asArcseconds() and
+                pixelError.max() <= pixelTolerance):
+            metadata = dafBase.PropertyList()
+            for name, value in sip.fitsCards():
+                metadata.set(name, value)
+            return afwGeom.makeSkyWcs(metadata)
+
+        warnings.warn("The numpy TAN-SIP fit to %s has maximum errors of %e arcsec and "
+                      "%e pixels, beyond skyTolerance or pixelTolerance; falling back "
+                      "to the afw fitter" % (detector_name, skyError.max(), pixelError.max()))
+
     # create a matchList consisting of a grid of points covering the bbox
     refSchema = afwTable.SimpleTable.makeMinimalSchema()
     refCoordKey = afwTable.CoordKey(refSchema["coord"])
@@ -79,28 +135,21 @@ def approximateWcs(wcs, camera_wrapper=None, detector_name=None, obs_metadata=No
     except AttributeError:
         matchList = []
 
-    bbox = camera_wrapper.getBBox(detector_name)
-    bboxd = LsstGeom.Box2D(bbox)
-
-    for x in np.linspace(bboxd.getMinX(), bboxd.getMaxX(), nx):
-        for y in np.linspace(bboxd.getMinY(), bboxd.getMaxY(), ny):
-            pixelPos = LsstGeom.Point2D(x, y)
-
-            ra, dec = camera_wrapper.raDecFromPixelCoords(np.array([x]), np.array([y]),
-                                                          detector_name,
-                                                          obs_metadata=obs_metadata,
-                                                          epoch=2000.0,
-                                                          includeDistortion=True)
-
-            skyCoord = LsstGeom.SpherePoint(ra[0], dec[0], LsstGeom.degrees)
-
-            refObj = refCat.addNew()
-            refObj.set(refCoordKey, skyCoord)
-
-            source = sourceCat.addNew()
-            source.set(sourceCentroidKey, pixelPos)
-
-            matchList.append(afwTable.ReferenceMatch(refObj, source, 0.0))
+    # reserve the space for the catalogs so that they are contiguous,
+    # then fill their columns in bulk
+    refCat.reserve(len(xGrid))
+    sourceCat.reserve(len(xGrid))
+    for ix in range(len(xGrid)):
+        refCat.addNew()
+        sourceCat.addNew()
+
+    refCat[refCoordKey.getRa()][:] = np.radians(raGrid)
+    refCat[refCoordKey.getDec()][:] = np.radians(decGrid)
+    sourceCat[sourceCentroidKey.getX()][:] = xGrid
+    sourceCat[sourceCentroidKey.getY()][:] = yGrid
+
+    for refObj, source in zip(refCat, sourceCat):
+        matchList.append(afwTable.ReferenceMatch(refObj, source, 0.0))
 
     # The TAN-SIP fitter is fitting x and y separately, so we have to iterate to make it converge
     for indx in range(iterations) :
@@ -0,0 +1,266 @@
+"""
+This file defines TanSipPolynomials, a pure-NumPy representation of a
+TAN-SIP WCS that can be fit to a grid of (pixel, sky) positions and
+evaluated on arrays of positions.
+
+Definition of the TAN-SIP WCS can be found in Shupe and Hook (2008)
+http://fits.gsfc.nasa.gov/registry/sip/SIP_distortion_v1_0.pdf
+"""
+
+from builtins import range
+from builtins import object
+import re
+import numpy as np
+
+__all__ = ["TanSipPolynomials"]
+
+
+def _monomials(order, min_degree):
+    """
+    Return the list of (p, q) exponents of the monomials x**p * y**q
+    with min_degree <= p+q <= order
+    """
+    return [(p, total - p) for total in range(min_degree, order + 1)
+            for p in range(total, -1, -1)]
+
+
+def _design(xx, yy, terms):
+    """
+    Return the design matrix (one row per point, one column per
+    monomial in terms) of a polynomial fit
+    """
+    return np.array([np.power(xx, p)*np.power(yy, q) for p, q in terms]).transpose()
+
+
+def _polynomial(coeffs, xx, yy):
+    """
+    Evaluate the polynomial sum(coeffs[(p, q)] * xx**p * yy**q)
+    """
+    result = np.zeros(np.shape(xx), dtype=float)
+    for (p, q), coeff in coeffs.items():
+        result += coeff*np.power(xx, p)*np.power(yy, q)
+    return result
+
+
+def _tangentBasis(crval):
+    """
+    Return the unit vectors pointing to crval (RA, Dec in degrees) and
+    east and north in the plane tangent to the sphere at crval
+    """
+    ra0, dec0 = np.radians(crval[0]), np.radians(crval[1])
+    center = np.array([np.cos(dec0)*np.cos(ra0), np.cos(dec0)*np.sin(ra0), np.sin(dec0)])
+    east = np.array([-np.sin(ra0), np.cos(ra0), 0.0])
+    north = np.array([-np.sin(dec0)*np.cos(ra0), -np.sin(dec0)*np.sin(ra0), np.cos(dec0)])
+    return center, east, north
+
+
+def _project(ra, dec, crval):
+    """
+    Gnomonic projection of RA, Dec (in degrees) about crval; return the
+    intermediate world coordinates in degrees
+    """
+    center, east, north = _tangentBasis(crval)
+    ra, dec = np.radians(ra), np.radians(dec)
+    points = np.array([np.cos(dec)*np.cos(ra), np.cos(dec)*np.sin(ra), np.sin(dec)])
+    cos_c = np.dot(center, points)
+    return np.degrees(np.dot(east, points)/cos_c), np.degrees(np.dot(north, points)/cos_c)
+
+
+def _deproject(uu, vv, crval):
+    """
+    Inverse of _project: return RA, Dec in degrees
+    """
+    center, east, north = _tangentBasis(crval)
+    uu, vv = np.radians(uu), np.radians(vv)
+    points = (center[:, None] + np.outer(east, np.atleast_1d(uu)) +
+              np.outer(north, np.atleast_1d(vv)))
+    points /= np.sqrt((points**2).sum(axis=0))
+    ra = np.degrees(np.arctan2(points[1], points[0])) % 360.0
+    dec = np.degrees(np.arcsin(points[2]))
+    return ra.reshape(np.shape(uu)), dec.reshape(np.shape(uu))
+
+
+class TanSipPolynomials(object):
+    """
+    A TAN-SIP WCS evaluated with NumPy.
+
+    Pixel coordinates follow the afw convention (the first pixel is 0;
+    the FITS cards use 1).  RA and Dec are in degrees.
+    """
+
+    _sip_card = re.compile(r'^(A|B|AP|BP)_([0-9]+)_([0-9]+)$')
+
+    def __init__(self, crpix, crval, cd, a, b, ap=None, bp=None):
+        """
+        @param [in] crpix is the (x, y) pixel reference point
+
+        @param [in] crval is the (RA, Dec) of the reference point in degrees
+
+        @param [in] cd is the 2x2 CD matrix in degrees per pixel
+
+        @param [in] a and b are dicts mapping (p, q) to the coefficients of
+        the forward SIP polynomials
+
+        @param [in] ap and bp are dicts mapping (p, q) to the coefficients of
+        the inverse SIP polynomials.  If None, the inverse is found by
+        iterating the forward polynomials.
+        """
+        self.crpix = (float(crpix[0]), float(crpix[1]))
+        self.crval = (float(crval[0]), float(crval[1]))
+        self.cd = np.array(cd, dtype=float)
+        self._cdinv = np.linalg.inv(self.cd)
+        self.a = dict(a)
+        self.b = dict(b)
+        self.ap = None if ap is None else dict(ap)
+        self.bp = None if bp is None else dict(bp)
+
+    @classmethod
+    def fit(cls, xPix, yPix, ra, dec, crpix, crval, order=3, iterations=3):
+        """
+        Fit a TAN-SIP WCS to a set of points by linear least squares.
+
+        The intermediate world coordinates are fit as polynomials of the
+        pixel offsets from crpix; the linear terms give the CD matrix and
+        the rest the forward SIP polynomials.  The inverse polynomials are
+        then fit to the same points.  crval is first moved to the sky
+        position of crpix.
+
+        @param [in] xPix and yPix are numpy arrays of pixel coordinates
+
+        @param [in] ra and dec are numpy arrays of the corresponding sky
+        coordinates in degrees
+
+        @param [in] crpix is the (x, y) pixel reference point
+
+        @param [in] crval is an initial guess of the (RA, Dec) of crpix in degrees
+
+        @param [in] order is the order of the SIP polynomials
+
+        @param [in] iterations is the number of times crval is refined
+
+        @param [out] a TanSipPolynomials
+        """
+        dx = np.asarray(xPix, dtype=float) - crpix[0]
+        dy = np.asarray(yPix, dtype=float) - crpix[1]
+
+        # fit in scaled pixel offsets to keep the design matrix well conditioned
+        scale = max(np.abs(dx).max(), np.abs(dy).max(), 1.0)
+
+        terms = _monomials(order, 0)
+        design = _design(dx/scale, dy/scale, terms)
+        for ix in range(iterations):
+            uu, vv = _project(ra, dec, crval)
+            coeffs = np.linalg.lstsq(design, np.array([uu, vv]).transpose(), rcond=None)[0]
+            crval = _deproject(coeffs[0][0], coeffs[0][1], crval)
+
+        terms = _monomials(order, 1)
+        degrees = np.array([p + q for p, q in terms])
+        uu, vv = _project(ra, dec, crval)
+        coeffs = np.linalg.lstsq(_design(dx/scale, dy/scale, terms),
+                                 np.array([uu, vv]).transpose(), rcond=None)[0]
+        coeffs = coeffs.transpose()/np.power(scale, degrees)
+
+        # terms[0] is (1, 0) and terms[1] is (0, 1)
+        cd = coeffs[:, :2]
+        sip = np.dot(np.linalg.inv(cd), coeffs)
+        a = {pq: sip[0][ix] for ix, pq in enumerate(terms) if degrees[ix] > 1}
+        b = {pq: sip[1][ix] for ix, pq in enumerate(terms) if degrees[ix] > 1}
+
+        # the inverse polynomials map the undistorted offsets back to dx, dy
+        undistorted = np.dot(np.linalg.inv(cd), np.array([uu, vv]))
+        scale = max(np.abs(undistorted).max(), 1.0)
+        coeffs = np.linalg.lstsq(_design(undistorted[0]/scale, undistorted[1]/scale, terms),
+                                 np.array([dx - undistorted[0], dy - undistorted[1]]).transpose(),
+                                 rcond=None)[0]
+        coeffs = coeffs.transpose()/np.power(scale, degrees)
+        ap = {pq: coeffs[0][ix] for ix, pq in enumerate(terms)}
+        bp = {pq: coeffs[1][ix] for ix, pq in enumerate(terms)}
+
+        return cls(crpix, (float(crval[0]), float(crval[1])), cd, a, b, ap, bp)
+
+    @classmethod
+    def fromFitsCards(cls, cards):
+        """
+        Build a TanSipPolynomials from a list of (name, value) FITS cards,
+        e.g. as returned by wcsUtils.fitsCardsFromWcs
+
+        @param [in] cards is a list of (name, value) tuples
+
+        @param [out] a TanSipPolynomials
+        """
+        header = dict(cards)
+        coeffs = dict(A={}, B={}, AP={}, BP={})
+        for name, value in cards:
+            match = cls._sip_card.match(name)
+            if match is not None:
+                coeffs[match.group(1)][(int(match.group(2)), int(match.group(3)))] = value
+        cd = [[header.get('CD1_1', 0.0), header.get('CD1_2', 0.0)],
+              [header.get('CD2_1', 0.0), header.get('CD2_2', 0.0)]]
+        has_inverse = 'AP_ORDER' in header and 'BP_ORDER' in header
+        return cls((header['CRPIX1'] - 1.0, header['CRPIX2'] - 1.0),
+                   (header['CRVAL1'], header['CRVAL2']), cd,
+                   coeffs['A'], coeffs['B'],
+                   coeffs['AP'] if has_inverse else None,
+                   coeffs['BP'] if has_inverse else None)
+
+    def fitsCards(self, epoch=2000.0):
+        """
+        Return the FITS representation of this WCS as a list of
+        (name, value) tuples (see wcsUtils.wcsFromFitsCards)
+        """
+        cards = [('RADESYS', 'ICRS'), ('EQUINOX', float(epoch)),
+                 ('CTYPE1', 'RA---TAN-SIP'), ('CTYPE2', 'DEC--TAN-SIP'),
+                 ('CUNIT1', 'deg'), ('CUNIT2', 'deg'),
+                 ('CRPIX1', self.crpix[0] + 1.0), ('CRPIX2', self.crpix[1] + 1.0),
+                 ('CRVAL1', self.crval[0]), ('CRVAL2', self.crval[1]),
+                 ('CD1_1', float(self.cd[0][0])), ('CD1_2', float(self.cd[0][1])),
+                 ('CD2_1', float(self.cd[1][0])), ('CD2_2', float(self.cd[1][1]))]
+        polynomials = [('A', self.a), ('B', self.b)]
+        if self.ap is not None:
+            polynomials += [('AP', self.ap), ('BP', self.bp)]
+        for name, coeffs in polynomials:
+            order = max([p + q for p, q in coeffs] + [0])
+            cards.append(('%s_ORDER' % name, order))
+            for (p, q) in sorted(coeffs):
+                cards.append(('%s_%d_%d' % (name, p, q), float(coeffs[(p, q)])))
+        return cards
+
+    def pixelToSky(self, xPix, yPix):
+        """
+        Convert pixel coordinates into RA, Dec
+
+        @param [in] xPix and yPix are pixel coordinates (floats or numpy arrays)
+
+        @param [out] RA and Dec in degrees
+        """
+        dx = np.asarray(xPix, dtype=float) - self.crpix[0]
+        dy = np.asarray(yPix, dtype=float) - self.crpix[1]
+        fx = dx + _polynomial(self.a, dx, dy)
+        fy = dy + _polynomial(self.b, dx, dy)
+        uu = self.cd[0][0]*fx + self.cd[0][1]*fy
+        vv = self.cd[1][0]*fx + self.cd[1][1]*fy
+        return _deproject(uu, vv, self.crval)
+
+    def skyToPixel(self, ra, dec, iterations=2):
+        """
+        Convert RA, Dec into pixel coordinates
+
+        @param [in] ra and dec are in degrees (floats or numpy arrays)
+
+        @param [in] iterations is the number of times the result of the
+        inverse polynomials is refined using the forward polynomials
+
+        @param [out] the x and y pixel coordinates
+        """
+        uu, vv = _project(ra, dec, self.crval)
+        fx = self._cdinv[0][0]*uu + self._cdinv[0][1]*vv
+        fy = self._cdinv[1][0]*uu + self._cdinv[1][1]*vv
+        if self.ap is not None:
+            dx = fx + _polynomial(self.ap, fx, fy)
+            dy = fy + _polynomial(self.bp, fx, fy)
+        else:
+            dx, dy = fx, fy
+            iterations = max(iterations, 10)
+        for ix in range(iterations):
+            dx, dy = fx - _polynomial(self.a, dx, dy), fy - _polynomial(self.b, dx, dy)
+        return dx + self.crpix[0], dy + self.crpix[1]
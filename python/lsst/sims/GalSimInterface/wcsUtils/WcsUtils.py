@@ -1,3 +1,7 @@
+import os
+import json
+import hashlib
+import tempfile
 import numpy as np
 from lsst.afw.cameraGeom import TAN_PIXELS, FOCAL_PLANE
 import lsst.afw.geom as afwGeom
@@ -8,7 +12,64 @@ import lsst.daf.base as dafBase
 from lsst.sims.GalSimInterface.wcsUtils import approximateWcs
 from lsst.sims.utils import _nativeLonLatFromPointing
 
-__all__ = ["tanWcsFromDetector", "tanSipWcsFromDetector"]
+__all__ = ["tanWcsFromDetector", "tanSipWcsFromDetector",
+           "fitsCardsFromWcs", "wcsFromFitsCards", "setTanSipWcsCacheDir"]
+
+# the directory in which tanSipWcsFromDetector caches the fitted WCSs
+# (None if they are not cached); see setTanSipWcsCacheDir
+_tanSipWcsCacheDir = None
+
+# the version of the cache file format and of the fit; it is part of the
+# cache key, so it must be incremented whenever either changes
+_tanSipWcsCacheVersion = 1
+
+
+def setTanSipWcsCacheDir(cache_dir):
+    """
+    Set the directory in which tanSipWcsFromDetector caches the TAN-SIP
+    WCSs it fits, so that they can be reused by later runs and by other
+    processes simulating the same visits.
+
+    @param [in] cache_dir is the name of the cache directory (it is created
+    if it does not exist), or None to stop caching the WCSs
+    """
+    global _tanSipWcsCacheDir
+    if cache_dir is not None and not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    _tanSipWcsCacheDir = cache_dir
+
+
+def _tanSipWcsCacheFile(detector_name, camera_wrapper, obs_metadata, epoch,
+                        order, skyToleranceArcSec, pixelTolerance, fitter):
+    """
+    Return the name of the file in which the TAN-SIP WCS fit to a detector
+    with these parameters is cached, or None if WCSs are not cached.
+
+    The file name is a hash of everything the fit depends on.  The camera
+    is identified by its name, the class of camera_wrapper (which sets
+    the pixel coordinate conventions) and the geometry of the detector:
+    its bounding box and the focal plane and field angle positions of its
+    corners.
+    """
+    if _tanSipWcsCacheDir is None:
+        return None
+    bandpass = obs_metadata.bandpass
+    if isinstance(bandpass, np.ndarray):
+        bandpass = bandpass.tolist()
+    camera = camera_wrapper.camera
+    bbox = camera_wrapper.getBBox(detector_name)
+    corners = camera[detector_name].getCorners(FOCAL_PLANE)
+    geometry = [[bbox.getMinX(), bbox.getMinY(), bbox.getMaxX(), bbox.getMaxY()]]
+    geometry += [[float(pt.getX()), float(pt.getY())] for pt in corners]
+    geometry += [[float(pt.getX()), float(pt.getY())]
+                 for pt in camera_wrapper.focal_to_field.applyForward(corners)]
+    key = [_tanSipWcsCacheVersion, detector_name, camera.getName(),
+           type(camera_wrapper).__name__, geometry,
+           obs_metadata.pointingRA, obs_metadata.pointingDec, obs_metadata.rotSkyPos,
+           None if obs_metadata.mjd is None else obs_metadata.mjd.TAI,
+           bandpass, epoch, order, skyToleranceArcSec, pixelTolerance, fitter]
+    digest = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+    return os.path.join(_tanSipWcsCacheDir, 'tanSipWcs_%s.json' % digest)
 
 
 def tanWcsFromDetector(detector_name, camera_wrapper, obs_metadata, epoch):
@@ -131,7 +192,8 @@ def tanWcsFromDetector(detector_name, camera_wrapper, obs_metadata, epoch):
 def tanSipWcsFromDetector(detector_name, camera_wrapper, obs_metadata, epoch,
                           order=3,
                           skyToleranceArcSec=0.001,
-                          pixelTolerance=0.01):
+                          pixelTolerance=0.01,
+                          fitter='afw'):
     """
     Take an afw Detector and approximate its pixel-to-(Ra,Dec) transformation
     with a TAN-SIP WCs.
@@ -159,11 +221,26 @@ def tanSipWcsFromDetector(detector_name, camera_wrapper, obs_metadata, epoch,
     @param [in] pixelTolerance is the maximum allowed error in the fitted
     pixel coordinates.  Default 0.02
 
+    @param [in] fitter is 'afw' (default) or 'numpy'; see approximateWcs
+
+    If a cache directory has been set with setTanSipWcsCacheDir, the fitted
+    WCS is read from (or written to) the cache.
+
     @param [out] tanSipWcs is an instantiation of afw.image's TanWcs class
     representing the WCS of the detector with optical distortions parametrized
     by the SIP polynomials.
     """
 
+    cache_file = _tanSipWcsCacheFile(detector_name, camera_wrapper, obs_metadata, epoch,
+                                     order, skyToleranceArcSec, pixelTolerance, fitter)
+    if cache_file is not None and os.path.isfile(cache_file):
+        try:
+            with open(cache_file, 'r') as input_:
+                return wcsFromFitsCards(json.load(input_))
+        except Exception:
+            # the cached file cannot be read; fit the WCS again
+            pass
+
     bbox = camera_wrapper.getBBox(detector_name)
 
     tanWcs = tanWcsFromDetector(detector_name, camera_wrapper, obs_metadata, epoch)
@@ -174,7 +251,45 @@ def tanSipWcsFromDetector(detector_name, camera_wrapper, obs_metadata, epoch,
                                pixelTolerance=pixelTolerance,
                                detector_name=detector_name,
                                camera_wrapper=camera_wrapper,
-                               obs_metadata=obs_metadata)
+                               obs_metadata=obs_metadata,
+                               fitter=fitter)
+
+    if cache_file is not None:
+        # write to a temporary file and rename it, so that other processes
+        # never read a partially written file
+        with tempfile.NamedTemporaryFile(mode='w', delete=False,
+                                         dir=os.path.dirname(cache_file)) as tmp:
+            json.dump(fitsCardsFromWcs(tanSipWcs), tmp)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp.name, cache_file)
 
     return tanSipWcs
 
+
+def fitsCardsFromWcs(wcs):
+    """
+    Return the FITS representation of a WCS as a list of (name, value)
+    tuples, which (unlike the WCS itself) can be pickled or written as JSON.
+
+    @param [in] wcs is an afw SkyWcs, e.g. as returned by tanSipWcsFromDetector
+
+    @param [out] a list of (name, value) tuples, one per FITS card, from
+    which wcsFromFitsCards rebuilds the WCS
+    """
+    metadata = wcs.getFitsMetadata()
+    return [(name, metadata.getScalar(name)) for name in metadata.getOrderedNames()]
+
+
+def wcsFromFitsCards(cards):
+    """
+    Rebuild a WCS from the output of fitsCardsFromWcs
+
+    @param [in] cards is a list of (name, value) tuples
+
+    @param [out] an afw SkyWcs
+    """
+    metadata = dafBase.PropertyList()
+    for name, value in cards:
+        metadata.set(name, value)
+    return afwGeom.makeSkyWcs(metadata)
@@ -1,2 +1,3 @@
+from .TanSipPolynomials import *
 from .ApproximateWCS import *
 from .WcsUtils import *
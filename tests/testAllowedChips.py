@@ -12,12 +12,12 @@ import lsst.afw.cameraGeom.testUtils as camTestUtils
 import lsst.afw.image as afwImage
 from lsst.afw.cameraGeom import DetectorType
 from lsst.sims.utils.CodeUtilities import sims_clean_up
-from lsst.sims.utils import ObservationMetaData
+from lsst.sims.utils import ObservationMetaData, radiansFromArcsec
 from lsst.sims.catalogs.db import fileDBObject
 from lsst.sims.coordUtils import raDecFromPixelCoords
 from lsst.sims.photUtils import Sed, Bandpass, BandpassDict, PhotometricParameters
 from lsst.sims.GalSimInterface import GalSimStars, SNRdocumentPSF
-from lsst.sims.GalSimInterface import GalSimCameraWrapper
+from lsst.sims.GalSimInterface import GalSimCameraWrapper, GalSimCelestialObject
 from testUtils import create_text_catalog
 
 ROOT = os.path.abspath(os.path.dirname(__file__))
@@ -57,6 +57,16 @@ class allowedChipsCatalog(GalSimStars):
                         ]
 
 
+class precullCatalog(allowedChipsCatalog):
+
+    precull_halo_arcsec = 20.0
+    n_seds = 0
+
+    def _calcSingleGalSimSed(self, *args):
+        self.n_seds += 1
+        return allowedChipsCatalog._calcSingleGalSimSed(self, *args)
+
+
 class allowedChipsTest(unittest.TestCase):
 
     longMessage = True
@@ -224,6 +234,119 @@ class allowedChipsTest(unittest.TestCase):
         if os.path.exists(control_cat_name):
             os.unlink(control_cat_name)
 
+    def testPrecull(self):
+        """
+        Test that a catalog with precull_halo_arcsec set only computes the
+        SEDs of the objects near the allowed chips, and still draws those
+        objects.
+        """
+        name_list = [dd.getName() for dd in self.camera
+                     if dd.getType() != DetectorType.WAVEFRONT and dd.getType() != DetectorType.GUIDER]
+        allowed_chips = [name_list[3], name_list[4]]
+
+        testCatalog = precullCatalog(self.db, obs_metadata=self.obs)
+        testCatalog.setPSF(SNRdocumentPSF())
+        testCatalog.camera_wrapper = GalSimCameraWrapper(self.camera)
+        testCatalog.allowed_chips = allowed_chips
+
+        test_root = os.path.join(self.scratchDir, 'precull_test_image')
+        test_cat_name = os.path.join(self.scratchDir, 'precull_test_cat.txt')
+        testCatalog.write_catalog(test_cat_name)
+        image_names = testCatalog.write_images(nameRoot=test_root)
+
+        self.assertGreaterEqual(testCatalog.n_seds, len(allowed_chips))
+        self.assertLess(testCatalog.n_seds, len(list(self.camera)))
+        self.assertEqual(len(testCatalog.objectHasBeenDrawn), len(list(self.camera)))
+
+        self.assertEqual(len(image_names), len(allowed_chips))
+        for image_name in image_names:
+            im = afwImage.ImageF(image_name).getArray()
+            self.assertLess(np.abs(im.sum()-self.controlADU), 3.0*self.countSigma)
+            os.unlink(image_name)
+
+        if os.path.exists(test_cat_name):
+            os.unlink(test_cat_name)
+
+    def testPrecullBrightStar(self):
+        """
+        Test that precull keeps a star off of the allowed chips that is
+        bright enough in the bands being drawn for its wings to reach them,
+        and discards a faint star at the same position.
+        """
+        name_list = [dd.getName() for dd in self.camera
+                     if dd.getType() != DetectorType.WAVEFRONT and dd.getType() != DetectorType.GUIDER]
+
+        testCatalog = precullCatalog(self.db, obs_metadata=self.obs)
+        testCatalog.setPSF(SNRdocumentPSF())
+        testCatalog.camera_wrapper = GalSimCameraWrapper(self.camera)
+        testCatalog.allowed_chips = [name_list[3]]
+        testCatalog._initializeGalSimCatalog()
+        detector = testCatalog.galSimInterpreter.detectors[0]
+
+        # both stars are 100 arcsec beyond the edge of the chip; the first
+        # is fainter than precull_halo_mag in the imsim band, but not
+        # necessarily in the bands being drawn
+        stars = [self._makeObject(testCatalog, 'pointSource',
+                                  detector.xMaxArcsec + 100.0, detector.yCenterArcsec)]*2
+        magNorm = np.array([testCatalog.precull_halo_mag - 1.0, 25.0])
+        keep = testCatalog._precullMask(stars, magNorm)
+        np.testing.assert_array_equal(keep, [True, False])
+
+        # the PSF alone widens the box beyond precull_halo_arcsec
+        stars = [self._makeObject(testCatalog, 'pointSource',
+                                  detector.xMaxArcsec + testCatalog.precull_halo_arcsec + 5.0,
+                                  detector.yCenterArcsec)]
+        keep = testCatalog._precullMask(stars, np.array([25.0]))
+        np.testing.assert_array_equal(keep, [True])
+
+    def testPrecullKeepsAssignedObjects(self):
+        """
+        Test that precull keeps every object that findAllDetectors assigns
+        to a detector, including large, high Sersic index galaxies whose
+        stamps are many half light radii across.
+        """
+        name_list = [dd.getName() for dd in self.camera
+                     if dd.getType() != DetectorType.WAVEFRONT and dd.getType() != DetectorType.GUIDER]
+
+        testCatalog = precullCatalog(self.db, obs_metadata=self.obs)
+        testCatalog.setPSF(SNRdocumentPSF())
+        testCatalog.camera_wrapper = GalSimCameraWrapper(self.camera)
+        testCatalog.allowed_chips = [name_list[3]]
+        # without a halo, the precull box is exactly the box findAllDetectors tests
+        testCatalog.precull_halo_arcsec = 0.0
+        testCatalog._initializeGalSimCatalog()
+        gs_interpreter = testCatalog.galSimInterpreter
+        detector = gs_interpreter.detectors[0]
+
+        gsObjList = []
+        for offset in np.arange(0.0, 600.0, 10.0):
+            xArcsec = detector.xMaxArcsec + offset
+            gsObjList.append(self._makeObject(testCatalog, 'pointSource',
+                                              xArcsec, detector.yCenterArcsec))
+            for hlr, sindex in ((1.0, 1.0), (2.0, 4.0), (5.0, 6.0), (10.0, 1.0)):
+                gsObjList.append(self._makeObject(testCatalog, 'sersic',
+                                                  xArcsec, detector.yCenterArcsec,
+                                                  hlr=hlr, sindex=sindex))
+
+        keep = testCatalog._precullMask(gsObjList, np.array([25.0]*len(gsObjList)))
+        assigned = np.array([len(gs_interpreter.findAllDetectors(gsObject)[1]) > 0
+                             for gsObject in gsObjList])
+        self.assertGreater(assigned.sum(), 0)
+        self.assertLess(assigned.sum(), len(gsObjList))
+        np.testing.assert_array_equal(keep[assigned], True)
+
+    def _makeObject(self, testCatalog, galSimType, xArcsec, yArcsec, hlr=0.0, sindex=1.0):
+        """
+        Return a GalSimCelestialObject without an SED, as get_fitsFiles
+        passes to _precullMask
+        """
+        hlr = radiansFromArcsec(hlr)
+        return GalSimCelestialObject(galSimType, radiansFromArcsec(xArcsec),
+                                     radiansFromArcsec(yArcsec),
+                                     hlr, 0.5*hlr, hlr, 0.3, sindex,
+                                     None, testCatalog.bandpassDict, testCatalog.photParams,
+                                     0, None, None, None)
+
 
 class MemoryTestClass(lsst.utils.tests.MemoryTestCase):
     pass
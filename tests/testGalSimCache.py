@@ -0,0 +1,183 @@
+import unittest
+import numpy as np
+import galsim
+import lsst.utils.tests
+import lsst.afw.cameraGeom.testUtils as camTestUtils
+from lsst.sims.utils.CodeUtilities import sims_clean_up
+from lsst.sims.utils import ObservationMetaData, radiansFromArcsec
+from lsst.sims.photUtils import PhotometricParameters, BandpassDict, Sed
+from lsst.sims.GalSimInterface import (LRUCache, GalSimInterpreter, GalSimCameraWrapper,
+                                       GalSimCelestialObject, SNRdocumentPSF,
+                                       Kolmogorov_and_Gaussian_PSF,
+                                       make_galsim_detector)
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def test_lru_cache(self):
+        """
+        Test that LRUCache only calls the factory on a miss, counts hits
+        and misses, and discards the least recently used entry
+        """
+        calls = []
+
+        def factory(value):
+            def make():
+                calls.append(value)
+                return value*2
+            return make
+
+        cache = LRUCache(maxsize=2)
+        self.assertEqual(cache.get('a', factory(1)), 2)
+        self.assertEqual(cache.get('b', factory(2)), 4)
+        self.assertEqual(cache.get('a', factory(1)), 2)
+        self.assertEqual(calls, [1, 2])
+        self.assertEqual(cache.stats(), dict(hits=1, misses=2, size=2, maxsize=2))
+
+        # 'b' is now the least recently used entry
+        self.assertEqual(cache.get('c', factory(3)), 6)
+        self.assertIn('a', cache)
+        self.assertIn('c', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(len(cache), 2)
+
+        cache.maxsize = 1
+        self.assertEqual(len(cache), 1)
+        self.assertIn('c', cache)
+
+        cache.clear()
+        self.assertEqual(cache.stats(), dict(hits=0, misses=0, size=0, maxsize=1))
+
+        cache = LRUCache(maxsize=0)
+        cache.get('a', factory(1))
+        cache.get('a', factory(1))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.misses, 2)
+
+        with self.assertRaises(RuntimeError):
+            LRUCache(maxsize=-1)
+
+
+class ProfileCacheTestCase(unittest.TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        sims_clean_up()
+
+    def test_profile_cache(self):
+        """
+        Test that GalSimInterpreter builds the profile of a galaxy only
+        once, and that galaxies with nearly identical shapes share it
+        """
+        camera_wrapper = GalSimCameraWrapper(camTestUtils.CameraWrapper().camera)
+        phot_params = PhotometricParameters()
+        obs_md = ObservationMetaData(pointingRA=23.0, pointingDec=12.0,
+                                     rotSkyPos=13.2, mjd=59580.0,
+                                     bandpassName='r')
+        detector = make_galsim_detector(camera_wrapper,
+                                        camera_wrapper.camera[0].getName(),
+                                        phot_params, obs_md)
+        bp_dict = BandpassDict.loadTotalBandpassesFromFiles(bandpassNames=['r'])
+        sed = Sed()
+        sed.setFlatSED()
+
+        gs_interpreter = GalSimInterpreter(obs_metadata=obs_md,
+                                           detectors=[detector],
+                                           bandpassDict=bp_dict)
+        gs_interpreter.setPSF(SNRdocumentPSF())
+
+        def make_galaxy(uniqueId, hlr_arcsec, sindex):
+            return GalSimCelestialObject('sersic', 0.0, 0.0,
+                                         radiansFromArcsec(hlr_arcsec),
+                                         radiansFromArcsec(0.5), radiansFromArcsec(0.8),
+                                         0.3, sindex, sed, bp_dict, phot_params,
+                                         0, None, None, None, uniqueId=uniqueId)
+
+        galaxy = make_galaxy(1, 0.6, 2.5)
+        obj1 = gs_interpreter.createCenteredObject(galaxy)
+        obj2 = gs_interpreter.createCenteredObject(galaxy)
+        self.assertEqual(gs_interpreter.profile_cache.misses, 1)
+        self.assertEqual(gs_interpreter.profile_cache.hits, 1)
+        self.assertEqual(obj1, obj2)
+
+        # by default, only galaxies with exactly the same shape share a
+        # profile, and it is the profile that would be built without the cache
+        nearby = make_galaxy(2, 0.6*(1.0+1.0e-7), 2.5+1.0e-6)
+        gs_interpreter.createCenteredObject(nearby)
+        self.assertEqual(gs_interpreter.profile_cache.misses, 2)
+        self.assertEqual(gs_interpreter.profile_cache.hits, 1)
+
+        expected = galsim.Sersic(n=float(galaxy.sindex),
+                                 half_light_radius=float(galaxy.halfLightRadiusArcsec))
+        expected = expected.shear(q=galaxy.minorAxisRadians/galaxy.majorAxisRadians,
+                                  beta=(0.5*np.pi+galaxy.positionAngleRadians)*galsim.radians)
+        expected = expected.lens(galaxy.g1, galaxy.g2, galaxy.mu)
+        expected = SNRdocumentPSF().applyPSF(xPupil=galaxy.xPupilArcsec,
+                                             yPupil=galaxy.yPupilArcsec, obj=expected)
+        self.assertEqual(obj1, expected)
+
+        # with quantization turned on, a galaxy whose shape differs by
+        # much less than the quantization steps shares the profile
+        gs_interpreter.profile_quantization = dict(sindex=1.0e-3, hlr=1.0e-4, q=1.0e-4, beta=1.0e-4)
+        gs_interpreter.profile_cache.clear()
+        gs_interpreter.createCenteredObject(galaxy)
+        gs_interpreter.createCenteredObject(nearby)
+        self.assertEqual(gs_interpreter.profile_cache.misses, 1)
+        self.assertEqual(gs_interpreter.profile_cache.hits, 1)
+
+        # a different galaxy does not
+        gs_interpreter.createCenteredObject(make_galaxy(3, 1.2, 1.0))
+        self.assertEqual(gs_interpreter.profile_cache.misses, 2)
+
+        # RandomWalk objects have no Sersic index and are not cached
+        knots = GalSimCelestialObject('RandomWalk', 0.0, 0.0,
+                                      radiansFromArcsec(0.6),
+                                      radiansFromArcsec(0.5), radiansFromArcsec(0.8),
+                                      0.3, None, sed, bp_dict, phot_params,
+                                      100, None, None, None, uniqueId=4)
+        gs_interpreter.createCenteredObject(knots)
+        self.assertEqual(gs_interpreter.profile_cache.misses, 2)
+        self.assertEqual(len(gs_interpreter.profile_cache), 2)
+
+
+class PSFCacheTestCase(unittest.TestCase):
+
+    def test_kolmogorov_and_gaussian_cache(self):
+        """
+        Test that Kolmogorov_and_Gaussian_PSFs with the same parameters
+        (up to the rounding of folding_threshold) share their profiles
+        """
+        Kolmogorov_and_Gaussian_PSF.clearCache()
+        psf1 = Kolmogorov_and_Gaussian_PSF(airmass=1.1, rawSeeing=0.6, band='i')
+        psf2 = Kolmogorov_and_Gaussian_PSF(airmass=1.1, rawSeeing=0.6, band='i')
+        self.assertIs(psf1._getPSF(), psf2._getPSF())
+        self.assertEqual(Kolmogorov_and_Gaussian_PSF.getCacheStats()['hits'], 1)
+        self.assertEqual(Kolmogorov_and_Gaussian_PSF.getCacheStats()['misses'], 1)
+
+        Kolmogorov_and_Gaussian_PSF(airmass=1.1, rawSeeing=0.6, band='r')
+        self.assertEqual(Kolmogorov_and_Gaussian_PSF.getCacheStats()['misses'], 2)
+
+        # nearby folding thresholds share a profile, whose folding
+        # threshold is no larger than the requested ones
+        psfs = [Kolmogorov_and_Gaussian_PSF(airmass=1.1, rawSeeing=0.6, band='i',
+                                            gsparams=galsim.GSParams(folding_threshold=ft))
+                for ft in (1.001e-4, 1.002e-4)]
+        self.assertIs(psfs[0]._getPSF(), psfs[1]._getPSF())
+        self.assertLessEqual(psfs[0]._getPSF().gsparams.folding_threshold, 1.001e-4)
+        self.assertGreater(psfs[0]._getPSF().gsparams.folding_threshold, 1.001e-4/1.13)
+        self.assertEqual(Kolmogorov_and_Gaussian_PSF.getCacheStats()['size'], 3)
+
+        Kolmogorov_and_Gaussian_PSF.clearCache()
+        self.assertEqual(Kolmogorov_and_Gaussian_PSF.getCacheStats()['size'], 0)
+
+
+class MemoryTestClass(lsst.utils.tests.MemoryTestCase):
+    pass
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
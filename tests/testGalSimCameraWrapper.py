@@ -446,6 +446,108 @@ class Camera_Wrapper_Test_Class(unittest.TestCase):
         del camera_wrapper
         del lsst_camera._lsst_camera
 
+    def test_chip_name_arrays(self):
+        """
+        Test that the LSSTCameraWrapper transformations give the same
+        results for arrays of chip names as for one chip at a time
+        """
+        camera = lsst_camera()
+        camera_wrapper = LSSTCameraWrapper()
+        obs = ObservationMetaData(pointingRA=25.0, pointingDec=-12.0,
+                                  rotSkyPos=31.0, mjd=60000.0,
+                                  bandpassName='g')
+
+        npts = 50
+        rng = np.random.RandomState(5521)
+        name_list = [det.getName() for det in camera]
+        chip_name_list = rng.choice(name_list[:5], size=npts)
+        cam_x_pix = rng.random_sample(npts)*4000.0
+        cam_y_pix = rng.random_sample(npts)*4000.0
+
+        x_pup, y_pup = camera_wrapper.pupilCoordsFromPixelCoords(cam_x_pix, cam_y_pix,
+                                                                 chip_name_list, obs)
+        ra, dec = camera_wrapper._raDecFromPixelCoords(cam_x_pix, cam_y_pix,
+                                                       list(chip_name_list), obs)
+        x_pix, y_pix = camera_wrapper._pixelCoordsFromRaDec(ra, dec,
+                                                            chipName=chip_name_list,
+                                                            obs_metadata=obs)
+        np.testing.assert_allclose(x_pix, cam_x_pix, atol=1.0e-4, rtol=0.0)
+        np.testing.assert_allclose(y_pix, cam_y_pix, atol=1.0e-4, rtol=0.0)
+
+        for ii in range(npts):
+            x, y = camera_wrapper.pupilCoordsFromPixelCoords(cam_x_pix[ii], cam_y_pix[ii],
+                                                             chip_name_list[ii], obs)
+            self.assertAlmostEqual(x, x_pup[ii], 12)
+            self.assertAlmostEqual(y, y_pup[ii], 12)
+
+            ra_one, dec_one = camera_wrapper._raDecFromPixelCoords(cam_x_pix[ii], cam_y_pix[ii],
+                                                                   chip_name_list[ii], obs)
+            self.assertAlmostEqual(ra_one, ra[ii], 12)
+            self.assertAlmostEqual(dec_one, dec[ii], 12)
+
+        del camera
+        del camera_wrapper
+        del lsst_camera._lsst_camera
+
+    def test_fast_transform(self):
+        """
+        Test that, with fast_transform set, pixelCoordsFromPupilCoords
+        agrees with the exact transformation to within the residual
+        recorded for the polynomials
+        """
+        camera = lsst_camera()
+        obs = ObservationMetaData(bandpassName='r')
+        rng = np.random.RandomState(6613)
+
+        for camera_wrapper in (GalSimCameraWrapper(camTestUtils.CameraWrapper().camera),
+                               LSSTCameraWrapper()):
+            name_list = [det.getName() for det in camera_wrapper.camera][:3]
+            for name in name_list:
+                poly = camera_wrapper.getFastTransform(name, obs)
+                self.assertLess(poly.maxResidual, camera_wrapper.fast_transform_tolerance)
+                self.assertIs(poly, camera_wrapper.getFastTransform(name, obs))
+
+            chip_name_list = rng.choice(name_list, size=100)
+            center_list = [camera_wrapper.getCenterPupil(name) for name in chip_name_list]
+            x_pup = np.array([center.getX() for center in center_list])
+            y_pup = np.array([center.getY() for center in center_list])
+            x_pup += (rng.random_sample(100)-0.5)*0.004
+            y_pup += (rng.random_sample(100)-0.5)*0.004
+            # a point far from its detector, evaluated exactly
+            x_pup[0] += 0.05
+
+            x_exact, y_exact = camera_wrapper.pixelCoordsFromPupilCoords(x_pup, y_pup,
+                                                                         chip_name_list, obs)
+            camera_wrapper.fast_transform = True
+            x_fast, y_fast = camera_wrapper.pixelCoordsFromPupilCoords(x_pup, y_pup,
+                                                                       chip_name_list, obs)
+            np.testing.assert_allclose(x_fast, x_exact, atol=0.01, rtol=0.0)
+            np.testing.assert_allclose(y_fast, y_exact, atol=0.01, rtol=0.0)
+            self.assertEqual(x_fast[0], x_exact[0])
+            self.assertEqual(y_fast[0], y_exact[0])
+
+            x_one, y_one = camera_wrapper.pixelCoordsFromPupilCoords(x_pup[1], y_pup[1],
+                                                                     chip_name_list[1], obs)
+            self.assertAlmostEqual(x_one, x_fast[1], 10)
+            self.assertAlmostEqual(y_one, y_fast[1], 10)
+
+            # a fit that misses the tolerance is reported
+            camera_wrapper.fast_transform_tolerance = 0.0
+            camera_wrapper.fast_transform_grid_size += 1
+            with self.assertWarns(UserWarning):
+                camera_wrapper.getFastTransform(name_list[0], obs)
+
+        # the cache handles obs_metadata with several bandpasses
+        camera_wrapper = GalSimCameraWrapper(camTestUtils.CameraWrapper().camera)
+        name = camera_wrapper.camera[0].getName()
+        obs_multi = ObservationMetaData(bandpassName=['r', 'i'])
+        poly = camera_wrapper.getFastTransform(name, obs_multi)
+        self.assertIs(poly, camera_wrapper.getFastTransform(name, obs_multi))
+
+        del camera
+        del camera_wrapper
+        del lsst_camera._lsst_camera
+
     def test_camPixFromDMpix(self):
         """
         test that camPixFromDMpix inverts dmPixFromCamPix
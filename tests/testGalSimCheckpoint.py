@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import lsst.utils.tests
+from lsst.sims.GalSimInterface import CheckpointDirectory, compressArray, decompressArray
+
+ROOT = os.path.abspath(os.path.dirname(__file__))
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+class CheckpointDirectoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.scratch_dir = tempfile.mkdtemp(dir=ROOT, prefix='CheckpointDirectoryTestCase-')
+        self.cp_dir = os.path.join(self.scratch_dir, 'checkpoint')
+
+    def tearDown(self):
+        if os.path.exists(self.scratch_dir):
+            shutil.rmtree(self.scratch_dir)
+
+    def test_round_trip(self):
+        """
+        Test that CheckpointDirectory.read returns the last checkpoint
+        written, including images that were not rewritten in it
+        """
+        store = CheckpointDirectory(self.cp_dir)
+        self.assertIsNone(store.read())
+
+        rng = np.random.RandomState(42)
+        image_a = rng.random_sample((20, 30))
+        image_b = rng.random_sample((10, 10)).astype(np.float32)
+        store.write(dict(a=image_a, b=image_b), 'rng0', set([1, 2]), [(1,), (2,)])
+        store.write(dict(a=2*image_a), 'rng1', set([1, 2, 3]), [(1,), (2,), (3,)])
+
+        state = CheckpointDirectory(self.cp_dir).read()
+        np.testing.assert_array_equal(state['images']['a'], 2*image_a)
+        np.testing.assert_array_equal(state['images']['b'], image_b)
+        self.assertEqual(state['images']['b'].dtype, np.float32)
+        self.assertEqual(state['rng'], 'rng1')
+        self.assertEqual(state['drawn_objects'], set([1, 2, 3]))
+        self.assertEqual(state['centroid_objects'], [(1,), (2,), (3,)])
+
+        # a set of drawn objects that does not contain the logged
+        # objects replaces the log
+        store.write({}, 'rng2', set([4]), [(1,), (2,), (3,)])
+        state = CheckpointDirectory(self.cp_dir).read()
+        self.assertEqual(state['drawn_objects'], set([4]))
+        self.assertEqual(state['centroid_objects'], [(1,), (2,), (3,)])
+        np.testing.assert_array_equal(state['images']['a'], 2*image_a)
+
+    def test_interrupted_checkpoint(self):
+        """
+        Test that data written after the last committed manifest is ignored
+        """
+        store = CheckpointDirectory(self.cp_dir)
+        image = np.ones((5, 5))
+        store.write(dict(a=image), 'rng0', set([1]), [(1,)])
+
+        # simulate a checkpoint interrupted before the manifest was
+        # replaced: the other image slot and the logs have been written
+        store._writeImage(store._manifest, 'a', 3*image)
+        store._appendRecords(store._manifest, 'drawn_objects', [2], False)
+        store = CheckpointDirectory(self.cp_dir)
+        state = store.read()
+        np.testing.assert_array_equal(state['images']['a'], image)
+        self.assertEqual(state['drawn_objects'], set([1]))
+
+        store.write(dict(a=2*image), 'rng1', set([1, 3]), [(1,), (3,)])
+        state = CheckpointDirectory(self.cp_dir).read()
+        np.testing.assert_array_equal(state['images']['a'], 2*image)
+        self.assertEqual(state['drawn_objects'], set([1, 3]))
+        self.assertEqual(state['centroid_objects'], [(1,), (3,)])
+
+    def test_compression(self):
+        """
+        Test compressed images, and reading a checkpoint whose images were
+        written with different codecs
+        """
+        rng = np.random.RandomState(81)
+        image_a = rng.poisson(1000, size=(40, 30)).astype(np.float32)
+        image_b = rng.poisson(1000, size=(20, 20)).astype(np.float64)
+        for codec, level in (('zlib', None), ('zlib', 1), ('lzma', 6)):
+            compressed = compressArray(image_a, codec, level)
+            self.assertLess(len(compressed['data']), image_a.nbytes)
+            restored = decompressArray(compressed)
+            self.assertEqual(restored.dtype, np.float32)
+            np.testing.assert_array_equal(restored, image_a)
+
+        with self.assertRaises(RuntimeError):
+            compressArray(image_a, 'bz3')
+
+        store = CheckpointDirectory(self.cp_dir, compression='zlib')
+        store.write(dict(a=image_a, b=image_b), None, set([1]), [])
+        store.compression = 'lzma'
+        store.write(dict(a=2*image_a), None, set([1, 2]), [])
+        store.compression = None
+        store.write(dict(b=2*image_b), None, set([1, 2, 3]), [])
+
+        state = CheckpointDirectory(self.cp_dir).read()
+        np.testing.assert_array_equal(state['images']['a'], 2*image_a)
+        self.assertEqual(state['images']['a'].dtype, np.float32)
+        np.testing.assert_array_equal(state['images']['b'], 2*image_b)
+        self.assertEqual(state['drawn_objects'], set([1, 2, 3]))
+
+
+class MemoryTestClass(lsst.utils.tests.MemoryTestCase):
+    pass
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -2,15 +2,20 @@ from builtins import zip
 import unittest
 import os
 import numpy as np
+import galsim
 from lsst.utils import getPackageDir
 import lsst.utils.tests
+import lsst.afw.cameraGeom.testUtils as camTestUtils
 
 from lsst.sims.utils.CodeUtilities import sims_clean_up
 from lsst.sims.utils import ObservationMetaData
+from lsst.sims.utils import radiansFromArcsec, _raDecFromPupilCoords
 from lsst.sims.photUtils import PhotometricParameters
 #from lsst.sims.coordUtils.utils import ReturnCamera
 from lsst.sims.coordUtils import _raDecFromPixelCoords, pupilCoordsFromPixelCoords
 from lsst.sims.GalSimInterface import GalSimDetector, GalSimCameraWrapper
+from lsst.sims.GalSimInterface import GalSimDetectorGrid, make_galsim_detector
+from lsst.sims.GalSimInterface import GalSimInterpreter
 
 
 def setup_module(module):
@@ -161,6 +166,243 @@ class GalSimDetectorTest(unittest.TestCase):
         self.assertEqual(gsdet.wcs.fitsHeader.getScalar('ROTANGLE'),
                          self.obs.rotSkyPos)
 
+    def testInexactWcs(self):
+        """
+        Test that GalSim_afw_TanSipWCS gives nearly the same coordinates
+        when it evaluates the SIP polynomials as when it uses the camera
+        transformations
+        """
+        photParams = PhotometricParameters()
+        gsdet = GalSimDetector(self.camera[0].getName(),
+                               GalSimCameraWrapper(self.camera),
+                               self.obs, self.epoch,
+                               photParams=photParams)
+        wcs = gsdet.wcs
+
+        rng = np.random.RandomState(1172)
+        xx = rng.random_sample(20)*(gsdet.xMaxPix - gsdet.xMinPix) + gsdet.xMinPix - wcs.crpix1
+        yy = rng.random_sample(20)*(gsdet.yMaxPix - gsdet.yMinPix) + gsdet.yMinPix - wcs.crpix2
+
+        ra, dec = wcs._radec(xx, yy)
+        xExact, yExact = wcs._xy(ra, dec)
+        wcs.exact = False
+        try:
+            raSip, decSip = wcs._radec(xx, yy)
+            xSip, ySip = wcs._xy(ra, dec)
+            raScalar, decScalar = wcs._radec(xx[0], yy[0])
+        finally:
+            wcs.exact = True
+
+        # the fit is accurate to better than 0.01 arcsec (0.05 pixels)
+        np.testing.assert_allclose(raSip, ra, rtol=0.0, atol=np.radians(0.01/3600.0)/np.cos(dec).min())
+        np.testing.assert_allclose(decSip, dec, rtol=0.0, atol=np.radians(0.01/3600.0))
+        np.testing.assert_allclose(xSip, xExact, rtol=0.0, atol=0.05)
+        np.testing.assert_allclose(ySip, yExact, rtol=0.0, atol=0.05)
+        self.assertAlmostEqual(raScalar, raSip[0], 12)
+        self.assertAlmostEqual(decScalar, decSip[0], 12)
+
+    def testJacobianGrid(self):
+        """
+        Test that the local Jacobians interpolated on a grid match the
+        Jacobians found by finite differences, also for a WCS with a
+        shifted origin
+        """
+        photParams = PhotometricParameters()
+        gsdet = GalSimDetector(self.camera[0].getName(),
+                               GalSimCameraWrapper(self.camera),
+                               self.obs, self.epoch,
+                               photParams=photParams)
+        wcs = gsdet.wcs
+
+        rng = np.random.RandomState(4411)
+        xList = rng.random_sample(10)*(gsdet.xMaxPix - gsdet.xMinPix) + gsdet.xMinPix
+        yList = rng.random_sample(10)*(gsdet.yMaxPix - gsdet.yMinPix) + gsdet.yMinPix
+        shifted = wcs.withOrigin(galsim.PositionD(wcs.crpix1 + 100.0, wcs.crpix2 - 50.0))
+        for xx, yy in zip(xList, yList):
+            image_pos = galsim.PositionD(xx, yy)
+            exact = wcs.jacobian(image_pos).getMatrix()
+            shifted_exact = shifted.jacobian(image_pos).getMatrix()
+            wcs.jacobian_grid_size = 16
+            shifted.jacobian_grid_size = 16
+            try:
+                interpolated = wcs.jacobian(image_pos).getMatrix()
+                shifted_interpolated = shifted.jacobian(image_pos).getMatrix()
+            finally:
+                wcs.jacobian_grid_size = None
+                shifted.jacobian_grid_size = None
+            np.testing.assert_allclose(interpolated, exact, rtol=0.0,
+                                       atol=1.0e-5*np.abs(exact).max())
+            np.testing.assert_allclose(shifted_interpolated, shifted_exact, rtol=0.0,
+                                       atol=1.0e-5*np.abs(exact).max())
+
+        self.assertIn(16, wcs._jacobianGrids)
+
+    def testNewOriginHeader(self):
+        """
+        Test that WCSs with shifted origins report the shifted CRPIX in
+        their FITS headers without modifying the header of the original
+        """
+        photParams = PhotometricParameters()
+        gsdet = GalSimDetector(self.camera[0].getName(),
+                               GalSimCameraWrapper(self.camera),
+                               self.obs, self.epoch,
+                               photParams=photParams)
+        wcs = gsdet.wcs
+        crpix1 = wcs.fitsHeader.getScalar('CRPIX1')
+        crpix2 = wcs.fitsHeader.getScalar('CRPIX2')
+
+        shifted = wcs.withOrigin(galsim.PositionD(crpix1 + 10.0, crpix2 + 20.0))
+        header = shifted._writeHeader({}, None)
+        self.assertEqual(header['CRPIX1'], crpix1 + 10.0)
+        self.assertEqual(header['CRPIX2'], crpix2 + 20.0)
+        self.assertEqual(header['CRVAL1'], wcs.fitsHeader.getScalar('CRVAL1'))
+
+        self.assertEqual(shifted.fitsHeader.getScalar('CRPIX1'), crpix1 + 10.0)
+        self.assertEqual(shifted.fitsHeader.getScalar('CRPIX2'), crpix2 + 20.0)
+        self.assertEqual(wcs.fitsHeader.getScalar('CRPIX1'), crpix1)
+        self.assertEqual(wcs.fitsHeader.getScalar('CRPIX2'), crpix2)
+
+        # a shift of a shifted WCS
+        shifted.fitsHeader.set('TESTKEY', 3)
+        twice = shifted.withOrigin(galsim.PositionD(crpix1 + 1.0, crpix2 + 2.0))
+        header = twice._writeHeader({}, None)
+        self.assertEqual(header['CRPIX1'], crpix1 + 1.0)
+        self.assertEqual(header['CRPIX2'], crpix2 + 2.0)
+        self.assertEqual(header['TESTKEY'], 3)
+        self.assertNotIn('TESTKEY', wcs.fitsHeader.names())
+
+        # changes to the header of the original made after the copies
+        # do not reach them
+        fresh = wcs.withOrigin(galsim.PositionD(crpix1 + 3.0, crpix2 + 4.0))
+        wcs.fitsHeader.set('LATEKEY', 5)
+        shifted.fitsHeader.set('LATEKEY2', 6)
+        self.assertEqual(wcs.fitsHeader.getScalar('LATEKEY'), 5)
+        self.assertNotIn('LATEKEY', fresh._writeHeader({}, None))
+        self.assertNotIn('LATEKEY', fresh.fitsHeader.names())
+        self.assertNotIn('LATEKEY', twice._writeHeader({}, None))
+        self.assertNotIn('LATEKEY2', twice._writeHeader({}, None))
+        self.assertEqual(fresh._writeHeader({}, None)['CRPIX1'], crpix1 + 3.0)
+
+
+class GalSimDetectorGridTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        camera_wrapper = GalSimCameraWrapper(camTestUtils.CameraWrapper().camera)
+        obs = ObservationMetaData(pointingRA=145.0, pointingDec=-73.0,
+                                  mjd=49250.0, rotSkyPos=45.0)
+        cls.obs = obs
+        cls.detectors = [make_galsim_detector(camera_wrapper, dd.getName(),
+                                              PhotometricParameters(), obs)
+                         for dd in camera_wrapper.camera]
+
+    @classmethod
+    def tearDownClass(cls):
+        sims_clean_up()
+        del cls.detectors
+
+    def bruteForceOverlaps(self, xmin, xmax, ymin, ymax):
+        output = []
+        for idet, dd in enumerate(self.detectors):
+            if (min(xmax, dd.xMaxArcsec) > max(xmin, dd.xMinArcsec) and
+                    min(ymax, dd.yMaxArcsec) > max(ymin, dd.yMinArcsec)):
+                output.append(idet)
+        return output
+
+    def testOverlaps(self):
+        """
+        Test that GalSimDetectorGrid finds the same detectors as a
+        linear scan over all of the detectors
+        """
+        rng = np.random.RandomState(8812)
+        xlim = (min(dd.xMinArcsec for dd in self.detectors),
+                max(dd.xMaxArcsec for dd in self.detectors))
+        ylim = (min(dd.yMinArcsec for dd in self.detectors),
+                max(dd.yMaxArcsec for dd in self.detectors))
+        width = max(xlim[1]-xlim[0], ylim[1]-ylim[0])
+        n_boxes = 500
+        xx = rng.uniform(xlim[0]-0.2*width, xlim[1]+0.2*width, size=n_boxes)
+        yy = rng.uniform(ylim[0]-0.2*width, ylim[1]+0.2*width, size=n_boxes)
+        half_size = np.power(10.0, rng.uniform(-1.0, np.log10(width), size=n_boxes))
+
+        for cell_size in (None, 0.1*width, 10.0*width):
+            grid = GalSimDetectorGrid(self.detectors, cell_size=cell_size)
+            objIndex, detIndex = grid.overlappingPairs(xx-half_size, xx+half_size,
+                                                       yy-half_size, yy+half_size)
+            n_pairs = 0
+            for ix in range(n_boxes):
+                truth = self.bruteForceOverlaps(xx[ix]-half_size[ix], xx[ix]+half_size[ix],
+                                                yy[ix]-half_size[ix], yy[ix]+half_size[ix])
+                self.assertEqual(grid.overlappingDetectors(xx[ix]-half_size[ix],
+                                                           xx[ix]+half_size[ix],
+                                                           yy[ix]-half_size[ix],
+                                                           yy[ix]+half_size[ix]), truth)
+                self.assertEqual(list(detIndex[objIndex == ix]), truth)
+                n_pairs += len(truth)
+            self.assertEqual(len(objIndex), n_pairs)
+            self.assertGreater(n_pairs, 0)
+
+        empty = grid.overlappingPairs(np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0))
+        self.assertEqual(len(empty[0]), 0)
+        self.assertEqual(len(empty[1]), 0)
+
+    def testDetectorIndex(self):
+        """
+        Test that GalSimDetectorGrid.detectorIndexFromPupilCoords agrees with
+        GalSimDetector.containsPupilCoordinates
+        """
+        rng = np.random.RandomState(1453)
+        xlim = (min(dd.xMinArcsec for dd in self.detectors),
+                max(dd.xMaxArcsec for dd in self.detectors))
+        ylim = (min(dd.yMinArcsec for dd in self.detectors),
+                max(dd.yMaxArcsec for dd in self.detectors))
+        width = max(xlim[1]-xlim[0], ylim[1]-ylim[0])
+        n_points = 1000
+        xPupil = radiansFromArcsec(rng.uniform(xlim[0]-0.2*width, xlim[1]+0.2*width, size=n_points))
+        yPupil = radiansFromArcsec(rng.uniform(ylim[0]-0.2*width, ylim[1]+0.2*width, size=n_points))
+
+        truth = np.zeros(n_points, dtype=int) - 1
+        for idet in range(len(self.detectors)-1, -1, -1):
+            contains = np.array(self.detectors[idet].containsPupilCoordinates(xPupil, yPupil))
+            truth[contains] = idet
+        self.assertGreater((truth >= 0).sum(), 0)
+        self.assertGreater((truth < 0).sum(), 0)
+
+        for cell_size in (None, 0.1*width, 10.0*width):
+            grid = GalSimDetectorGrid(self.detectors, cell_size=cell_size)
+            detIndex = grid.detectorIndexFromPupilCoords(xPupil, yPupil)
+            # the polygons ignore the curvature of the detector edges,
+            # so allow for disagreements very close to the edges
+            self.assertGreater((detIndex == truth).mean(), 0.99)
+
+            ra, dec = _raDecFromPupilCoords(xPupil, yPupil, obs_metadata=self.obs, epoch=2000.0)
+            np.testing.assert_array_equal(grid.detectorIndexFromRaDec(ra, dec, self.obs),
+                                          detIndex)
+
+        self.assertEqual(len(grid.detectorIndexFromPupilCoords(np.zeros(0), np.zeros(0))), 0)
+
+    def testInterpreterDetectors(self):
+        """
+        Test that GalSimInterpreter.detectors cannot be changed in place,
+        and that assigning new detectors updates the spatial index
+        """
+        gs_interpreter = GalSimInterpreter(detectors=self.detectors[:1])
+        self.assertIsInstance(gs_interpreter.detectors, tuple)
+        with self.assertRaises(AttributeError):
+            gs_interpreter.detectors.append(self.detectors[1])
+
+        dd = self.detectors[1]
+        xx = 0.5*(dd.xMinArcsec + dd.xMaxArcsec)
+        yy = 0.5*(dd.yMinArcsec + dd.yMaxArcsec)
+        objIndex, detIndex = gs_interpreter._findDetectorOverlaps(np.array([xx-0.1]), np.array([xx+0.1]),
+                                                                  np.array([yy-0.1]), np.array([yy+0.1]))
+        self.assertEqual(len(objIndex), 0)
+
+        gs_interpreter.detectors = self.detectors[:2]
+        objIndex, detIndex = gs_interpreter._findDetectorOverlaps(np.array([xx-0.1]), np.array([xx+0.1]),
+                                                                  np.array([yy-0.1]), np.array([yy+0.1]))
+        self.assertIn(1, list(detIndex))
+
 
 class MemoryTestClass(lsst.utils.tests.MemoryTestCase):
     pass
@@ -19,6 +19,7 @@ from lsst.sims.photUtils import BandpassDict
 from lsst.sims.utils.CodeUtilities import sims_clean_up
 from lsst.sims.utils import radiansFromArcsec
 from lsst.sims.photUtils import Bandpass, calcSkyCountsPerPixelForM5, LSSTdefaults, PhotometricParameters
+from lsst.sims.photUtils import Sed
 from lsst.sims.coordUtils import pixelCoordsFromPupilCoords
 from lsst.sims.catUtils.utils import makePhoSimTestDB
 from lsst.sims.utils import ObservationMetaData
@@ -31,6 +32,7 @@ from lsst.sims.GalSimInterface import (GalSimGalaxies, GalSimStars, GalSimAgn,
                                        GalSimCelestialObject,
                                        LSSTCameraWrapper)
 from lsst.sims.GalSimInterface.galSimInterpreter import getGoodPhotImageSize
+from lsst.sims.GalSimInterface import StampSizeTable
 from lsst.sims.catUtils.utils import (calcADUwrapper, testGalaxyBulgeDBObj, testGalaxyDiskDBObj,
                                       testGalaxyAgnDBObj, testStarsDBObj)
 import lsst.afw.image as afwImage
@@ -552,6 +554,67 @@ class GalSimInterfaceTest(unittest.TestCase):
         if os.path.exists(catName):
             os.unlink(catName)
 
+    def testSedTemplateCache(self):
+        """
+        Test that the SEDs computed from the cached SED templates match
+        SEDs computed by reading the SED files directly
+        """
+        stars = testStarsDBObj(driver=self.driver, database=self.dbName)
+        cat = testFakeSedCatalog(stars, obs_metadata=self.obs_metadata)
+        imsimband = Bandpass()
+        imsimband.imsimBandpass()
+
+        for sedName in ('fakeSed1.dat', 'fakeSed2.dat'):
+            for (zz, iAv, iRv, gAv, gRv, norm) in ((0.0, 0.0, 0.0, 0.0, 0.0, 21.0),
+                                                   (0.3, 0.1, 3.1, 0.2, 3.1, 22.5)):
+                sed = cat._calcSingleGalSimSed(sedName, zz, iAv, iRv, gAv, gRv, norm)
+
+                control = Sed()
+                control.readSED_flambda(os.path.join(cat.sedDir, sedName))
+                control.multiplyFluxNorm(control.calcFluxNorm(norm, imsimband))
+                if iAv != 0.0:
+                    a_x, b_x = control.setupCCM_ab()
+                    control.addDust(a_x, b_x, A_v=iAv, R_v=iRv)
+                if zz != 0.0:
+                    control.redshiftSED(zz, dimming=True)
+                if gAv != 0.0:
+                    a_x, b_x = control.setupCCM_ab()
+                    control.addDust(a_x, b_x, A_v=gAv, R_v=gRv)
+
+                np.testing.assert_allclose(sed.wavelen, control.wavelen, rtol=1.0e-12)
+                np.testing.assert_allclose(sed.flambda, control.flambda, rtol=1.0e-10)
+
+            self.assertIn(os.path.join(cat.sedDir, sedName), cat.sed_template_cache)
+
+        # the templates are not modified by the objects using them
+        template = cat._getSedTemplate('fakeSed1.dat')
+        self.assertFalse(template.flambda.flags.writeable)
+        self.assertIs(template, cat._getSedTemplate('fakeSed1.dat'))
+
+    def testBatchedFluxes(self):
+        """
+        Test that the fluxes computed for a whole chunk of objects at once
+        match the fluxes computed by GalSimCelestialObject one at a time
+        """
+        stars = testStarsDBObj(driver=self.driver, database=self.dbName)
+        cat = testFakeSedCatalog(stars, obs_metadata=self.obs_metadata)
+        cat.bandpassDict = BandpassDict.loadTotalBandpassesFromFiles(bandpassNames=self.bandpassNameList)
+        cat.photParams = PhotometricParameters()
+
+        sedList = []
+        for sedName in ('fakeSed1.dat', 'fakeSed2.dat', 'fakeSed3.dat'):
+            for (zz, norm) in ((0.0, 21.0), (0.5, 22.5)):
+                sedList.append(cat._calcSingleGalSimSed(sedName, zz, 0.1, 3.1, 0.2, 3.1, norm))
+
+        fluxes = cat._calculateGalSimFluxes(sedList)
+        self.assertEqual(fluxes.shape, (len(sedList), len(self.bandpassNameList)))
+        for sed, objFluxes in zip(sedList, fluxes):
+            for bandpassName, flux in zip(cat.bandpassDict.keys(), objFluxes):
+                control = sed.calcADU(cat.bandpassDict[bandpassName], cat.photParams)*cat.photParams.gain
+                self.assertAlmostEqual(flux/control, 1.0, 10)
+
+        self.assertEqual(cat._calculateGalSimFluxes([]).shape, (0, len(self.bandpassNameList)))
+
     def testAgns(self):
         """
         Test that GalSimInterpreter puts the right number of counts on images of AGN
@@ -1081,6 +1144,7 @@ class CheckPointingTestCase(unittest.TestCase):
         with open(self.cp_file, 'rb') as input_:
             cp_data = pickle.load(input_)
         self.assertTrue(np.array_equal(cp_data['images'][key], image.array))
+        self.assertIn(key, cp_data['wcs_cards'])
 
         # Check the restore_checkpoint function.
         new_interpreter = GalSimInterpreter(detectors=detectors)
@@ -1110,6 +1174,485 @@ class CheckPointingTestCase(unittest.TestCase):
                 self.assertEqual(new_img.wcs.fitsHeader.getScalar(name),
                                  gs_img.wcs.fitsHeader.getScalar(name))
 
+    def test_memmap_checkpointing(self):
+        "Test checkpointing with checkpoint_format = 'memmap'."
+        camera = camTestUtils.CameraWrapper().camera
+        camera_wrapper = GalSimCameraWrapper(camera)
+        phot_params = PhotometricParameters()
+        obs_md = ObservationMetaData(pointingRA=23.0,
+                                     pointingDec=12.0,
+                                     rotSkyPos=13.2,
+                                     mjd=59580.0,
+                                     bandpassName='r')
+
+        detectors = [make_galsim_detector(camera_wrapper, dd.getName(),
+                                          phot_params, obs_md)
+                     for dd in camera_wrapper.camera]
+
+        cp_dir = os.path.join(self.output_dir, 'checkpoint_test_memmap')
+        gs_interpreter = GalSimInterpreter(detectors=detectors)
+        gs_interpreter.checkpoint_format = 'memmap'
+        gs_interpreter.checkpoint_file = cp_dir
+        gs_interpreter.nobj_checkpoint = 5
+
+        key = "R00_S00_r.fits"
+        detname = "R:0,0 S:0,0"
+        detector = make_galsim_detector(camera_wrapper, detname,
+                                        phot_params, obs_md)
+        image = gs_interpreter.blankImage(detector=detector)
+        gs_interpreter.detectorImages[key] = image
+
+        # write several checkpoints, so that both image slots and
+        # several chunks of the logs are used
+        for uniqueId in range(1, 16):
+            image += uniqueId
+            gs_interpreter.markImageChanged(key)
+            gs_interpreter.drawn_objects.add(uniqueId)
+            gs_interpreter.centroid_list.append((uniqueId,))
+            gs_interpreter.write_checkpoint()
+
+        self.assertTrue(os.path.isdir(cp_dir))
+
+        new_interpreter = GalSimInterpreter(detectors=detectors)
+        new_interpreter.checkpoint_file = cp_dir
+        new_interpreter.restore_checkpoint(camera_wrapper,
+                                           phot_params,
+                                           obs_md)
+
+        self.assertEqual(new_interpreter.drawn_objects,
+                         gs_interpreter.drawn_objects)
+        self.assertEqual(new_interpreter.centroid_list,
+                         gs_interpreter.centroid_list)
+        np.testing.assert_array_equal(new_interpreter.detectorImages[key].array,
+                                      image.array)
+
+        # images that have not been marked as changed since the last
+        # checkpoint are not rewritten
+        expected = image.array.copy()
+        image += 1
+        gs_interpreter.write_checkpoint(force=True)
+        new_interpreter = GalSimInterpreter(detectors=detectors)
+        new_interpreter.checkpoint_file = cp_dir
+        new_interpreter.restore_checkpoint(camera_wrapper,
+                                           phot_params,
+                                           obs_md)
+        np.testing.assert_array_equal(new_interpreter.detectorImages[key].array,
+                                      expected)
+        shutil.rmtree(cp_dir)
+
+    def test_memmap_new_image_checkpoint(self):
+        """
+        Test that the memmap checkpoint written when a new image is
+        created does not restart the log of drawn objects.
+        """
+        camera = camTestUtils.CameraWrapper().camera
+        camera_wrapper = GalSimCameraWrapper(camera)
+        phot_params = PhotometricParameters()
+        obs_md = ObservationMetaData(pointingRA=23.0,
+                                     pointingDec=12.0,
+                                     rotSkyPos=13.2,
+                                     mjd=59580.0,
+                                     bandpassName='r',
+                                     m5=24.5, seeing=0.7)
+
+        detectors = [make_galsim_detector(camera_wrapper, dd.getName(),
+                                          phot_params, obs_md)
+                     for dd in camera_wrapper.camera]
+
+        bp_dict = BandpassDict.loadTotalBandpassesFromFiles(bandpassNames=['r'])
+        cp_dir = os.path.join(self.output_dir, 'checkpoint_test_new_image')
+        gs_interpreter = GalSimInterpreter(obs_metadata=obs_md,
+                                           detectors=detectors,
+                                           bandpassDict=bp_dict,
+                                           noiseWrapper=ExampleCCDNoise(seed=42),
+                                           seed=42)
+        gs_interpreter.checkpoint_format = 'memmap'
+        gs_interpreter.checkpoint_file = cp_dir
+
+        gs_interpreter._addNoiseAndBackground([detectors[0]])
+        gs_interpreter.drawn_objects.add(1)
+        gs_interpreter.write_checkpoint(force=True)
+        checkpoint_directory = gs_interpreter._getCheckpointDirectory()
+        generation = checkpoint_directory._manifest['logs']['drawn_objects']['generation']
+
+        gs_interpreter._addNoiseAndBackground([detectors[1]])
+        self.assertEqual(checkpoint_directory._manifest['logs']['drawn_objects']['generation'],
+                         generation)
+        key = gs_interpreter._getFileName(detector=detectors[1], bandpassName='r')
+        self.assertIn(key, checkpoint_directory)
+
+        new_interpreter = GalSimInterpreter(detectors=detectors)
+        new_interpreter.checkpoint_file = cp_dir
+        new_interpreter.restore_checkpoint(camera_wrapper,
+                                           phot_params,
+                                           obs_md)
+        self.assertEqual(new_interpreter.drawn_objects, set([1]))
+        self.assertEqual(set(new_interpreter.detectorImages.keys()),
+                         set(gs_interpreter.detectorImages.keys()))
+        shutil.rmtree(cp_dir)
+
+    def test_background_checkpointing(self):
+        "Test writing checkpoints in a background thread."
+        camera = camTestUtils.CameraWrapper().camera
+        camera_wrapper = GalSimCameraWrapper(camera)
+        phot_params = PhotometricParameters()
+        obs_md = ObservationMetaData(pointingRA=23.0,
+                                     pointingDec=12.0,
+                                     rotSkyPos=13.2,
+                                     mjd=59580.0,
+                                     bandpassName='r')
+
+        detectors = [make_galsim_detector(camera_wrapper, dd.getName(),
+                                          phot_params, obs_md)
+                     for dd in camera_wrapper.camera]
+
+        gs_interpreter = GalSimInterpreter(detectors=detectors, seed=42)
+        gs_interpreter.checkpoint_in_background = True
+        gs_interpreter.checkpoint_file = self.cp_file
+
+        key = "R00_S00_r.fits"
+        detname = "R:0,0 S:0,0"
+        detector = make_galsim_detector(camera_wrapper, detname,
+                                        phot_params, obs_md)
+        image = gs_interpreter.blankImage(detector=detector)
+        image += 17
+        gs_interpreter.detectorImages[key] = image
+        gs_interpreter.drawn_objects.add(1)
+        gs_interpreter.write_checkpoint(force=True)
+
+        # the checkpoint is a snapshot of the state when write_checkpoint
+        # was called
+        expected = image.array.copy()
+        image += 1
+        gs_interpreter.drawn_objects.add(2)
+        gs_interpreter.wait_for_checkpoint()
+
+        with open(self.cp_file, 'rb') as input_:
+            cp_data = pickle.load(input_)
+        np.testing.assert_array_equal(cp_data['images'][key], expected)
+        self.assertEqual(cp_data['drawn_objects'], set([1]))
+
+
+class ParallelRenderingTestCase(unittest.TestCase):
+    """
+    TestCase class for rendering with GalSimInterpreter worker processes.
+    """
+    def test_parallel_rendering(self):
+        """
+        Test that rendering with nproc > 1 puts the same objects on the
+        same detectors as rendering serially.
+        """
+        camera = camTestUtils.CameraWrapper().camera
+        camera_wrapper = GalSimCameraWrapper(camera)
+        phot_params = PhotometricParameters()
+        obs_md = ObservationMetaData(pointingRA=23.0,
+                                     pointingDec=12.0,
+                                     rotSkyPos=13.2,
+                                     mjd=59580.0,
+                                     bandpassName='r')
+
+        detectors = [make_galsim_detector(camera_wrapper, dd.getName(),
+                                          phot_params, obs_md)
+                     for dd in camera_wrapper.camera]
+
+        bp_dict = BandpassDict.loadTotalBandpassesFromFiles(bandpassNames=['r'])
+        sed = Sed()
+        sed.setFlatSED()
+        sed.multiplyFluxNorm(sed.calcFluxNorm(19.0, bp_dict['r']))
+
+        gs_objects = []
+        for uniqueId, detector in enumerate(detectors):
+            gs_objects.append(GalSimCelestialObject('pointSource',
+                                                    radiansFromArcsec(detector.xCenterArcsec),
+                                                    radiansFromArcsec(detector.yCenterArcsec),
+                                                    1.0e-7, 1.0e-7, 1.0e-7, 0.0, 1.0,
+                                                    sed, bp_dict, phot_params,
+                                                    0, None, None, None,
+                                                    uniqueId=uniqueId))
+
+        interpreters = []
+        for nproc in (1, 2):
+            gs_interpreter = GalSimInterpreter(obs_metadata=obs_md,
+                                               detectors=detectors,
+                                               bandpassDict=bp_dict,
+                                               seed=99, nproc=nproc)
+            gs_interpreter.setPSF(SNRdocumentPSF())
+            gs_interpreter.centroid_base_name = 'parallel_test_'
+            for gs_object in gs_objects:
+                gs_interpreter.drawObject(gs_object)
+            if nproc > 1:
+                # the realized fluxes are fixed when the objects are queued
+                realized_fluxes = {pending[0].uniqueId: pending[4][0]
+                                   for pending in gs_interpreter._pending_objects}
+            gs_interpreter.renderPendingObjects()
+            interpreters.append(gs_interpreter)
+
+        serial, parallel = interpreters
+        self.assertEqual(len(parallel._pending_objects), 0)
+        self.assertEqual(serial.drawn_objects, parallel.drawn_objects)
+        self.assertEqual(set(serial.detectorImages.keys()),
+                         set(parallel.detectorImages.keys()))
+        self.assertEqual(sorted((cc[0], cc[2]) for cc in serial.centroid_list),
+                         sorted((cc[0], cc[2]) for cc in parallel.centroid_list))
+        for cc in parallel.centroid_list:
+            self.assertEqual(cc[4], realized_fluxes[cc[2]])
+
+        for name in serial.detectorImages:
+            serial_sum = serial.detectorImages[name].array.sum()
+            parallel_sum = parallel.detectorImages[name].array.sum()
+            self.assertGreater(serial_sum, 0.0)
+            self.assertAlmostEqual(parallel_sum/serial_sum, 1.0, delta=0.05)
+
+
+    def test_parallel_checkpointing(self):
+        """
+        Test that a checkpoint written with nproc > 1 renders the queued
+        objects first, so that the saved images, drawn objects and random
+        number generator state are consistent.
+        """
+        camera = camTestUtils.CameraWrapper().camera
+        camera_wrapper = GalSimCameraWrapper(camera)
+        phot_params = PhotometricParameters()
+        obs_md = ObservationMetaData(pointingRA=23.0,
+                                     pointingDec=12.0,
+                                     rotSkyPos=13.2,
+                                     mjd=59580.0,
+                                     bandpassName='r')
+
+        detectors = [make_galsim_detector(camera_wrapper, dd.getName(),
+                                          phot_params, obs_md)
+                     for dd in camera_wrapper.camera]
+
+        bp_dict = BandpassDict.loadTotalBandpassesFromFiles(bandpassNames=['r'])
+        sed = Sed()
+        sed.setFlatSED()
+        sed.multiplyFluxNorm(sed.calcFluxNorm(19.0, bp_dict['r']))
+
+        gs_objects = []
+        for uniqueId, detector in enumerate(detectors):
+            gs_objects.append(GalSimCelestialObject('pointSource',
+                                                    radiansFromArcsec(detector.xCenterArcsec),
+                                                    radiansFromArcsec(detector.yCenterArcsec),
+                                                    1.0e-7, 1.0e-7, 1.0e-7, 0.0, 1.0,
+                                                    sed, bp_dict, phot_params,
+                                                    0, None, None, None,
+                                                    uniqueId=uniqueId))
+
+        scratch_dir = tempfile.mkdtemp(dir=ROOT, prefix='ParallelCheckpoint')
+        try:
+            cp_file = os.path.join(scratch_dir, 'checkpoint.pkl')
+            gs_interpreter = GalSimInterpreter(obs_metadata=obs_md,
+                                               detectors=detectors,
+                                               bandpassDict=bp_dict,
+                                               seed=99, nproc=2)
+            gs_interpreter.setPSF(SNRdocumentPSF())
+            gs_interpreter.checkpoint_file = cp_file
+            for gs_object in gs_objects:
+                gs_interpreter.drawObject(gs_object)
+            self.assertGreater(len(gs_interpreter._pending_objects), 0)
+
+            gs_interpreter.write_checkpoint(force=True)
+            self.assertEqual(len(gs_interpreter._pending_objects), 0)
+            self.assertEqual(gs_interpreter.drawn_objects,
+                             set(gs_object.uniqueId for gs_object in gs_objects))
+
+            new_interpreter = GalSimInterpreter(obs_metadata=obs_md,
+                                                detectors=detectors,
+                                                bandpassDict=bp_dict,
+                                                seed=7, nproc=2)
+            new_interpreter.checkpoint_file = cp_file
+            new_interpreter.restore_checkpoint(camera_wrapper, phot_params, obs_md)
+            self.assertEqual(new_interpreter.drawn_objects, gs_interpreter.drawn_objects)
+            self.assertEqual(set(new_interpreter.detectorImages.keys()),
+                             set(gs_interpreter.detectorImages.keys()))
+            for name in gs_interpreter.detectorImages:
+                np.testing.assert_array_equal(new_interpreter.detectorImages[name].array,
+                                              gs_interpreter.detectorImages[name].array)
+            self.assertEqual(new_interpreter._rng.raw(), gs_interpreter._rng.raw())
+        finally:
+            shutil.rmtree(scratch_dir)
+
+
+class BatchDrawingTestCase(unittest.TestCase):
+    """
+    TestCase class for GalSimInterpreter.drawObjects
+    """
+    def test_drawObjects(self):
+        """
+        Test that drawing a list of objects with drawObjects gives the
+        same images and centroids as drawing them one at a time with
+        drawObject using the same seed.
+        """
+        camera = camTestUtils.CameraWrapper().camera
+        camera_wrapper = GalSimCameraWrapper(camera)
+        phot_params = PhotometricParameters()
+        obs_md = ObservationMetaData(pointingRA=23.0,
+                                     pointingDec=12.0,
+                                     rotSkyPos=13.2,
+                                     mjd=59580.0,
+                                     bandpassName='r')
+
+        detectors = [make_galsim_detector(camera_wrapper, dd.getName(),
+                                          phot_params, obs_md)
+                     for dd in camera_wrapper.camera]
+
+        bp_dict = BandpassDict.loadTotalBandpassesFromFiles(bandpassNames=['r'])
+        sed = Sed()
+        sed.setFlatSED()
+        sed.multiplyFluxNorm(sed.calcFluxNorm(19.0, bp_dict['r']))
+
+        # one object at the center of each detector, one straddling the
+        # first two detectors, and one far off of the focal plane
+        xPupil = [detector.xCenterArcsec for detector in detectors]
+        yPupil = [detector.yCenterArcsec for detector in detectors]
+        xPupil.append(0.5*(detectors[0].xCenterArcsec + detectors[1].xCenterArcsec))
+        yPupil.append(0.5*(detectors[0].yCenterArcsec + detectors[1].yCenterArcsec))
+        xPupil.append(1.0e5)
+        yPupil.append(1.0e5)
+
+        gs_objects = []
+        for uniqueId, (xp, yp) in enumerate(zip(xPupil, yPupil)):
+            gs_objects.append(GalSimCelestialObject('pointSource',
+                                                    radiansFromArcsec(xp),
+                                                    radiansFromArcsec(yp),
+                                                    1.0e-7, 1.0e-7, 1.0e-7, 0.0, 1.0,
+                                                    sed, bp_dict, phot_params,
+                                                    0, None, None, None,
+                                                    uniqueId=uniqueId))
+
+        interpreters = []
+        output_strings = []
+        for batch in (False, True):
+            gs_interpreter = GalSimInterpreter(obs_metadata=obs_md,
+                                               detectors=detectors,
+                                               bandpassDict=bp_dict,
+                                               seed=99)
+            gs_interpreter.setPSF(SNRdocumentPSF())
+            gs_interpreter.centroid_base_name = 'batch_test_'
+            if batch:
+                output_strings.append(gs_interpreter.drawObjects(gs_objects))
+            else:
+                output_strings.append([gs_interpreter.drawObject(gs_object)
+                                       for gs_object in gs_objects])
+            interpreters.append(gs_interpreter)
+
+        single, batch = interpreters
+        self.assertEqual(output_strings[0], output_strings[1])
+        self.assertIsNone(output_strings[1][-1])
+        self.assertIn('//', output_strings[1][-2])
+        self.assertEqual(single.drawn_objects, batch.drawn_objects)
+        self.assertEqual(set(single.detectorImages.keys()),
+                         set(batch.detectorImages.keys()))
+
+        single_centroids = sorted(single.centroid_list, key=lambda cc: (cc[0], cc[2]))
+        batch_centroids = sorted(batch.centroid_list, key=lambda cc: (cc[0], cc[2]))
+        self.assertEqual(len(single_centroids), len(batch_centroids))
+        for single_cc, batch_cc in zip(single_centroids, batch_centroids):
+            self.assertEqual(single_cc[:3], batch_cc[:3])
+            self.assertAlmostEqual(single_cc[3], batch_cc[3], 6)
+            self.assertEqual(single_cc[4], batch_cc[4])
+            self.assertAlmostEqual(single_cc[5], batch_cc[5], 6)
+            self.assertAlmostEqual(single_cc[6], batch_cc[6], 6)
+
+        for name in single.detectorImages:
+            self.assertGreater(single.detectorImages[name].array.sum(), 0.0)
+            np.testing.assert_array_equal(single.detectorImages[name].array,
+                                          batch.detectorImages[name].array)
+
+        self.assertEqual(batch.drawObjects([]), [])
+
+
+class PixelPositionsTestCase(unittest.TestCase):
+    """
+    TestCase class for the pixel positions computed by drawObject
+    """
+    def setUp(self):
+        camera = camTestUtils.CameraWrapper().camera
+        self.camera_wrapper = GalSimCameraWrapper(camera)
+        self.phot_params = PhotometricParameters()
+        self.obs_md = ObservationMetaData(pointingRA=23.0,
+                                          pointingDec=12.0,
+                                          rotSkyPos=13.2,
+                                          mjd=59580.0,
+                                          bandpassName='r')
+        self.detectors = [make_galsim_detector(self.camera_wrapper, dd.getName(),
+                                               self.phot_params, self.obs_md)
+                          for dd in self.camera_wrapper.camera]
+        self.bp_dict = BandpassDict.loadTotalBandpassesFromFiles(bandpassNames=['g', 'r'])
+        self.sed = Sed()
+        self.sed.setFlatSED()
+        self.sed.multiplyFluxNorm(self.sed.calcFluxNorm(19.0, self.bp_dict['r']))
+
+    def make_interpreter(self):
+        gs_interpreter = GalSimInterpreter(obs_metadata=self.obs_md,
+                                           detectors=self.detectors,
+                                           bandpassDict=self.bp_dict,
+                                           seed=51)
+        gs_interpreter.setPSF(SNRdocumentPSF())
+        self.position_calls = []
+        getPixelPositions = gs_interpreter._getPixelPositions
+
+        def recordPixelPositions(gsObject, detectorList):
+            self.position_calls.append(gsObject.uniqueId)
+            return getPixelPositions(gsObject, detectorList)
+
+        gs_interpreter._getPixelPositions = recordPixelPositions
+        return gs_interpreter
+
+    def make_object(self, uniqueId, flux_dict=None):
+        # an object straddling the first two detectors
+        xPupil = 0.5*(self.detectors[0].xCenterArcsec + self.detectors[1].xCenterArcsec)
+        yPupil = 0.5*(self.detectors[0].yCenterArcsec + self.detectors[1].yCenterArcsec)
+        return GalSimCelestialObject('pointSource',
+                                     radiansFromArcsec(xPupil),
+                                     radiansFromArcsec(yPupil),
+                                     1.0e-7, 1.0e-7, 1.0e-7, 0.0, 1.0,
+                                     self.sed, self.bp_dict, self.phot_params,
+                                     0, None, None, None,
+                                     uniqueId=uniqueId, flux_dict=flux_dict)
+
+    def test_centroid_positions(self):
+        """
+        Test that the positions in the centroid entries of every band match
+        the exact pixel coordinates of the object on each detector
+        """
+        gs_interpreter = self.make_interpreter()
+        gs_interpreter.centroid_base_name = 'positions_test_'
+        gs_object = self.make_object(1)
+        output_string = gs_interpreter.drawObject(gs_object)
+        self.assertIn('//', output_string)
+        self.assertEqual(self.position_calls, [1])
+
+        detectors_by_file = {detector.fileName: detector for detector in self.detectors}
+        self.assertEqual(len(gs_interpreter.centroid_list), 2*len(output_string.split('//')))
+        self.assertEqual(set(cc[1] for cc in gs_interpreter.centroid_list), set(['g', 'r']))
+        for cc in gs_interpreter.centroid_list:
+            detector = detectors_by_file[cc[0]]
+            xPix, yPix = self.camera_wrapper.pixelCoordsFromPupilCoords(gs_object.xPupilRadians,
+                                                                        gs_object.yPupilRadians,
+                                                                        detector.name,
+                                                                        self.obs_md)
+            self.assertAlmostEqual(cc[5], xPix, 9)
+            self.assertAlmostEqual(cc[6], yPix, 9)
+
+    def test_lazy_positions(self):
+        """
+        Test that the pixel positions of objects that are not drawn are
+        only computed when centroid entries are written for them
+        """
+        gs_interpreter = self.make_interpreter()
+        gs_object = self.make_object(2, flux_dict={'g': 0.0, 'r': 0.0})
+        gs_interpreter.drawObject(gs_object)
+        self.assertEqual(self.position_calls, [])
+        self.assertEqual(len(gs_interpreter.detectorImages), 0)
+
+        gs_interpreter.centroid_base_name = 'positions_test_'
+        gs_interpreter.drawObject(gs_object)
+        self.assertEqual(self.position_calls, [2])
+        self.assertGreater(len(gs_interpreter.centroid_list), 0)
+        for cc in gs_interpreter.centroid_list:
+            self.assertEqual(cc[4], 0)
+
 
 class GetStampBoundsTestCase(unittest.TestCase):
     """
@@ -1185,6 +1728,36 @@ class GetStampBoundsTestCase(unittest.TestCase):
         self.assertLess(ref_obj.getGoodImageSize(pixel_scale),
                         test_bounds.xmax - test_bounds.xmin)
 
+        # By default, the point source stamp sizes are exact and the
+        # table is not built.  With use_point_source_stamp_table set, the
+        # tabulated sizes for a batch of fluxes should never be smaller
+        # than the exact ones.
+        fluxes = np.array([1.0, 5.0, 1.0e3, 1.0e5, 3.3e6, 1.0e8, 2.0e9])
+        exact_sizes = gs_interpreter.getPointSourceStampSizes(fluxes)
+        self.assertIsNone(gs_interpreter._ps_stamp_size_table)
+        gs_interpreter.use_point_source_stamp_table = True
+        sizes = gs_interpreter.getPointSourceStampSizes(fluxes)
+        self.assertIsNotNone(gs_interpreter._ps_stamp_size_table)
+        self.assertEqual(len(sizes), len(fluxes))
+        for flux, size, exact_size in zip(fluxes, sizes, exact_sizes):
+            if flux < 10:
+                self.assertEqual(size, 32)
+                self.assertEqual(exact_size, 32)
+                continue
+            folding_threshold = gs_interpreter.sky_bg_per_pixel/flux
+            gsparams = None if folding_threshold >= galsim.GSParams().folding_threshold \
+                else galsim.GSParams(folding_threshold=folding_threshold)
+            psf = Kolmogorov_and_Gaussian_PSF(airmass=gs_interpreter._airmass,
+                                              rawSeeing=seeing,
+                                              band=band, gsparams=gsparams)
+            self.assertEqual(exact_size,
+                             gs_interpreter.drawPointSource(gsobject, psf=psf).getGoodImageSize(pixel_scale))
+            self.assertGreaterEqual(size, exact_size)
+            self.assertLessEqual(size, 1.25*exact_size)
+            bounds = gs_interpreter.getStampBounds(gsobject, flux, image_pos,
+                                                   keep_sb_level, 3*keep_sb_level)
+            self.assertEqual(bounds.xmax - bounds.xmin, size)
+
 
 class GetGoodImageSizeTestCase(unittest.TestCase):
     """TestCase class for getGoodPhotImageSize function."""
@@ -1219,6 +1792,68 @@ class GetGoodImageSizeTestCase(unittest.TestCase):
         self.assertLessEqual(N, Nmax)
 
 
+class StampSizeTableTestCase(unittest.TestCase):
+    """TestCase class for the StampSizeTable class."""
+
+    def setUp(self):
+        self.scratch_dir = tempfile.mkdtemp(dir=ROOT, prefix='StampSizeTable')
+
+    def tearDown(self):
+        if os.path.exists(self.scratch_dir):
+            shutil.rmtree(self.scratch_dir)
+
+    def make_galaxy(self, hlr, sindex, minor=1.0, major=1.0):
+        return GalSimCelestialObject('sersic', 0, 0, radiansFromArcsec(hlr),
+                                     radiansFromArcsec(minor), radiansFromArcsec(major),
+                                     0, sindex, 'none', dict(), None, 0, '', 0.2, 0)
+
+    def exact_size(self, fwhm, hlr, sindex, sb_ratio):
+        point_source = SNRdocumentPSF(fwhm).applyPSF(xPupil=0, yPupil=0)
+        ps_size = getGoodPhotImageSize(point_source.withFlux(sb_ratio), 1.0)
+        galaxy = galsim.Sersic(n=sindex, half_light_radius=hlr).withFlux(sb_ratio)
+        obj_size = getGoodPhotImageSize(galaxy, 1.0)
+        return int(np.sqrt(ps_size**2 + obj_size**2))
+
+    def test_stamp_size_table(self):
+        """
+        Test that StampSizeTable reproduces the exact stamp sizes on its
+        grid points, approximates them between the grid points, and
+        survives a round trip through the file system.
+        """
+        fwhm = 0.7
+        table = StampSizeTable(fwhm, sindex_grid=[1.0, 4.0],
+                               log10_hlr_grid=[-0.5, 0.0, 0.5],
+                               log10_ratio_grid=[3.0, 4.0, 5.0, 6.0])
+
+        # Allow for round off in the interpolation weights.
+        for sindex in (1.0, 4.0):
+            for sb_ratio in (1.0e4, 1.0e5):
+                self.assertLessEqual(abs(table.getImageSize(self.make_galaxy(1.0, sindex), sb_ratio) -
+                                         self.exact_size(fwhm, 1.0, sindex, sb_ratio)), 1)
+
+        exact = self.exact_size(fwhm, 0.6, 1.0, 3.0e4)
+        approx = table.getImageSize(self.make_galaxy(0.6, 1.0), 3.0e4)
+        self.assertLess(abs(approx - exact), 0.25*exact)
+
+        # an elliptical galaxy needs a larger stamp than a round one
+        self.assertGreater(table.getImageSize(self.make_galaxy(0.6, 1.0, minor=0.5), 3.0e4),
+                           approx)
+
+        # objects outside of the domain of the table
+        self.assertIsNone(table.getImageSize(self.make_galaxy(0.6, 5.0), 3.0e4))
+        self.assertIsNone(table.getImageSize(self.make_galaxy(10.0, 1.0), 3.0e4))
+        self.assertIsNone(table.getImageSize(self.make_galaxy(0.6, 1.0), 1.0e8))
+
+        file_name = os.path.join(self.scratch_dir, 'stamp_sizes.npz')
+        table.save(file_name)
+        for new_fwhm in (None, fwhm, 1.1):
+            new_table = StampSizeTable.load(file_name, fwhm=new_fwhm)
+            self.assertEqual(new_table.fwhm, fwhm if new_fwhm is None else new_fwhm)
+            galaxy = self.make_galaxy(1.0, 4.0)
+            self.assertLessEqual(abs(new_table.getImageSize(galaxy, 1.0e5) -
+                                     self.exact_size(new_table.fwhm, 1.0, 4.0, 1.0e5)), 1)
+
+
 class HourAngleTestCase(unittest.TestCase):
     """
     Test the hour angle calculation given the MJD and pointing
@@ -1,10 +1,16 @@
+import os
+import shutil
+import tempfile
 import unittest
+import warnings
 import numpy as np
 import lsst.utils.tests
 import lsst.geom as LsstGeom
 from lsst.sims.utils.CodeUtilities import sims_clean_up
 from lsst.sims.utils import ObservationMetaData, haversine, arcsecFromRadians
 from lsst.sims.GalSimInterface.wcsUtils import tanWcsFromDetector, tanSipWcsFromDetector
+from lsst.sims.GalSimInterface.wcsUtils import fitsCardsFromWcs, wcsFromFitsCards
+from lsst.sims.GalSimInterface.wcsUtils import setTanSipWcsCacheDir, TanSipPolynomials
 from lsst.sims.GalSimInterface import LSSTCameraWrapper
 from lsst.sims.coordUtils import lsst_camera
 
@@ -104,6 +110,137 @@ class WcsTest(unittest.TestCase):
         self.assertLess(maxDistanceTanSip, 0.01, msg=msg)
         self.assertGreater(maxDistanceTan-maxDistanceTanSip, 1.0e-10, msg=msg)
 
+    def testFitsCards(self):
+        """
+        Test that a TAN-SIP WCS rebuilt by wcsFromFitsCards matches the
+        WCS passed to fitsCardsFromWcs
+        """
+        tanSipWcs = tanSipWcsFromDetector(self.detector.getName(), self.camera_wrapper,
+                                          self.obs, self.epoch)
+        cards = fitsCardsFromWcs(tanSipWcs)
+        self.assertIn('A_ORDER', [name for name, value in cards])
+        restored = wcsFromFitsCards(cards)
+
+        for xx in np.arange(0.0, 4001.0, 500.0):
+            for yy in np.arange(0.0, 4001.0, 500.0):
+                pt = LsstGeom.Point2D(xx, yy)
+                skyPt = tanSipWcs.pixelToSky(pt)
+                restoredPt = restored.pixelToSky(pt)
+                self.assertLess(skyPt.separation(restoredPt).asArcseconds(), 1.0e-9)
+
+    def testNumpyFitter(self):
+        """
+        Test that the TAN-SIP WCS fit with fitter='numpy' is the
+        TanSipPolynomials fit (rather than the meas_astrom fallback), that
+        it agrees with the one fit by meas_astrom, and that
+        TanSipPolynomials evaluates it like afw does
+        """
+        detName = self.detector.getName()
+        afwWcs = tanSipWcsFromDetector(detName, self.camera_wrapper,
+                                       self.obs, self.epoch)
+        # the numpy fit must meet the default tolerances, so that it does
+        # not fall back to the afw fitter (which would issue a warning)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            numpyWcs = tanSipWcsFromDetector(detName, self.camera_wrapper,
+                                             self.obs, self.epoch, fitter='numpy')
+        self.assertEqual(len(caught), 0, msg=[str(ww.message) for ww in caught])
+        sip = TanSipPolynomials.fromFitsCards(fitsCardsFromWcs(numpyWcs))
+
+        # fit the same grid as approximateWcs does directly with
+        # TanSipPolynomials; it must meet the default tolerances of
+        # tanSipWcsFromDetector and be the fit that was returned
+        bboxd = LsstGeom.Box2D(self.camera_wrapper.getBBox(detName))
+        xGrid, yGrid = np.meshgrid(np.linspace(bboxd.getMinX(), bboxd.getMaxX(), 20),
+                                   np.linspace(bboxd.getMinY(), bboxd.getMaxY(), 20),
+                                   indexing='ij')
+        xGrid = xGrid.flatten()
+        yGrid = yGrid.flatten()
+        raGrid, decGrid = self.camera_wrapper.raDecFromPixelCoords(xGrid, yGrid, detName,
+                                                                   obs_metadata=self.obs,
+                                                                   epoch=2000.0,
+                                                                   includeDistortion=True)
+        tanWcs = tanWcsFromDetector(detName, self.camera_wrapper, self.obs, self.epoch)
+        crpix = tanWcs.getPixelOrigin()
+        crval = tanWcs.getSkyOrigin()
+        directFit = TanSipPolynomials.fit(xGrid, yGrid, raGrid, decGrid,
+                                          (crpix.getX(), crpix.getY()),
+                                          (crval.getRa().asDegrees(), crval.getDec().asDegrees()))
+
+        raFit, decFit = directFit.pixelToSky(xGrid, yGrid)
+        skyError = arcsecFromRadians(haversine(np.radians(raFit), np.radians(decFit),
+                                               np.radians(raGrid), np.radians(decGrid)))
+        self.assertLessEqual(skyError.max(), 0.001)
+        xFit, yFit = directFit.skyToPixel(raGrid, decGrid)
+        self.assertLessEqual(np.sqrt((xFit-xGrid)**2 + (yFit-yGrid)**2).max(), 0.01)
+
+        np.testing.assert_allclose(sip.crpix, directFit.crpix, rtol=1.0e-12)
+        np.testing.assert_allclose(sip.crval, directFit.crval, rtol=1.0e-12)
+        np.testing.assert_allclose(sip.cd, directFit.cd, rtol=1.0e-10)
+        for coeffs, directCoeffs in ((sip.a, directFit.a), (sip.b, directFit.b)):
+            for pq in directCoeffs:
+                self.assertAlmostEqual(coeffs.get(pq, 0.0), directCoeffs[pq],
+                                       delta=1.0e-10*abs(directCoeffs[pq]) + 1.0e-30)
+
+        for xx in np.arange(0.0, 4001.0, 500.0):
+            for yy in np.arange(0.0, 4001.0, 500.0):
+                pt = LsstGeom.Point2D(xx, yy)
+                skyPt = numpyWcs.pixelToSky(pt)
+                self.assertLess(skyPt.separation(afwWcs.pixelToSky(pt)).asArcseconds(), 0.01)
+
+                ra, dec = sip.pixelToSky(xx, yy)
+                self.assertAlmostEqual(float(ra), skyPt.getRa().asDegrees(), 9)
+                self.assertAlmostEqual(float(dec), skyPt.getDec().asDegrees(), 9)
+                xPix, yPix = sip.skyToPixel(ra, dec)
+                self.assertAlmostEqual(float(xPix), xx, 3)
+                self.assertAlmostEqual(float(yPix), yy, 3)
+
+        with self.assertRaises(RuntimeError):
+            tanSipWcsFromDetector(self.detector.getName(), self.camera_wrapper,
+                                  self.obs, self.epoch, fitter='scipy')
+
+    def testTanSipWcsCache(self):
+        """
+        Test that tanSipWcsFromDetector reuses the WCSs cached on disk
+        """
+        cache_dir = tempfile.mkdtemp(prefix='testTanSipWcsCache-')
+        try:
+            setTanSipWcsCacheDir(cache_dir)
+            tanSipWcs = tanSipWcsFromDetector(self.detector.getName(), self.camera_wrapper,
+                                              self.obs, self.epoch)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            cachedWcs = tanSipWcsFromDetector(self.detector.getName(), self.camera_wrapper,
+                                              self.obs, self.epoch)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            for xx in np.arange(0.0, 4001.0, 1000.0):
+                for yy in np.arange(0.0, 4001.0, 1000.0):
+                    pt = LsstGeom.Point2D(xx, yy)
+                    separation = tanSipWcs.pixelToSky(pt).separation(cachedWcs.pixelToSky(pt))
+                    self.assertLess(separation.asArcseconds(), 1.0e-9)
+
+            # a different fit order is a different cache entry
+            tanSipWcsFromDetector(self.detector.getName(), self.camera_wrapper,
+                                  self.obs, self.epoch, order=2)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+            # a cache file that cannot be read is replaced by a new fit
+            for file_name in os.listdir(cache_dir):
+                with open(os.path.join(cache_dir, file_name), 'w') as output:
+                    output.write('5')
+            refitWcs = tanSipWcsFromDetector(self.detector.getName(), self.camera_wrapper,
+                                             self.obs, self.epoch)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            pt = LsstGeom.Point2D(2000.0, 2000.0)
+            separation = tanSipWcs.pixelToSky(pt).separation(refitWcs.pixelToSky(pt))
+            self.assertLess(separation.asArcseconds(), 1.0e-9)
+            cachedWcs = tanSipWcsFromDetector(self.detector.getName(), self.camera_wrapper,
+                                              self.obs, self.epoch)
+            separation = tanSipWcs.pixelToSky(pt).separation(cachedWcs.pixelToSky(pt))
+            self.assertLess(separation.asArcseconds(), 1.0e-9)
+        finally:
+            setTanSipWcsCacheDir(None)
+            shutil.rmtree(cache_dir)
+
 
 class MemoryTestClass(lsst.utils.tests.MemoryTestCase):
     pass